@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     UserProfile, Goal, FocusSession, DistractionLog, 
-    EmotionalCheckIn, MotivationalNudge, StudyStreak
+    EmotionalCheckIn, MotivationalNudge, StudyStreak, DailyFocusRollup
 )
 
 @admin.register(UserProfile)
@@ -49,4 +49,11 @@ class MotivationalNudgeAdmin(admin.ModelAdmin):
 class StudyStreakAdmin(admin.ModelAdmin):
     list_display = ['user', 'current_streak', 'longest_streak', 'total_study_days', 'last_study_date']
     list_filter = ['current_streak', 'longest_streak', 'last_study_date']
-    search_fields = ['user__username'] 
\ No newline at end of file
+    search_fields = ['user__username']
+
+@admin.register(DailyFocusRollup)
+class DailyFocusRollupAdmin(admin.ModelAdmin):
+    list_display = ['user', 'date', 'focus_minutes', 'session_count', 'distraction_minutes']
+    list_filter = ['date']
+    search_fields = ['user__username']
+    date_hierarchy = 'date'
@@ -0,0 +1,108 @@
+from datetime import date, datetime, timedelta
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import FocusSession
+
+BUCKET_FUNCTIONS = {
+    'day': TruncDate,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+MAX_BUCKETS = 400
+
+# Dates the series accepts; the query runs up to the day after ``to``, so the
+# last day of year 9999 is excluded
+MIN_DATE = date(1970, 1, 1)
+MAX_DATE = date(9999, 12, 30)
+
+
+def bucket_start(day, bucket):
+    """First day of the bucket that ``day`` falls into."""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, bucket):
+    if bucket == 'week':
+        return day + timedelta(days=7)
+    if bucket == 'month':
+        return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+    return day + timedelta(days=1)
+
+
+def iter_buckets(start, end, bucket):
+    """Yield every bucket start between ``start`` and ``end`` inclusive."""
+    current = bucket_start(start, bucket)
+    for index in range(bucket_count(start, end, bucket)):
+        # Never steps past the last bucket, which may be the last one ``date`` can hold
+        if index:
+            current = next_bucket(current, bucket)
+        yield current
+
+
+def bucket_count(start, end, bucket):
+    """Number of buckets between ``start`` and ``end`` inclusive, without walking them."""
+    first = bucket_start(start, bucket)
+    if end < first:
+        return 0
+    if bucket == 'week':
+        return (end - first).days // 7 + 1
+    if bucket == 'month':
+        return (end.year - first.year) * 12 + end.month - first.month + 1
+    return (end - first).days + 1
+
+
+def focus_timeseries(user, start, end, bucket, goal_id=None, session_type=None):
+    """
+    Completed focus minutes and session counts for ``user`` grouped into
+    day/week/month buckets between ``start`` and ``end`` (inclusive dates).
+
+    Grouping and summing happen in the database; buckets without sessions are
+    filled with zeros so the series has one point per bucket.
+    """
+    tz = timezone.get_current_timezone()
+    range_start = timezone.make_aware(datetime.combine(bucket_start(start, bucket), datetime.min.time()), tz)
+    range_end = timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time()), tz)
+
+    sessions = FocusSession.objects.filter(
+        user=user,
+        completed=True,
+        start_time__gte=range_start,
+        start_time__lt=range_end,
+    )
+    if goal_id is not None:
+        sessions = sessions.filter(goal_id=goal_id)
+    if session_type:
+        sessions = sessions.filter(session_type=session_type)
+
+    trunc = BUCKET_FUNCTIONS[bucket]
+    rows = sessions.annotate(
+        period=trunc('start_time', tzinfo=tz)
+    ).values('period').annotate(
+        focus_minutes=Sum('duration_minutes'),
+        session_count=Count('id'),
+    ).order_by('period')
+
+    totals = {}
+    for row in rows:
+        period = row['period']
+        if isinstance(period, datetime):
+            period = timezone.localtime(period, tz).date() if timezone.is_aware(period) else period.date()
+        totals[period] = (row['focus_minutes'] or 0, row['session_count'])
+
+    series = []
+    for period in iter_buckets(start, end, bucket):
+        minutes, count = totals.get(period, (0, 0))
+        series.append({
+            'period': period.isoformat(),
+            'focus_minutes': minutes,
+            'session_count': count,
+        })
+    return series
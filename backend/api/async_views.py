@@ -0,0 +1,222 @@
+"""
+Async versions of the hot read endpoints and the live event stream, for
+deployments served over ASGI (``backend/asgi.py``). They use the async ORM
+end to end, so a request does not hop to the sync thread pool the way a DRF
+view does under uvicorn or daphne. Responses match the sync endpoints they
+mirror.
+"""
+import asyncio
+import json
+from contextlib import suppress
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from . import cache as payload_cache
+from .authentication import CachedJWTAuthentication
+from .events import get_broker
+from .models import MotivationalNudge, MotivationalQuote
+from .pagination import KeysetPagination
+from .quote_pool import quote_pool
+from .serializers import MotivationalNudgeSerializer, MotivationalQuoteSerializer, StudyStreakSerializer
+from .streaks import aget_current_study_streak
+from .views import DashboardStats
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """CachedJWTAuthentication with an async entry point for AsyncAPIView."""
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+
+class AsyncAPIView(View):
+    """
+    Authenticates like the DRF views (JWT bearer token first, then the
+    session) and requires an authenticated user.
+    """
+    authentication = AsyncJWTAuthentication()
+    http_method_names = ['get', 'head', 'options']
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user = await self.authenticate(request)
+        except (InvalidToken, AuthenticationFailed) as exc:
+            return self.unauthorized(exc.detail)
+        if user is None:
+            return self.unauthorized('Authentication credentials were not provided.')
+        request.user = user
+        # DRF's wrapper gives serializers and pagination the query_params they expect
+        self.request = Request(request)
+        self.request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def authenticate(self, request):
+        result = await self.authentication.aauthenticate(request)
+        if result is not None:
+            return result[0]
+        user = await request.auser()
+        return user if user.is_authenticated else None
+
+    def unauthorized(self, detail):
+        body = detail if isinstance(detail, dict) else {'detail': str(detail)}
+        response = JsonResponse(body, status=401)
+        response['WWW-Authenticate'] = self.authentication.authenticate_header(request=None)
+        return response
+
+
+class AsyncDashboardStats(AsyncAPIView):
+    async def get(self, request):
+        data, hit = await payload_cache.aget_or_build(
+            request.user.pk, payload_cache.DASHBOARD, lambda: self.build_stats(request.user)
+        )
+        return JsonResponse(data, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+    async def build_stats(self, user):
+        (focus, focus_totals), (goals, goal_totals) = DashboardStats.stats_queries(user)
+        focus, goals = await focus.aaggregate(**focus_totals), await goals.aaggregate(**goal_totals)
+        return DashboardStats.stats_payload(focus, goals, await aget_current_study_streak(user.pk))
+
+
+class AsyncStudyStreakDetail(AsyncAPIView):
+    async def get(self, request):
+        # Shares the cached default representation with StudyStreakDetail
+        data, hit = await payload_cache.aget_or_build(
+            request.user.pk, payload_cache.STREAK, lambda: self.build_streak(request.user)
+        )
+        return JsonResponse(data, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+    async def build_streak(self, user):
+        return StudyStreakSerializer(await aget_current_study_streak(user.pk)).data
+
+
+class AsyncMotivationalQuoteList(AsyncAPIView):
+    async def get(self, request):
+        category = self.request.query_params.get('category', None)
+        # The pool is in-process; it only touches the database when it reloads
+        ids = await sync_to_async(quote_pool.sample_ids)(10, category=category)
+        quotes = await MotivationalQuote.objects.filter(pk__in=ids, is_active=True).ain_bulk()
+        results = MotivationalQuoteSerializer([quotes[pk] for pk in ids if pk in quotes], many=True).data
+        # Same envelope as the paginated sync list (one page of at most ten)
+        return JsonResponse({'count': len(results), 'next': None, 'previous': None, 'results': results})
+
+
+class AsyncRandomMotivationalQuote(AsyncAPIView):
+    async def get(self, request):
+        quote = None
+        quote_id = await sync_to_async(quote_pool.random_id)()
+        if quote_id is not None:
+            quote = await MotivationalQuote.objects.filter(pk=quote_id, is_active=True).afirst()
+        if quote:
+            return JsonResponse(MotivationalQuoteSerializer(quote).data)
+        return JsonResponse({'detail': 'No quotes available'}, status=404)
+
+
+class AsyncMotivationalNudgeList(AsyncAPIView):
+    cursor_ordering_field = 'created_at'
+
+    async def get(self, request):
+        queryset = MotivationalNudge.objects.filter(user=request.user, read=False).order_by('-created_at')
+        queryset = MotivationalNudgeSerializer.setup_eager_loading(queryset, self.request)
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(queryset, self.request, view=self)
+        data = MotivationalNudgeSerializer(page, many=True, context={'request': self.request}).data
+        return JsonResponse(paginator.get_paginated_response(data).data)
+
+
+class EventStream(AsyncAPIView):
+    """
+    Server-sent events for the signed-in user; needs an ASGI server and
+    answers 501 under WSGI.
+
+    The stream opens with the full ``dashboard`` and ``streak`` payloads.
+    After that, ``dashboard`` events carry only the fields that changed,
+    ``streak`` events the new streak, and ``nudge`` events each new
+    MotivationalNudge. A comment line is sent every SSE_HEARTBEAT_SECONDS
+    so proxies keep idle connections open. EventSource cannot set headers,
+    so the access token may also be passed as ``?token=``.
+    """
+    http_method_names = ['get']
+
+    async def authenticate(self, request):
+        token = request.GET.get('token')
+        if token:
+            return await self.authentication.aget_user(self.authentication.get_validated_token(token))
+        return await super().authenticate(request)
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            # WSGI collects an async iterator into a list before sending it: this stream would never
+            # send a byte and would hold the worker forever
+            return JsonResponse({'detail': 'The event stream needs an ASGI server (backend.asgi).'}, status=501)
+        response = StreamingHttpResponse(self.stream(request.user), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @staticmethod
+    def format_event(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+    async def dashboard(self, user):
+        data, hit = await payload_cache.aget_or_build(
+            user.pk, payload_cache.DASHBOARD, lambda: AsyncDashboardStats().build_stats(user)
+        )
+        return data
+
+    async def streak(self, user):
+        data, hit = await payload_cache.aget_or_build(
+            user.pk, payload_cache.STREAK, lambda: AsyncStudyStreakDetail().build_streak(user)
+        )
+        return data
+
+    async def stream(self, user):
+        subscription = get_broker().subscribe(user.pk)
+        # Subscribe before reading the initial payloads so no change in between is missed
+        pending = asyncio.ensure_future(anext(subscription))
+        await asyncio.sleep(0)
+        try:
+            dashboard, streak = await self.dashboard(user), await self.streak(user)
+            yield 'retry: 5000\n\n'
+            yield self.format_event('dashboard', dashboard)
+            yield self.format_event('streak', streak)
+
+            while True:
+                done, _ = await asyncio.wait({pending}, timeout=settings.SSE_HEARTBEAT_SECONDS)
+                if not done:
+                    yield ': keep-alive\n\n'
+                    continue
+                message = pending.result()
+                pending = asyncio.ensure_future(anext(subscription))
+
+                if message['event'] == payload_cache.DASHBOARD:
+                    current = await self.dashboard(user)
+                    delta = {key: value for key, value in current.items() if dashboard.get(key) != value}
+                    dashboard = current
+                    if delta:
+                        yield self.format_event('dashboard', delta)
+                elif message['event'] == payload_cache.STREAK:
+                    current = await self.streak(user)
+                    if current != streak:
+                        streak = current
+                        yield self.format_event('streak', streak)
+                else:
+                    yield self.format_event(message['event'], message['data'])
+        finally:
+            pending.cancel()
+            with suppress(asyncio.CancelledError, StopAsyncIteration):
+                await pending
+            await subscription.aclose()
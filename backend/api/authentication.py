@@ -0,0 +1,170 @@
+"""
+JWT authentication without a User query on every request.
+
+``CachedJWTAuthentication`` resolves the token's user from a small snapshot
+of the User row: first from a per-process LRU (AUTH_USER_LOCAL_CACHE_*
+settings, a few seconds), then from the shared cache
+(AUTH_USER_CACHE_SECONDS), and only then from the database. The user it
+returns is a real User instance with the password field deferred, so
+``user.save()`` still only writes the fields it loaded.
+
+Saving or deleting a User drops their snapshot (``invalidate_user``), which
+covers deactivation and password changes made through the ORM. Other
+processes can keep serving their local copy until it expires, so the local
+TTL bounds how long a deactivated user stays signed in elsewhere, provided
+the shared cache really is shared (Redis). With the default locmem cache
+each process has its own "shared" tier that never sees the invalidation,
+so settings caps AUTH_USER_CACHE_SECONDS at the local TTL. Bulk
+``QuerySet.update()`` calls bypass the signals and must call
+``invalidate_user`` themselves.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+try:
+    from rest_framework_simplejwt.utils import get_md5_hash_password
+except ImportError:
+    # simplejwt < 5.3 (the pinned 5.2.2) has no revoke-on-password-change support
+    def get_md5_hash_password(password):
+        return hashlib.md5(password.encode()).hexdigest().upper()
+
+from .db_routing import abind_user, bind_user
+
+# Every column but the password, which stays deferred on the returned instance.
+# Model.from_db() expects the values in concrete field order.
+USER_FIELDS = tuple(field.attname for field in User._meta.concrete_fields if field.attname != 'password')
+
+
+class LocalLRU:
+    """A thread-safe, size-bounded LRU whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, maxsize):
+        if ttl <= 0 or maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_users = LocalLRU()
+
+
+def user_cache_key(user_id):
+    return f'refocus:auth-user:{user_id}'
+
+
+def snapshot(user):
+    """What the cache holds for ``user``: the USER_FIELDS values and the token revoke hash."""
+    return {
+        'fields': tuple(getattr(user, name) for name in USER_FIELDS),
+        'revoke': get_md5_hash_password(user.password),
+    }
+
+
+def invalidate_user(user_id):
+    local_users.delete(str(user_id))
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that resolves users through the snapshot caches (module docstring)."""
+
+    def get_user(self, validated_token):
+        user_id = self.token_user_id(validated_token)
+        entry = local_users.get(user_id)
+        if entry is None:
+            entry = cache.get(user_cache_key(user_id))
+            if entry is None:
+                try:
+                    entry = snapshot(self.primary_users().get(**{jwt_settings.USER_ID_FIELD: user_id}))
+                except User.DoesNotExist:
+                    raise AuthenticationFailed('User not found', code='user_not_found')
+                cache.set(user_cache_key(user_id), entry, settings.AUTH_USER_CACHE_SECONDS)
+            self.remember(user_id, entry)
+        user = self.checked_user(entry, validated_token)
+        bind_user(user.pk)
+        return user
+
+    async def aget_user(self, validated_token):
+        user_id = self.token_user_id(validated_token)
+        entry = local_users.get(user_id)
+        if entry is None:
+            entry = await cache.aget(user_cache_key(user_id))
+            if entry is None:
+                try:
+                    entry = snapshot(await self.primary_users().aget(**{jwt_settings.USER_ID_FIELD: user_id}))
+                except User.DoesNotExist:
+                    raise AuthenticationFailed('User not found', code='user_not_found')
+                await cache.aset(user_cache_key(user_id), entry, settings.AUTH_USER_CACHE_SECONDS)
+            self.remember(user_id, entry)
+        user = self.checked_user(entry, validated_token)
+        await abind_user(user.pk)
+        return user
+
+    @staticmethod
+    def primary_users():
+        # Never snapshot from a lagging replica: it could bring back a pre-deactivation row
+        return User.objects.using(DEFAULT_DB_ALIAS)
+
+    @staticmethod
+    def token_user_id(validated_token):
+        try:
+            # Claims come back as str or int depending on the token; key the LRU on one form
+            return str(validated_token[jwt_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+    @staticmethod
+    def remember(user_id, entry):
+        local_users.set(
+            user_id, entry, settings.AUTH_USER_LOCAL_CACHE_SECONDS, settings.AUTH_USER_LOCAL_CACHE_SIZE,
+        )
+
+    @staticmethod
+    def checked_user(entry, validated_token):
+        # Same checks as JWTAuthentication.get_user, against the snapshot
+        user = User.from_db(User.objects.db, USER_FIELDS, entry['fields'])
+        # Neither setting exists before simplejwt 5.3, which always checks is_active and never revokes
+        if getattr(jwt_settings, 'CHECK_USER_IS_ACTIVE', True) and not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        if getattr(jwt_settings, 'CHECK_REVOKE_TOKEN', False) and (
+            validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != entry['revoke']
+        ):
+            raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+        return user
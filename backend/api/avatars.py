@@ -0,0 +1,183 @@
+"""
+Avatar storage and resized variants.
+
+An upload is stored under the sha256 of its bytes, re-encoded as a still
+image without EXIF (GPS included), ICC profiles or comments, and ``process_avatar``
+(api.tasks) renders it off the request path into square thumbnails of every
+size in AVATAR_VARIANT_SIZES, as WebP and JPEG, with EXIF, ICC profiles and
+comments dropped. Every file lives below a path derived from the content
+hash, so identical uploads share their files and a URL never changes
+content; anything under ``CONTENT_ROOT`` can be served with an immutable
+Cache-Control header.
+"""
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+CONTENT_ROOT = 'avatars/sha256/'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Pillow format -> file extension of the stored original
+ORIGINAL_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+# Encoder options for the re-encoded original, per Pillow format
+ORIGINAL_OPTIONS = {
+    'JPEG': {'quality': 95},
+    'PNG': {'optimize': True},
+    'GIF': {},
+    'WEBP': {'quality': 90},
+}
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+class InvalidAvatar(ValueError):
+    pass
+
+
+def content_hash(fileobj):
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(64 * 1024), b''):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def content_dir(digest):
+    return f'{CONTENT_ROOT}{digest[:2]}/{digest}/'
+
+
+def variant_name(digest, size, fmt):
+    extension = 'jpg' if fmt == 'jpeg' else fmt
+    return f'{content_dir(digest)}{size}.{extension}'
+
+
+def image_format(fileobj):
+    """The Pillow format of ``fileobj`` after checking it decodes as an image."""
+    fileobj.seek(0)
+    try:
+        with Image.open(fileobj) as image:
+            image.verify()
+            fmt = image.format
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as exc:
+        raise InvalidAvatar('File is not a valid image') from exc
+    finally:
+        fileobj.seek(0)
+    if fmt not in ORIGINAL_EXTENSIONS:
+        raise InvalidAvatar('Invalid file type. Only JPEG, PNG, GIF, and WebP are allowed')
+    return fmt
+
+
+def strip_metadata(fileobj, fmt):
+    """
+    Re-encode ``fileobj`` in its own format with the EXIF orientation applied
+    and no other metadata; animated images keep their first frame only.
+    """
+    fileobj.seek(0)
+    try:
+        with Image.open(fileobj) as image:
+            image = ImageOps.exif_transpose(image)
+            clean = Image.new(image.mode, image.size)
+            if image.mode == 'P':
+                clean.putpalette(image.getpalette())
+            clean.paste(image)
+            if 'transparency' in image.info:
+                clean.info['transparency'] = image.info['transparency']
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError) as exc:
+        raise InvalidAvatar('File is not a valid image') from exc
+    finally:
+        fileobj.seek(0)
+    buffer = io.BytesIO()
+    clean.save(buffer, fmt, **ORIGINAL_OPTIONS[fmt])
+    return ContentFile(buffer.getvalue())
+
+
+def store_original(fileobj):
+    """
+    Store an upload, stripped of its metadata, under the content hash of the
+    upload unless an identical upload is already there. Returns
+    ``(digest, storage name)``.
+    """
+    fmt = image_format(fileobj)
+    digest = content_hash(fileobj)
+    name = f'{content_dir(digest)}original.{ORIGINAL_EXTENSIONS[fmt]}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, strip_metadata(fileobj, fmt))
+    return digest, name
+
+
+def _square(image, size):
+    thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    # A fresh image carries none of the source's info (EXIF, ICC, comments)
+    clean = Image.new(thumbnail.mode, thumbnail.size)
+    clean.paste(thumbnail)
+    return clean
+
+
+def _flatten(image):
+    if image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image
+
+
+def render_variants(digest, source_name):
+    """
+    Render every configured size and format of the original at
+    ``source_name``, skipping files that already exist (an identical upload
+    rendered them). Returns ``{size: {format: storage name}}``.
+    """
+    sizes = sorted(set(settings.AVATAR_VARIANT_SIZES))
+    wanted = {
+        size: {fmt: variant_name(digest, size, fmt) for fmt in VARIANT_FORMATS}
+        for size in sizes
+    }
+    missing = [(size, fmt, name) for size, names in wanted.items() for fmt, name in names.items()
+               if not default_storage.exists(name)]
+    if not missing:
+        return {str(size): names for size, names in wanted.items()}
+
+    with default_storage.open(source_name, 'rb') as source, Image.open(source) as image:
+        # Let the JPEG decoder downscale while reading instead of decoding every pixel
+        image.draft('RGB', (max(sizes) * 2, max(sizes) * 2))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        for size, fmt, name in missing:
+            thumbnail = _square(image, size)
+            pil_format, options = VARIANT_FORMATS[fmt]
+            if pil_format == 'JPEG':
+                thumbnail = _flatten(thumbnail)
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, pil_format, **options)
+            saved = default_storage.save(name, ContentFile(buffer.getvalue()))
+            if saved != name:
+                # Another worker rendered the same file meanwhile; keep theirs
+                default_storage.delete(saved)
+    return {str(size): names for size, names in wanted.items()}
+
+
+def release(digest):
+    """Delete the files of ``digest`` once no profile uses them any more."""
+    from .models import UserProfile
+
+    if not digest or UserProfile.objects.filter(avatar_hash=digest).exists():
+        return
+    directory = content_dir(digest)
+    try:
+        _, files = default_storage.listdir(directory)
+    except (FileNotFoundError, NotImplementedError):
+        return
+    for filename in files:
+        default_storage.delete(directory + filename)
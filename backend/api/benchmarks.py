@@ -0,0 +1,450 @@
+"""
+Latency and query-count benchmarks for every route in ``api.urls``.
+
+``seed`` fills the database with a deterministic history per user: goals,
+focus sessions over the last ``days`` days, their distractions, check-ins
+and nudges, the rollups and study-day bitmaps derived from them, and a
+shared quote table. ``measure`` requests each route in ROUTES through the
+test client as the first seeded user and reports the queries and latency of
+a cold request (every cache emptied first) and the p50/p95 latency and
+median query count of the warm requests after it. ``compare`` checks a run
+against a saved baseline.
+
+The ``benchmark_endpoints`` command runs all of this inside
+``throwaway_database`` and ``offline_services``: a fresh in-memory SQLite
+database, a locmem cache, eager Celery, the in-process event broker and a
+temporary MEDIA_ROOT, so a run needs no external service and never touches
+the configured database.
+"""
+import gc
+import io
+import json
+import random
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from asgiref.local import Local
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.client import MULTIPART_CONTENT, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import events
+from .authentication import local_users
+from .models import (
+    DistractionLog, EmotionalCheckIn, FocusSession, Goal, MotivationalNudge, MotivationalQuote,
+    UserProfile,
+)
+from .quote_pool import quote_pool
+from .token_blacklist import blacklist_filter
+
+PASSWORD = 'benchmark-password'
+TIMEZONES = ('UTC', 'Europe/Berlin', 'America/New_York', 'Asia/Tokyo')
+JSON_CONTENT = 'application/json'
+MEMORY_DATABASE = 'file:refocus-benchmarks?mode=memory&cache=shared'
+
+
+class Fixture:
+    """The seeded user the routes are requested as, and the ids of their rows."""
+
+    def __init__(self, user):
+        self.user = user
+        self._ids = {}
+
+    def pick(self, model, index):
+        """The ``index``-th (wrapping around) row id of ``model`` owned by the user."""
+        ids = self._ids.get(model)
+        if ids is None:
+            ids = self._ids[model] = list(
+                model.objects.filter(user=self.user).order_by('pk').values_list('pk', flat=True)
+            )
+        return ids[index % len(ids)]
+
+
+class Route:
+    """How to request one URL name: method, expected status and per-request arguments."""
+
+    def __init__(self, name, method='get', status=200, prepare=None, content_type=JSON_CONTENT, priority=False):
+        self.name = name
+        self.method = method
+        self.status = status
+        # (fixture, index) -> (url kwargs, query or body); runs outside the timed request
+        self.prepare = prepare
+        self.content_type = content_type
+        self.priority = priority
+
+    def request(self, client, fixture, index):
+        """A no-argument callable sending the ``index``-th request."""
+        kwargs, data = self.prepare(fixture, index) if self.prepare else ({}, None)
+        path = reverse(self.name, kwargs=kwargs)
+        if self.method == 'get':
+            return lambda: client.get(path, data)
+        if self.content_type == JSON_CONTENT:
+            data = json.dumps(data)
+        return lambda: getattr(client, self.method)(path, data, content_type=self.content_type)
+
+
+def _detail(model):
+    return lambda fixture, index: ({'pk': fixture.pick(model, index)}, None)
+
+
+def _body(build):
+    return lambda fixture, index: ({}, build(fixture, index))
+
+
+def _pending_session(fixture, index):
+    session = FocusSession.objects.create(user=fixture.user, duration_minutes=25)
+    return {'pk': session.pk}, None
+
+
+def _avatar(fixture, index):
+    # A distinct image each time, so every upload stores and renders new content
+    buffer = io.BytesIO()
+    Image.new('RGB', (512, 512), (index % 256, index // 256 % 256, 128)).save(buffer, 'PNG')
+    return {}, {'avatar': SimpleUploadedFile(f'avatar-{index}.png', buffer.getvalue(), 'image/png')}
+
+
+def _sessions(fixture, index):
+    return [{'duration_minutes': 25, 'session_type': 'pomodoro', 'client_ref': str(i)} for i in range(10)]
+
+
+def _distractions(fixture, index):
+    return [{'distraction_type': 'phone', 'duration_minutes': 2, 'client_ref': str(i)} for i in range(10)]
+
+
+def _checkins(fixture, index):
+    return [{'mood': 'good', 'energy_level': 6, 'stress_level': 4, 'client_ref': str(i)} for i in range(10)]
+
+
+# Reads first: the writes after them grow the tables the reads are measured on
+ROUTES = [
+    Route('dashboard-stats', priority=True),
+    Route('goal-detail', prepare=_detail(Goal), priority=True),
+    Route('distraction-list-create', priority=True),
+    Route('distraction-detail', prepare=_detail(DistractionLog), priority=True),
+    Route('quote-list', priority=True),
+    Route('quote-random', priority=True),
+    Route('profile-detail'),
+    Route('goal-list-create'),
+    Route('focus-session-list-create'),
+    Route('focus-session-detail', prepare=_detail(FocusSession)),
+    Route('emotional-checkin-list-create'),
+    Route('emotional-checkin-detail', prepare=_detail(EmotionalCheckIn)),
+    Route('motivational-nudge-list'),
+    Route('motivational-nudge-detail', prepare=_detail(MotivationalNudge)),
+    Route('study-streak-detail'),
+    Route('study-heatmap'),
+    Route('cache-stats'),
+    Route('analytics-focus-timeseries'),
+    Route('sync-feed'),
+    Route('async-dashboard-stats'),
+    Route('async-study-streak-detail'),
+    Route('async-quote-list'),
+    Route('async-quote-random'),
+    Route('async-motivational-nudge-list'),
+    Route('metrics'),
+    Route('user-create', 'post', 201, _body(lambda fixture, index: {
+        'username': f'bench-signup-{index}', 'email': f'signup-{index}@example.com', 'password': PASSWORD,
+    })),
+    Route('profile-avatar-upload', 'post', prepare=_avatar, content_type=MULTIPART_CONTENT),
+    Route('goal-list-create', 'post', 201, _body(lambda fixture, index: {
+        'title': f'Benchmark goal {index}', 'category': 'study', 'priority': 'high',
+    })),
+    Route('focus-session-list-create', 'post', 201, _body(lambda fixture, index: {
+        'duration_minutes': 25, 'session_type': 'pomodoro', 'completed': True,
+    })),
+    Route('focus-session-complete', 'post', prepare=_pending_session),
+    Route('focus-session-bulk-create', 'post', 201, _body(_sessions)),
+    Route('distraction-list-create', 'post', 201, _body(lambda fixture, index: {
+        'distraction_type': 'social_media', 'duration_minutes': 5,
+    })),
+    Route('distraction-bulk-create', 'post', 201, _body(_distractions)),
+    Route('emotional-checkin-list-create', 'post', 201, _body(lambda fixture, index: {
+        'mood': 'okay', 'energy_level': 5, 'stress_level': 5,
+    })),
+    Route('emotional-checkin-bulk-create', 'post', 201, _body(_checkins)),
+    Route('motivation-start', 'post', prepare=_body(lambda fixture, index: {'goal_label': 'Benchmark'})),
+    Route('motivation-stop', 'post', prepare=_body(lambda fixture, index: {'goal_label': 'Benchmark'})),
+]
+
+# URL names in api.urls that are deliberately not measured, with the reason
+SKIPPED = {
+    'event-stream': 'long-lived server-sent event stream; the response never ends',
+}
+
+
+def route_key(route):
+    """The results key of ``route``: its URL name, suffixed with the method for writes."""
+    return route.name if route.method == 'get' else f'{route.name}:{route.method}'
+
+
+def unmeasured_url_names():
+    """URL names in api.urls that neither ROUTES nor SKIPPED account for."""
+    from . import urls
+
+    names = {pattern.name for pattern in urls.urlpatterns if isinstance(pattern, URLPattern)}
+    return sorted(names - {route.name for route in ROUTES} - set(SKIPPED))
+
+
+def seed(users=20, days=90, quotes=200, seed_value=0):
+    """
+    Create ``users`` users with ``days`` days of history each (see the module
+    docstring) and return the Fixture of the first one, who is staff.
+    """
+    rng = random.Random(seed_value)
+    now = timezone.now()
+    password = make_password(PASSWORD)
+
+    MotivationalQuote.objects.bulk_create([
+        MotivationalQuote(
+            text=f'Benchmark quote {i}', author=f'Author {i % 40}',
+            category=rng.choice(MotivationalQuote.CATEGORY_CHOICES)[0], is_active=rng.random() > 0.05,
+        )
+        for i in range(quotes)
+    ])
+    created = User.objects.bulk_create([
+        User(username=f'bench-{i}', email=f'bench-{i}@example.com', password=password, is_staff=i == 0)
+        for i in range(users)
+    ])
+    # Not every backend returns primary keys from bulk_create
+    accounts = list(User.objects.filter(username__in=[user.username for user in created]).order_by('pk'))
+    UserProfile.objects.bulk_create([
+        UserProfile(user=user, timezone=rng.choice(TIMEZONES), daily_goal_hours=rng.randint(2, 8))
+        for user in accounts
+    ])
+
+    for user in accounts:
+        Goal.objects.bulk_create([
+            Goal(
+                user=user, title=f'Goal {i}', category=rng.choice(('study', 'work', 'health', 'reading')),
+                priority=rng.choice(Goal.PRIORITY_CHOICES)[0], status=rng.choice(Goal.STATUS_CHOICES)[0],
+                progress=rng.randint(0, 100), target_date=(now + timedelta(days=rng.randint(-30, 120))).date(),
+            )
+            for i in range(rng.randint(6, 12))
+        ])
+        goals = list(Goal.objects.filter(user=user))
+
+        # auto_now_add overwrites start_time/timestamp on insert; bulk_update sets the history afterwards
+        sessions, starts = [], []
+        checkins, checkin_times = [], []
+        for day in range(days, -1, -1):
+            if rng.random() < 0.75:
+                for _ in range(rng.randint(1, 4)):
+                    start = now - timedelta(days=day, hours=rng.randint(0, 14), minutes=rng.randint(0, 59))
+                    duration = rng.choice((25, 25, 25, 50, 90))
+                    sessions.append(FocusSession(
+                        user=user, duration_minutes=duration,
+                        session_type=rng.choice(('pomodoro', 'pomodoro', 'custom', 'break')),
+                        goal=rng.choice(goals) if rng.random() < 0.7 else None,
+                        completed=day > 0 or rng.random() < 0.5,
+                    ))
+                    starts.append(start)
+            for _ in range(rng.randint(0, 2)):
+                checkins.append(EmotionalCheckIn(
+                    user=user, mood=rng.choice(EmotionalCheckIn.MOOD_CHOICES)[0],
+                    energy_level=rng.randint(1, 10), stress_level=rng.randint(1, 10),
+                ))
+                checkin_times.append(now - timedelta(days=day, hours=rng.randint(0, 14)))
+
+        FocusSession.objects.bulk_create(sessions, batch_size=500)
+        sessions = list(FocusSession.objects.filter(user=user).order_by('pk'))
+        for session, start in zip(sessions, starts):
+            session.start_time = start
+            if session.completed:
+                session.end_time = start + timedelta(minutes=session.duration_minutes)
+        FocusSession.objects.bulk_update(sessions, ['start_time', 'end_time'], batch_size=500)
+
+        distractions, distraction_times = [], []
+        for session in sessions:
+            for _ in range(rng.choice((0, 0, 1, 1, 2, 3))):
+                distractions.append(DistractionLog(
+                    user=user, focus_session=session, duration_minutes=rng.randint(1, 15),
+                    distraction_type=rng.choice(DistractionLog.DISTRACTION_TYPE_CHOICES)[0],
+                ))
+                distraction_times.append(session.start_time + timedelta(minutes=rng.randint(0, session.duration_minutes)))
+        DistractionLog.objects.bulk_create(distractions, batch_size=500)
+        _backdate(DistractionLog, user, 'timestamp', distraction_times)
+
+        EmotionalCheckIn.objects.bulk_create(checkins, batch_size=500)
+        _backdate(EmotionalCheckIn, user, 'timestamp', checkin_times)
+
+        nudges = [
+            MotivationalNudge(
+                user=user, nudge_type=rng.choice(MotivationalNudge.NUDGE_TYPE_CHOICES)[0],
+                title=f'Nudge {i}', content='Keep going, you are closer than you think.', read=rng.random() < 0.6,
+            )
+            for i in range(max(1, days // 3))
+        ]
+        MotivationalNudge.objects.bulk_create(nudges, batch_size=500)
+        _backdate(MotivationalNudge, user, 'created_at', [
+            now - timedelta(days=rng.randint(0, days), hours=rng.randint(0, 23)) for _ in nudges
+        ])
+
+    # Rollups, bitmaps and streaks as the rebuild commands derive them from the history
+    call_command('backfill_focus_rollups', stdout=io.StringIO())
+    call_command('rebuild_study_bitmaps', stdout=io.StringIO())
+    quote_pool.invalidate()
+    return Fixture(accounts[0])
+
+
+def _backdate(model, user, field, times):
+    rows = list(model.objects.filter(user=user).order_by('pk'))
+    for row, value in zip(rows, times):
+        setattr(row, field, value)
+    model.objects.bulk_update(rows, [field], batch_size=500)
+
+
+def reset_caches():
+    """Empty the shared cache and the per-process ones, as after a deploy."""
+    cache.clear()
+    local_users.clear()
+    blacklist_filter.reset()
+    quote_pool.invalidate()
+
+
+def _percentile(samples, n):
+    # The (n-1)/n quantile, e.g. p95 for n=20. Inclusive: interpolated within the samples,
+    # so one stray slow request out of twenty does not become the p95 on its own
+    return statistics.quantiles(samples, n=n, method='inclusive')[-1] if len(samples) > 1 else samples[0]
+
+
+@contextmanager
+def _gc_paused():
+    # As timeit does: a collection landing inside one request is noise in its latency
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def measure(fixture, routes=None, iterations=20, priority_factor=3):
+    """
+    Request every route once cold and ``iterations`` times warm (priority
+    routes ``priority_factor`` times as often) and return the results by
+    ``route_key``. Raises AssertionError on an unexpected status.
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    results = {}
+    index = 0
+    for route in ROUTES if routes is None else routes:
+        # A fresh access token per route; a long run outlives ACCESS_TOKEN_LIFETIME
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(fixture.user)}')
+        count = iterations * (priority_factor if route.priority else 1)
+        latencies, queries = [], []
+        reset_caches()
+        for attempt in range(count + 1):
+            send = route.request(client, fixture, index)
+            index += 1
+            with _gc_paused(), CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = send()
+                elapsed = time.perf_counter() - start
+            if response.status_code != route.status:
+                raise AssertionError(
+                    f'{route.method.upper()} {route.name} returned {response.status_code}, expected {route.status}'
+                )
+            if attempt == 0:
+                cold_ms, cold_queries = elapsed * 1000, len(captured)
+            else:
+                latencies.append(elapsed * 1000)
+                queries.append(len(captured))
+        results[route_key(route)] = {
+            'method': route.method.upper(),
+            'priority': route.priority,
+            'requests': count,
+            'cold_ms': round(cold_ms, 3),
+            'cold_queries': cold_queries,
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(_percentile(latencies, 20), 3),
+            'queries': round(statistics.median(queries)),
+            'max_queries': max(queries),
+        }
+    return results
+
+
+def compare(results, baseline, latency_ratio=1.5, p95_ratio=3.0, latency_floor_ms=5.0, query_slack=0):
+    """
+    Regressions of ``results`` against the ``baseline`` results, as messages.
+
+    A route regresses when its warm or cold query count grows by more than
+    ``query_slack``, or when its p50 latency exceeds the baseline's by a
+    factor of ``latency_ratio`` (its p95 by ``p95_ratio``, the tail being
+    noisier) and by more than ``latency_floor_ms``, which keeps
+    sub-millisecond jitter from failing a run. Routes missing from the
+    baseline are not compared.
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for field in ('queries', 'cold_queries'):
+            if result[field] > base[field] + query_slack:
+                regressions.append(f'{key}: {field} {base[field]} -> {result[field]}')
+        for field, ratio in (('p50_ms', latency_ratio), ('p95_ms', p95_ratio)):
+            if result[field] > base[field] * ratio and result[field] - base[field] > latency_floor_ms:
+                regressions.append(f'{key}: {field} {base[field]:.2f} -> {result[field]:.2f}')
+    return regressions
+
+
+@contextmanager
+def throwaway_database():
+    """Point the ``default`` alias (and only it) at a fresh, migrated in-memory SQLite database."""
+    saved = connections.settings
+    connections.close_all()
+    connections._settings = connections.settings = connections.configure_settings({
+        # Shared cache: the connection async views use from another thread sees the same database
+        DEFAULT_DB_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': MEMORY_DATABASE},
+    })
+    connections._connections = Local(connections.thread_critical)
+    try:
+        call_command('migrate', verbosity=0, interactive=False)
+        yield
+    finally:
+        # Closing the last connection to an in-memory database discards it
+        connections.close_all()
+        connections._settings = connections.settings = saved
+        connections._connections = Local(connections.thread_critical)
+
+
+@contextmanager
+def offline_services():
+    """Keep every external service out of a run (see the module docstring)."""
+    from backend import celery_app
+
+    celery_overrides = {'task_always_eager': True, 'broker_url': 'memory://', 'result_backend': 'cache+memory://'}
+    saved_broker = events._broker
+    saved_celery = {key: getattr(celery_app.conf, key) for key in celery_overrides} if celery_app else {}
+    with tempfile.TemporaryDirectory() as media_root, override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'refocus-benchmarks'}},
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        EVENT_BROKER_URL='',
+        MOTIVATION_DELIVERY_MODE='poll',
+        MEDIA_ROOT=media_root,
+        # The test client's address, so the scrape endpoint answers
+        METRICS_ALLOWED_IPS=['127.0.0.1'],
+    ):
+        events._broker = events.InProcessBroker()
+        if celery_app:
+            # Under the CELERY_ names from settings.py, which take precedence over the plain ones
+            celery_app.conf.update({f'CELERY_{key.upper()}': value for key, value in celery_overrides.items()})
+        try:
+            yield
+        finally:
+            events._broker = saved_broker
+            if celery_app:
+                celery_app.conf.update({f'CELERY_{key.upper()}': value for key, value in saved_celery.items()})
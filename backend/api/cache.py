@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import events
+
+KEY_PREFIX = 'refocus'
+DASHBOARD = 'dashboard'
+STREAK = 'streak'
+PAYLOAD_NAMES = (DASHBOARD, STREAK)
+
+
+def payload_key(user_id, name):
+    key = f'{KEY_PREFIX}:user:{user_id}:{name}'
+    if name == DASHBOARD:
+        # Today/weekly totals roll over at midnight, so each day gets its own entry
+        key = f'{key}:{timezone.localdate().isoformat()}'
+    return key
+
+
+def _counter_key(name, outcome):
+    return f'{KEY_PREFIX}:cache-stats:{name}:{outcome}'
+
+
+def _count(name, outcome):
+    key = _counter_key(name, outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Counter missing or evicted; add() keeps concurrent first writers from clobbering each other
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def get_or_build(user_id, name, build):
+    """
+    Return ``(payload, hit)`` for a per-user cached payload, calling ``build()``
+    and storing its result on a miss.
+    """
+    key = payload_key(user_id, name)
+    payload = cache.get(key)
+    if payload is not None:
+        _count(name, 'hits')
+        return payload, True
+    _count(name, 'misses')
+    payload = build()
+    cache.set(key, payload, settings.USER_PAYLOAD_CACHE_TIMEOUT)
+    return payload, False
+
+
+async def _acount(name, outcome):
+    key = _counter_key(name, outcome)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, timeout=None):
+            await cache.aincr(key)
+
+
+async def aget_or_build(user_id, name, build):
+    """``get_or_build`` for async views; ``build`` is a coroutine function."""
+    key = payload_key(user_id, name)
+    payload = await cache.aget(key)
+    if payload is not None:
+        await _acount(name, 'hits')
+        return payload, True
+    await _acount(name, 'misses')
+    payload = await build()
+    await cache.aset(key, payload, settings.USER_PAYLOAD_CACHE_TIMEOUT)
+    return payload, False
+
+
+def invalidate(user_id, *names):
+    """
+    Drop the cached payloads ``names`` (all of them by default) for a user and
+    tell the user's open event streams (api/events.py) to resend them.
+
+    Called inside the writing transaction, so it runs again on commit: a read
+    racing the transaction would otherwise re-cache the old rows for
+    USER_PAYLOAD_CACHE_TIMEOUT, and streams would resend that stale entry.
+    """
+    names = names or PAYLOAD_NAMES
+    _drop(user_id, names)
+    transaction.on_commit(lambda: _drop(user_id, names))
+
+
+def _drop(user_id, names):
+    cache.delete_many([payload_key(user_id, name) for name in names])
+    for name in names:
+        events.publish(user_id, name)
+
+
+def stats():
+    """Hit/miss counters for every cached payload since the cache was last cleared."""
+    result = {}
+    for name in PAYLOAD_NAMES:
+        hits = cache.get(_counter_key(name, 'hits'), 0)
+        misses = cache.get(_counter_key(name, 'misses'), 0)
+        total = hits + misses
+        result[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+    return result
@@ -0,0 +1,127 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .serializers import parse_field_paths, requested_field_paths
+
+
+class ConditionalGetMixin:
+    """
+    Answers If-None-Match / If-Modified-Since with 304 before anything is
+    serialized.
+
+    The validator comes from one indexed query: the row's ``updated_at`` for
+    detail views, or ``max(updated_at)`` plus the row count for list views
+    (the count catches deletes). List views only send an ETag, because
+    Last-Modified alone cannot show that a row was deleted.
+
+    Related rows rendered into the response count too: the relations in
+    ``validator_relations`` always, and those the client asks for with
+    ``?expand=``. Each adds its ``max(updated_at)``, and reverse relations
+    their row count. An expanded model without ``updated_at`` cannot be
+    versioned, so those requests skip conditional handling.
+    """
+    single_object = False
+    # Relations the serializer always embeds, as ORM paths
+    validator_relations = ()
+
+    def is_single_object(self):
+        return self.single_object or self.lookup_field in self.kwargs
+
+    def get_validator_queryset(self):
+        queryset = self.get_queryset()
+        if self.lookup_field in self.kwargs:
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[self.lookup_field]})
+        return queryset.order_by()
+
+    def get_validator_relations(self):
+        """``[(orm path, is reverse relation)]``, or None if one cannot be versioned."""
+        _, expand = requested_field_paths(self.request)
+        paths = list(self.validator_relations)
+        paths += expanded_paths(self.get_serializer_class(), expand)
+        model = self.get_validator_queryset().model
+        relations = []
+        for path in dict.fromkeys(paths):
+            related, many = model, False
+            for name in path.split('__'):
+                field = related._meta.get_field(name)
+                related, many = field.related_model, many or field.one_to_many or field.many_to_many
+            if 'updated_at' not in {column.name for column in related._meta.concrete_fields}:
+                return None
+            relations.append((path, many))
+        return relations
+
+    def get_validator(self):
+        """Return ``(version, last_modified)``, or None to skip conditional handling."""
+        relations = self.get_validator_relations()
+        if relations is None:
+            return None
+        queryset = self.get_validator_queryset()
+        if self.is_single_object() and not relations:
+            latest = queryset.values_list('updated_at', flat=True).first()
+            if latest is None:
+                return None
+            return latest.isoformat(), latest
+
+        # Joined relations repeat the rows, so counts must be distinct
+        aggregates = {'latest': Max('updated_at'), 'count': Count('pk', distinct=bool(relations))}
+        for index, (path, many) in enumerate(relations):
+            aggregates[f'latest_{index}'] = Max(f'{path}__updated_at')
+            if many:
+                aggregates[f'count_{index}'] = Count(f'{path}__pk', distinct=True)
+        aggregate = queryset.aggregate(**aggregates)
+        if self.is_single_object() and aggregate['latest'] is None:
+            return None
+        version = ':'.join(
+            '' if value is None else value.isoformat() if hasattr(value, 'isoformat') else str(value)
+            for value in aggregate.values()
+        )
+        last_modified = None
+        if self.is_single_object():
+            last_modified = max(
+                value for key, value in aggregate.items() if key.startswith('latest') and value is not None
+            )
+        return version, last_modified
+
+    def get_etag(self, request, version):
+        # The same rows render differently per user, query string and media type
+        source = '|'.join([
+            version, str(request.user.pk), request.get_full_path(), request.accepted_media_type or '',
+        ])
+        return quote_etag(hashlib.md5(source.encode()).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        validator = self.get_validator()
+        if validator is None:
+            return super().get(request, *args, **kwargs)
+
+        version, last_modified = validator
+        etag = self.get_etag(request, version)
+        last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified_ts)
+        if not_modified is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        else:
+            response = not_modified
+
+        response['ETag'] = etag
+        if last_modified_ts is not None:
+            response['Last-Modified'] = http_date(last_modified_ts)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+def expanded_paths(serializer_class, expand, prefix=''):
+    """ORM paths of the relations ``?expand=`` renders with ``serializer_class``."""
+    expandable = getattr(serializer_class, 'expandable_fields', {})
+    for name, nested in expand.items():
+        if name not in expandable:
+            continue
+        nested_class, _ = expandable[name]
+        yield prefix + name
+        yield from expanded_paths(nested_class, parse_field_paths(nested), f'{prefix}{name}__')
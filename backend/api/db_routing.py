@@ -0,0 +1,211 @@
+"""
+Read-replica routing.
+
+``ReplicaRoutingMiddleware`` lets GET/HEAD/OPTIONS requests under
+DATABASE_REPLICA_PATH_PREFIX read from the DATABASE_REPLICA_ALIAS
+connection; everything else (other requests, Celery tasks, management
+commands) reads and writes ``default``. Within a replica-eligible request,
+reads move to the primary as soon as anything asks for the write alias
+(``get_or_create``, ``select_for_update``, saves), so a request never reads
+its own writes from the replica.
+
+Read-your-writes across requests: once a request by a user writes to the
+primary, that user's requests read from the primary for
+DATABASE_REPLICA_STICKY_SECONDS, which should exceed the replica lag. The
+marker lives in the shared cache, so it holds across processes.
+
+Every query is also counted per alias, and the totals go out in a
+``Server-Timing`` header (``db-default;dur=1.8;desc="3 queries"``).
+"""
+import contextvars
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_routing = contextvars.ContextVar('refocus_db_routing', default=None)
+
+
+def replica_alias():
+    """The configured replica alias, or None when there is none."""
+    alias = settings.DATABASE_REPLICA_ALIAS
+    return alias if alias and alias in connections.settings and alias != DEFAULT_DB_ALIAS else None
+
+
+def sticky_key(user_id):
+    return f'refocus:db-sticky:{user_id}'
+
+
+class RequestRouting:
+    """Routing decisions and per-alias query counts for one request."""
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+        self.queries = {}
+
+    def pin_primary(self):
+        self.use_replica = False
+
+    def record(self, execute, sql, params, many, context):
+        alias = context['connection'].alias
+        if alias == DEFAULT_DB_ALIAS and sql.lstrip().upper().startswith(WRITE_PREFIXES):
+            self.wrote = True
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            count, duration = self.queries.get(alias, (0, 0.0))
+            self.queries[alias] = (count + 1, duration + time.perf_counter() - start)
+
+    def server_timing(self):
+        return ', '.join(
+            f'db-{alias};dur={duration * 1000:.1f};desc="{count} queries"'
+            for alias, (count, duration) in sorted(self.queries.items())
+        )
+
+
+def current_routing():
+    return _routing.get()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on every connection (``install_query_recorder``).
+    It finds the request through the context variable, which also reaches the
+    thread the async ORM runs queries on, where a wrapper entered around the
+    request would not: asgiref keeps connections per thread.
+    """
+    routing = _routing.get()
+    if routing is None:
+        return execute(sql, params, many, context)
+    return routing.record(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created fires again on reconnects of the same wrapper
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+def bind_user(user_id):
+    """Send the rest of the request to the primary if ``user_id`` wrote recently."""
+    routing = _routing.get()
+    if routing is not None and routing.use_replica and cache.get(sticky_key(user_id)):
+        routing.pin_primary()
+
+
+async def abind_user(user_id):
+    routing = _routing.get()
+    if routing is not None and routing.use_replica and await cache.aget(sticky_key(user_id)):
+        routing.pin_primary()
+
+
+def mark_user_wrote(user_id):
+    if replica_alias():
+        cache.set(sticky_key(user_id), True, settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+
+class ReplicaRouter:
+    """Database router for settings.DATABASE_ROUTERS; see the module docstring."""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        routing = _routing.get()
+        if routing is not None and routing.use_replica:
+            return replica_alias() or DEFAULT_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            # Later reads in this request must see what is about to be written
+            routing.pin_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            # Under ASGI the async views and the event stream run without a thread hop
+            markcoroutinefunction(self)
+
+    def routing_for(self, request):
+        return RequestRouting(
+            use_replica=(
+                replica_alias() is not None
+                and request.method in SAFE_METHODS
+                and request.path.startswith(settings.DATABASE_REPLICA_PATH_PREFIX)
+            )
+        )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = self.routing_for(request)
+        token = _routing.set(routing)
+        try:
+            session = getattr(request, 'session', None)
+            if session is not None and session.get(SESSION_KEY):
+                bind_user(session[SESSION_KEY])
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if routing.wrote:
+            self.mark_writer(request)
+        return self.finish(request, response, routing)
+
+    async def __acall__(self, request):
+        routing = self.routing_for(request)
+        token = _routing.set(routing)
+        try:
+            session = getattr(request, 'session', None)
+            user_id = await session.aget(SESSION_KEY) if session is not None else None
+            if user_id:
+                await abind_user(user_id)
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if routing.wrote:
+            # Resolving a lazy session user queries the database
+            await sync_to_async(self.mark_writer)(request)
+        return self.finish(request, response, routing)
+
+    @staticmethod
+    def mark_writer(request):
+        # DRF puts the user it authenticated on the underlying request
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            mark_user_wrote(user.pk)
+
+    @staticmethod
+    def finish(request, response, routing):
+        # Per-alias (count, seconds), for MetricsMiddleware further out
+        request.db_queries = routing.queries
+        if routing.queries:
+            response['Server-Timing'] = routing.server_timing()
+            logger.debug("%s %s queries by alias: %s", request.method, request.path, routing.queries)
+        return response
@@ -0,0 +1,113 @@
+"""
+Per-user live events for the SSE stream (``/api/stream/``).
+
+Publishers call ``publish(user_id, event, data)`` from ordinary sync code;
+the event goes out once the surrounding transaction commits. Delivery goes
+through a broker chosen by settings: the in-process broker by default (one
+server process, tests), or Redis pub/sub when EVENT_BROKER_URL is set so
+events reach streams held open by any node.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'refocus:events:user:'
+
+
+class InProcessBroker:
+    """Fans events out to asyncio queues of the streams open in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def publish(self, user_id, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            # Publishers run in worker threads; hand the message to the stream's loop
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+            except RuntimeError:
+                pass  # Loop already closed; the stream is going away
+
+    async def subscribe(self, user_id):
+        """Async iterator of messages for ``user_id`` until the consumer stops."""
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(entry)
+        try:
+            while True:
+                yield await entry[1].get()
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(user_id, set())
+                subscribers.discard(entry)
+                if not subscribers:
+                    self._subscribers.pop(user_id, None)
+
+    def subscriber_count(self, user_id):
+        with self._lock:
+            return len(self._subscribers.get(user_id, ()))
+
+
+class RedisBroker:
+    """Redis pub/sub, one channel per user, for streams spread over several nodes."""
+
+    def __init__(self, url):
+        import redis
+        import redis.asyncio
+
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+        self._async_redis = redis.asyncio
+
+    def publish(self, user_id, message):
+        self._client.publish(f'{CHANNEL_PREFIX}{user_id}', json.dumps(message))
+
+    async def subscribe(self, user_id):
+        client = self._async_redis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(f'{CHANNEL_PREFIX}{user_id}')
+        try:
+            async for item in pubsub.listen():
+                if item['type'] == 'message':
+                    yield json.loads(item['data'])
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                url = settings.EVENT_BROKER_URL
+                _broker = RedisBroker(url) if url else InProcessBroker()
+    return _broker
+
+
+def publish(user_id, event, data=None):
+    """Send ``event`` to the user's open streams after the current transaction commits."""
+    message = {'event': event, 'data': data}
+
+    def send():
+        try:
+            get_broker().publish(user_id, message)
+        except Exception:
+            # Live updates are best effort; clients resync when they reconnect
+            logger.warning("Publishing %s event for user %s failed", event, user_id, exc_info=True)
+
+    transaction.on_commit(send)
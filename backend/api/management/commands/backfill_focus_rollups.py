@@ -0,0 +1,57 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from api.models import DailyFocusRollup, DistractionLog, FocusSession
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user daily focus rollups from FocusSession and DistractionLog history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, dest='user_id', help='Only rebuild rollups for this user id')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        user_id = options['user_id']
+        tz = timezone.get_current_timezone()
+
+        sessions = FocusSession.objects.filter(completed=True)
+        distractions = DistractionLog.objects.all()
+        existing = DailyFocusRollup.objects.all()
+        if user_id:
+            sessions = sessions.filter(user_id=user_id)
+            distractions = distractions.filter(user_id=user_id)
+            existing = existing.filter(user_id=user_id)
+
+        # One grouped aggregate per source table; the database does the summing
+        totals = defaultdict(lambda: {'focus_minutes': 0, 'session_count': 0, 'distraction_minutes': 0})
+        session_rows = sessions.annotate(
+            day=TruncDate('start_time', tzinfo=tz)
+        ).values('user_id', 'day').annotate(
+            minutes=Sum('duration_minutes'), count=Count('id')
+        ).order_by()
+        for row in session_rows.iterator():
+            entry = totals[(row['user_id'], row['day'])]
+            entry['focus_minutes'] = row['minutes'] or 0
+            entry['session_count'] = row['count']
+
+        distraction_rows = distractions.annotate(
+            day=TruncDate('timestamp', tzinfo=tz)
+        ).values('user_id', 'day').annotate(minutes=Sum('duration_minutes')).order_by()
+        for row in distraction_rows.iterator():
+            totals[(row['user_id'], row['day'])]['distraction_minutes'] = row['minutes'] or 0
+
+        rollups = [
+            DailyFocusRollup(user_id=uid, date=day, **values)
+            for (uid, day), values in totals.items()
+        ]
+        with transaction.atomic():
+            existing.delete()
+            DailyFocusRollup.objects.bulk_create(rollups, batch_size=options['batch_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {len(rollups)} daily rollup rows')
+        )
@@ -0,0 +1,89 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+# (label, sync url name, async url name)
+ENDPOINTS = [
+    ('dashboard', 'dashboard-stats', 'async-dashboard-stats'),
+    ('streak', 'study-streak-detail', 'async-study-streak-detail'),
+    ('quotes', 'quote-list', 'async-quote-list'),
+    ('nudges', 'motivational-nudge-list', 'async-motivational-nudge-list'),
+]
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput of the sync and async read endpoints under concurrent load, '
+        'in process through the ASGI handler or against a running server (--base-url)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, dest='user_id', required=True, help='User id to authenticate as')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint and mode')
+        parser.add_argument('--concurrency', type=int, default=20, help='Requests in flight at once')
+        parser.add_argument('--base-url', help='Benchmark a running server, e.g. http://127.0.0.1:8000')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(pk=options['user_id'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user_id']} does not exist")
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        total, concurrency = options['requests'], options['concurrency']
+
+        self.stdout.write(f"{'endpoint':<10} {'mode':<6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+        for label, sync_name, async_name in ENDPOINTS:
+            for mode, name in (('sync', sync_name), ('async', async_name)):
+                path = reverse(name)
+                if options['base_url']:
+                    elapsed, latencies, errors = self.run_http(
+                        options['base_url'].rstrip('/') + path, headers, total, concurrency
+                    )
+                else:
+                    elapsed, latencies, errors = async_to_sync(self.run_asgi)(path, headers, total, concurrency)
+                rps = total / elapsed if elapsed else 0.0
+                p50 = statistics.median(latencies) * 1000
+                p95 = (statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]) * 1000
+                self.stdout.write(f"{label:<10} {mode:<6} {rps:>9.1f} {p50:>8.2f} {p95:>8.2f} {errors:>7}")
+
+    async def run_asgi(self, path, headers, total, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, errors = [], 0
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code != 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        return time.perf_counter() - started, latencies, errors
+
+    def run_http(self, url, headers, total, concurrency):
+        session = requests.Session()
+
+        def one(_):
+            start = time.perf_counter()
+            try:
+                ok = session.get(url, headers=headers, timeout=30).status_code == 200
+            except requests.RequestException:
+                ok = False
+            return time.perf_counter() - start, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - started
+        return elapsed, [latency for latency, _ in outcomes], sum(1 for _, ok in outcomes if not ok)
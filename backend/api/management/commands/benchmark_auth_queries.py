@@ -0,0 +1,70 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+from api.authentication import CachedJWTAuthentication, invalidate_user
+
+ENDPOINTS = [
+    'dashboard-stats',
+    'study-streak-detail',
+    'profile-detail',
+    'goal-list-create',
+    'motivational-nudge-list',
+    'quote-list',
+]
+
+class Command(BaseCommand):
+    help = (
+        'Compare queries and latency per request of the read endpoints with the stock '
+        'JWTAuthentication and with CachedJWTAuthentication'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, dest='user_id', required=True, help='User id to authenticate as')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint and mode')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(pk=options['user_id'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user_id']} does not exist")
+        # The test client's default 'testserver' host is rejected outside of tests
+        host = next((h for h in settings.ALLOWED_HOSTS if h != '*' and not h.startswith('.')), 'localhost')
+        client = Client(HTTP_HOST=host, HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        modes = (('stock', JWTAuthentication), ('cached', CachedJWTAuthentication))
+
+        self.stdout.write(f"{'endpoint':<24} {'mode':<7} {'queries':>8} {'auth q':>7} {'p50 ms':>8}")
+        default_classes = APIView.authentication_classes
+        try:
+            for name in ENDPOINTS:
+                path = reverse(name)
+                for mode, authentication in modes:
+                    APIView.authentication_classes = [authentication, SessionAuthentication]
+                    invalidate_user(user.pk)
+                    client.get(path)  # Warm the payload and user caches
+                    queries, auth_queries, latencies = [], [], []
+                    for _ in range(options['requests']):
+                        with CaptureQueriesContext(connection) as ctx:
+                            start = time.perf_counter()
+                            response = client.get(path)
+                            latencies.append(time.perf_counter() - start)
+                        if response.status_code != 200:
+                            raise CommandError(f'{path} returned {response.status_code}')
+                        queries.append(len(ctx))
+                        auth_queries.append(sum('FROM "auth_user"' in q['sql'] for q in ctx.captured_queries))
+                    self.stdout.write(
+                        f"{name:<24} {mode:<7} {statistics.mean(queries):>8.2f} "
+                        f"{statistics.mean(auth_queries):>7.2f} {statistics.median(latencies) * 1000:>8.2f}"
+                    )
+        finally:
+            APIView.authentication_classes = default_classes
@@ -0,0 +1,107 @@
+import json
+import platform
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment, teardown_test_environment
+from api import benchmarks
+
+DEFAULT_BASELINE = Path(__file__).resolve().parents[2] / 'benchmark_baseline.json'
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway in-memory SQLite database, measure p50/p95 latency and query counts '
+        'of every API route and fail when one regresses against the JSON baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Users to seed')
+        parser.add_argument('--days', type=int, default=90, help='Days of history per user')
+        parser.add_argument('--quotes', type=int, default=200, help='Motivational quotes to seed')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the generated history')
+        parser.add_argument('--iterations', type=int, default=20, help='Warm requests per route (x3 for priority routes)')
+        parser.add_argument('--routes', nargs='+', metavar='NAME', help='Only measure these URL names')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline JSON file')
+        parser.add_argument('--update-baseline', action='store_true', help='Write this run as the new baseline')
+        parser.add_argument('--output', help='Also write this run to this JSON file')
+        parser.add_argument('--latency-ratio', type=float, default=1.5,
+                            help='Fail when p50 exceeds the baseline by this factor...')
+        parser.add_argument('--p95-ratio', type=float, default=3.0, help='...or p95 by this factor...')
+        parser.add_argument('--latency-floor-ms', type=float, default=5.0,
+                            help='...and by at least this many milliseconds')
+        parser.add_argument('--query-slack', type=int, default=0, help='Extra queries per request tolerated')
+
+    def handle(self, *args, **options):
+        routes = benchmarks.ROUTES
+        if options['routes']:
+            unknown = set(options['routes']) - {route.name for route in routes}
+            if unknown:
+                raise CommandError(f"Unknown or unmeasured routes: {', '.join(sorted(unknown))}")
+            routes = [route for route in routes if route.name in options['routes']]
+        baseline_path = Path(options['baseline'])
+        baseline = None
+        if not options['update_baseline']:
+            if not baseline_path.exists():
+                raise CommandError(f'No baseline at {baseline_path}; run with --update-baseline to record one')
+            baseline = json.loads(baseline_path.read_text())
+
+        # Test-client hosts, locmem email; DEBUG off as in production
+        setup_test_environment(debug=False)
+        try:
+            with benchmarks.throwaway_database(), benchmarks.offline_services():
+                self.stdout.write(f"Seeding {options['users']} users x {options['days']} days...")
+                fixture = benchmarks.seed(options['users'], options['days'], options['quotes'], options['seed'])
+                results = benchmarks.measure(fixture, routes, options['iterations'])
+        except AssertionError as exc:
+            raise CommandError(str(exc))
+        finally:
+            teardown_test_environment()
+
+        run = {
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'machine': platform.machine(),
+            },
+            'seed': {key: options[key] for key in ('users', 'days', 'quotes', 'seed', 'iterations')},
+            'routes': results,
+        }
+        self.report(results, baseline['routes'] if baseline else {})
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(run, indent=2, sort_keys=True) + '\n')
+        if options['update_baseline']:
+            if options['routes'] and baseline_path.exists():
+                # A partial run only replaces the routes it measured
+                run['routes'] = {**json.loads(baseline_path.read_text())['routes'], **results}
+            baseline_path.write_text(json.dumps(run, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Wrote baseline for {len(results)} routes to {baseline_path}'))
+            return
+
+        if baseline['seed'] != run['seed']:
+            self.stdout.write(self.style.WARNING(
+                f"Baseline was recorded with {baseline['seed']}; this run used {run['seed']}"
+            ))
+        regressions = benchmarks.compare(
+            results, baseline['routes'], options['latency_ratio'], options['p95_ratio'],
+            options['latency_floor_ms'], options['query_slack'],
+        )
+        for regression in regressions:
+            self.stdout.write(self.style.ERROR(regression))
+        if regressions:
+            raise CommandError(f'{len(regressions)} regressions against {baseline_path}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions against {baseline_path}'))
+
+    def report(self, results, baseline):
+        self.stdout.write(
+            f"{'route':<36} {'queries':>7} {'cold q':>6} {'p50 ms':>8} {'p95 ms':>8} {'base p95':>9}"
+        )
+        # Priority routes first, then in ROUTES order
+        for key, result in sorted(results.items(), key=lambda item: not item[1]['priority']):
+            base = baseline.get(key)
+            base_p95 = f"{base['p95_ms']:>9.2f}" if base else f"{'-':>9}"
+            marker = '*' if result['priority'] else ' '
+            self.stdout.write(
+                f"{marker}{key:<35} {result['queries']:>7} {result['cold_queries']:>6} "
+                f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {base_p95}"
+            )
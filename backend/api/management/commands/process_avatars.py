@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from api.avatars import InvalidAvatar, store_original
+from api.models import UserProfile
+from api.tasks import enqueue_avatar_processing, process_avatar
+
+class Command(BaseCommand):
+    help = (
+        'Render resized variants for avatars that have none, moving uploads from before '
+        'content addressing to their content-hash path first'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, dest='user_id', help='Only process this user id')
+        parser.add_argument('--enqueue', action='store_true', help='Queue Celery tasks instead of rendering here')
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.exclude(avatar='').exclude(avatar__isnull=True).filter(avatar_variants={})
+        if options['user_id']:
+            profiles = profiles.filter(user_id=options['user_id'])
+
+        outcomes = {}
+        for profile in profiles.only('pk', 'avatar', 'avatar_hash').iterator():
+            if not profile.avatar_hash:
+                legacy_name = profile.avatar.name
+                try:
+                    with profile.avatar.open('rb') as legacy:
+                        digest, name = store_original(legacy)
+                except (InvalidAvatar, OSError) as exc:
+                    self.stderr.write(f'Profile {profile.pk}: {exc}')
+                    outcomes['failed'] = outcomes.get('failed', 0) + 1
+                    continue
+                UserProfile.objects.filter(pk=profile.pk).update(avatar=name, avatar_hash=digest)
+                profile.avatar.storage.delete(legacy_name)
+                profile.avatar_hash = digest
+
+            if options['enqueue']:
+                enqueue_avatar_processing(profile.pk, profile.avatar_hash)
+                outcome = 'queued'
+            else:
+                outcome = process_avatar(profile.pk, profile.avatar_hash)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        summary = ', '.join(f'{count} {outcome}' for outcome, count in sorted(outcomes.items())) or 'nothing to do'
+        self.stdout.write(self.style.SUCCESS(f'Avatars: {summary}'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from api.token_blacklist import prune_expired_tokens
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted refresh tokens in chunks of TOKEN_PRUNE_CHUNK_SIZE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Rows deleted per statement')
+
+    def handle(self, *args, **options):
+        deleted = prune_expired_tokens(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired outstanding tokens'))
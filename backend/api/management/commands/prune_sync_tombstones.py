@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from api.sync import prune_sync_tombstones
+
+class Command(BaseCommand):
+    help = 'Delete sync tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS'
+
+    def handle(self, *args, **options):
+        deleted = prune_sync_tombstones()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired sync tombstones'))
@@ -0,0 +1,73 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from api import cache as payload_cache
+from api.models import FocusSession, StudyDayBitmap, StudyStreak, UserProfile
+from api.streaks import bits_to_bytes, day_index, load_timezone, refresh_study_streak
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-user study-day bitmaps and streak counters from FocusSession history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, dest='user_id', help='Only rebuild bitmaps for this user id')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Sessions fetched per round trip')
+
+    def handle(self, *args, **options):
+        user_id = options['user_id']
+        started = timezone.now()
+
+        sessions = FocusSession.objects.filter(completed=True)
+        profiles = UserProfile.objects.all()
+        bitmaps = StudyDayBitmap.objects.all()
+        streaks = StudyStreak.objects.all()
+        if user_id:
+            sessions = sessions.filter(user_id=user_id)
+            profiles = profiles.filter(user_id=user_id)
+            bitmaps = bitmaps.filter(user_id=user_id)
+            streaks = streaks.filter(user_id=user_id)
+
+        zones = {uid: load_timezone(name) for uid, name in profiles.values_list('user_id', 'timezone')}
+        utc = load_timezone('UTC')
+
+        # One pass over the history ordered by user, so only one user's bits are held at a time
+        rows = sessions.order_by('user_id', 'start_time').values_list('user_id', 'start_time')
+        users = 0
+        current_user, years = None, defaultdict(int)
+        for uid, start_time in rows.iterator(chunk_size=options['chunk_size']):
+            if uid != current_user:
+                if current_user is not None:
+                    self.flush(current_user, years, zones.get(current_user, utc))
+                    users += 1
+                current_user, years = uid, defaultdict(int)
+            day = start_time.astimezone(zones.get(uid, utc)).date()
+            years[day.year] |= 1 << day_index(day)
+        if current_user is not None:
+            self.flush(current_user, years, zones.get(current_user, utc))
+            users += 1
+
+        # Users with no completed sessions left keep neither bitmaps nor a streak
+        bitmaps.filter(updated_at__lt=started).delete()
+        stale = streaks.filter(updated_at__lt=started)
+        stale_users = list(stale.values_list('user_id', flat=True))
+        stale.update(
+            current_streak=0, longest_streak=0, total_study_days=0, last_study_date=None, updated_at=timezone.now(),
+        )
+        for uid in stale_users:
+            payload_cache.invalidate(uid, payload_cache.DASHBOARD, payload_cache.STREAK)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt study-day bitmaps for {users} users')
+        )
+
+    def flush(self, user_id, years, tz):
+        with transaction.atomic():
+            StudyDayBitmap.objects.filter(user_id=user_id).delete()
+            StudyDayBitmap.objects.bulk_create([
+                StudyDayBitmap(user_id=user_id, year=year, days=bits_to_bytes(bits))
+                for year, bits in years.items()
+            ])
+            streak = refresh_study_streak(user_id, tz)
+            # Touch the row so the final clean-up pass leaves it alone
+            StudyStreak.objects.filter(pk=streak.pk).update(updated_at=timezone.now())
@@ -0,0 +1,309 @@
+"""
+Request and task metrics in the Prometheus text format, served at
+``/api/_metrics``.
+
+``MetricsMiddleware`` records per URL name: a latency histogram, the DB
+queries and DB time per alias (counted by the execute wrapper of
+``api.db_routing``), time spent in serializers' ``to_representation`` and
+response sizes. Celery signals record task durations and the item counts
+tasks return (``{'sent': 3, 'failed': 1}``, a number or an outcome string).
+
+Everything is kept in memory per process; recording is a dict update under
+a lock. Each process also publishes a snapshot to the shared cache every
+METRICS_PUBLISH_SECONDS, and the endpoint sums the snapshots of every live
+process, so a scrape of any web worker also covers the other workers and
+the Celery workers (with a shared cache such as Redis; with locmem each
+process only reports itself).
+"""
+import bisect
+import contextvars
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseForbidden
+
+NAMESPACE = 'refocus'
+SNAPSHOT_KEY_PREFIX = 'refocus:metrics:process:'
+PROCESS_INDEX_KEY = 'refocus:metrics:processes'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 1800.0)
+
+# name: (type, help, buckets)
+METRICS = {
+    'http_request_duration_seconds': ('histogram', 'Request latency by URL name', LATENCY_BUCKETS),
+    'http_response_bytes': ('histogram', 'Response body size by URL name', BYTES_BUCKETS),
+    'http_db_queries_total': ('counter', 'Database queries run by requests, by URL name and alias', None),
+    'http_db_seconds_total': ('counter', 'Time spent in database queries by requests, by URL name and alias', None),
+    'http_serializer_seconds_total': ('counter', 'Time spent serializing responses by URL name', None),
+    'celery_task_duration_seconds': ('histogram', 'Celery task run time by task and state', TASK_BUCKETS),
+    'celery_task_items_total': ('counter', 'Items reported by Celery task results, by task and outcome', None),
+}
+
+
+class Registry:
+    """Counters and histograms keyed by ``(metric name, label pairs)``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, labels, amount=1.0):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = METRICS[name][2]
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # Per-bucket counts (made cumulative on export), then sum and count
+                histogram = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram[0][bisect.bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'histograms': {key: [list(h[0]), h[1], h[2]] for key, h in self._histograms.items()},
+            }
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = Registry()
+
+_serializer_time = contextvars.ContextVar('refocus_serializer_time', default=None)
+
+
+def merge(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for key, value in snapshot['counters'].items():
+            counters[key] = counters.get(key, 0.0) + value
+        for key, (buckets, total, count) in snapshot['histograms'].items():
+            merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+            merged[1] += total
+            merged[2] += count
+    return {'counters': counters, 'histograms': histograms}
+
+
+def _labels(pairs, extra=()):
+    pairs = tuple(pairs) + tuple(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    """The Prometheus text exposition (format 0.0.4) of ``snapshot``."""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        full_name = f'{NAMESPACE}_{name}'
+        lines.append(f'# HELP {full_name} {help_text}')
+        lines.append(f'# TYPE {full_name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(snapshot['counters'].items()):
+                if metric == name:
+                    lines.append(f'{full_name}{_labels(labels)} {_number(value)}')
+            continue
+        for (metric, labels), (counts, total, count) in sorted(snapshot['histograms'].items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else _number(bound)
+                lines.append(f'{full_name}_bucket{_labels(labels, [("le", le)])} {cumulative}')
+            lines.append(f'{full_name}_sum{_labels(labels)} {_number(total)}')
+            lines.append(f'{full_name}_count{_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class Publisher:
+    """Shares this process's snapshot through the cache (see the module docstring)."""
+
+    def __init__(self):
+        self._published_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def process_id(self):
+        # Looked up each time: workers forked after import get their own id
+        return f'{socket.gethostname()}-{os.getpid()}'
+
+    def due(self):
+        """Whether this caller should publish now; at most one per METRICS_PUBLISH_SECONDS gets True."""
+        now = time.monotonic()
+        if now - self._published_at < settings.METRICS_PUBLISH_SECONDS:
+            return False
+        with self._lock:
+            if now - self._published_at < settings.METRICS_PUBLISH_SECONDS:
+                return False
+            self._published_at = now
+        return True
+
+    def maybe_publish(self):
+        if self.due():
+            self.publish()
+
+    def publish(self):
+        ttl = settings.METRICS_PROCESS_TTL_SECONDS
+        try:
+            cache.set(SNAPSHOT_KEY_PREFIX + self.process_id, registry.snapshot(), ttl)
+            index = cache.get(PROCESS_INDEX_KEY) or {}
+            cutoff = time.time() - ttl
+            index = {pid: seen for pid, seen in index.items() if seen > cutoff}
+            index[self.process_id] = time.time()
+            cache.set(PROCESS_INDEX_KEY, index, None)
+        except Exception:
+            pass  # Metrics must never fail the request that happened to publish them
+
+    def collect(self):
+        """This process's live snapshot merged with the latest one of every other process."""
+        others = [pid for pid in (cache.get(PROCESS_INDEX_KEY) or {}) if pid != self.process_id]
+        snapshots = cache.get_many([SNAPSHOT_KEY_PREFIX + pid for pid in others]).values()
+        return merge([registry.snapshot(), *snapshots])
+
+
+publisher = Publisher()
+
+
+@contextmanager
+def serializer_timer():
+    """Add the time spent inside to the request's serializer time (outermost call only)."""
+    state = _serializer_time.get()
+    if state is None or state[1]:
+        yield
+        return
+    state[1] = 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        state[0] += time.perf_counter() - start
+        state[1] = 0
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            # Outermost: a sync-only middleware here would adapt every ASGI request to sync
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        serializer_state = [0.0, 0]
+        token = _serializer_time.set(serializer_state)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _serializer_time.reset(token)
+        self.record(request, response, time.perf_counter() - start, serializer_state[0])
+        publisher.maybe_publish()
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        serializer_state = [0.0, 0]
+        token = _serializer_time.set(serializer_state)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _serializer_time.reset(token)
+        self.record(request, response, time.perf_counter() - start, serializer_state[0])
+        if publisher.due():
+            await sync_to_async(publisher.publish)()
+        return response
+
+    @staticmethod
+    def record(request, response, elapsed, serializer_seconds):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else None) or 'unresolved'
+        registry.observe('http_request_duration_seconds', {
+            'view': view, 'method': request.method, 'status': response.status_code,
+        }, elapsed)
+        if not response.streaming:
+            registry.observe('http_response_bytes', {'view': view}, len(response.content))
+        if serializer_seconds:
+            registry.inc('http_serializer_seconds_total', {'view': view}, serializer_seconds)
+        for alias, (count, duration) in getattr(request, 'db_queries', {}).items():
+            registry.inc('http_db_queries_total', {'view': view, 'alias': alias}, count)
+            registry.inc('http_db_seconds_total', {'view': view, 'alias': alias}, duration)
+
+
+def task_item_counts(result):
+    """Turn a task's return value into ``{outcome: count}``."""
+    if isinstance(result, bool) or result is None:
+        return {}
+    if isinstance(result, (int, float)):
+        return {'items': result}
+    if isinstance(result, str):
+        return {result: 1}
+    if isinstance(result, dict):
+        return {key: value for key, value in result.items() if isinstance(value, (int, float)) and not isinstance(value, bool)}
+    return {}
+
+
+_task_started = {}
+
+
+def task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+def task_postrun(task_id=None, task=None, retval=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    name = getattr(task, 'name', 'unknown')
+    if started is not None:
+        registry.observe('celery_task_duration_seconds', {'task': name, 'state': state or 'UNKNOWN'},
+                         time.perf_counter() - started)
+    if state == 'SUCCESS':
+        for outcome, count in task_item_counts(retval).items():
+            registry.inc('celery_task_items_total', {'task': name, 'outcome': outcome}, count)
+    publisher.maybe_publish()
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; open to METRICS_ALLOWED_IPS or a METRICS_TOKEN bearer."""
+    token = settings.METRICS_TOKEN
+    authorized = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS or (
+        token and request.headers.get('Authorization') == f'Bearer {token}'
+    )
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(render(publisher.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:13
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Build the rollups from the existing history, as ``backfill_focus_rollups``
+    does. The dashboard reads only rollups, so without them every existing
+    user's today and weekly minutes would read as zero.
+    """
+    FocusSession = apps.get_model('api', 'FocusSession')
+    DistractionLog = apps.get_model('api', 'DistractionLog')
+    DailyFocusRollup = apps.get_model('api', 'DailyFocusRollup')
+    tz = timezone.get_current_timezone()
+
+    totals = defaultdict(lambda: {'focus_minutes': 0, 'session_count': 0, 'distraction_minutes': 0})
+    sessions = FocusSession.objects.filter(completed=True).annotate(
+        day=TruncDate('start_time', tzinfo=tz)
+    ).values('user_id', 'day').annotate(minutes=Sum('duration_minutes'), count=Count('id')).order_by()
+    for row in sessions.iterator():
+        entry = totals[(row['user_id'], row['day'])]
+        entry['focus_minutes'] = row['minutes'] or 0
+        entry['session_count'] = row['count']
+    distractions = DistractionLog.objects.annotate(
+        day=TruncDate('timestamp', tzinfo=tz)
+    ).values('user_id', 'day').annotate(minutes=Sum('duration_minutes')).order_by()
+    for row in distractions.iterator():
+        totals[(row['user_id'], row['day'])]['distraction_minutes'] = row['minutes'] or 0
+
+    DailyFocusRollup.objects.bulk_create(
+        [DailyFocusRollup(user_id=uid, date=day, **values) for (uid, day), values in totals.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_goal_progress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyFocusRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('focus_minutes', models.PositiveIntegerField(default=0)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('distraction_minutes', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='unique_daily_rollup_per_user')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
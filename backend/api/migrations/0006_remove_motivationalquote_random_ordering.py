@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_dailyfocusrollup'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='motivationalquote',
+            options={},
+        ),
+    ]
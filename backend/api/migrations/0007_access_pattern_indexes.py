@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_remove_motivationalquote_random_ordering'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='distractionlog',
+            index=models.Index(fields=['user', 'timestamp'], name='api_distrac_user_id_89a47f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emotionalcheckin',
+            index=models.Index(fields=['user', 'timestamp'], name='api_emotion_user_id_f7a64a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='focussession',
+            index=models.Index(fields=['user', 'start_time'], name='api_focusse_user_id_5ee4f4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='focussession',
+            index=models.Index(fields=['user', 'completed', 'start_time'], name='api_focusse_user_id_245eaa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(fields=['user', 'created_at'], name='api_goal_user_id_d72f13_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='motivationalnudge',
+            index=models.Index(fields=['user', 'read', 'created_at'], name='api_motivat_user_id_2827b1_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.5 on 2026-10-17 11:35
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+from api.streaks import bits_to_bytes, day_index, load_timezone, streak_stats
+
+
+def backfill_study_days(apps, schema_editor):
+    """
+    Build the bitmaps and streak counters from the existing session history,
+    as ``rebuild_study_bitmaps`` does. Streak reads are computed from the
+    bitmaps, so without them every existing streak would read as zero.
+    """
+    FocusSession = apps.get_model('api', 'FocusSession')
+    StudyDayBitmap = apps.get_model('api', 'StudyDayBitmap')
+    StudyStreak = apps.get_model('api', 'StudyStreak')
+    UserProfile = apps.get_model('api', 'UserProfile')
+
+    zones = {uid: load_timezone(name) for uid, name in UserProfile.objects.values_list('user_id', 'timezone')}
+    utc = load_timezone('UTC')
+    rows = FocusSession.objects.filter(completed=True).order_by('user_id').values_list('user_id', 'start_time')
+    by_user = defaultdict(lambda: defaultdict(int))
+    for uid, start_time in rows.iterator(chunk_size=2000):
+        day = start_time.astimezone(zones.get(uid, utc)).date()
+        by_user[uid][day.year] |= 1 << day_index(day)
+
+    for uid, years in by_user.items():
+        StudyDayBitmap.objects.bulk_create([
+            StudyDayBitmap(user_id=uid, year=year, days=bits_to_bytes(bits)) for year, bits in years.items()
+        ])
+        stats = streak_stats(years, timezone.now().astimezone(zones.get(uid, utc)).date())
+        if not StudyStreak.objects.filter(user_id=uid).update(**stats):
+            StudyStreak.objects.create(user_id=uid, **stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_motivation_subscription_claims'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudyDayBitmap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('days', models.BinaryField(max_length=46)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='study_day_bitmaps', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'year'), name='unique_study_bitmap_per_user_year')],
+            },
+        ),
+        migrations.RunPython(backfill_study_days, migrations.RunPython.noop),
+    ]
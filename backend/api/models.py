@@ -7,6 +7,10 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(blank=True, max_length=500)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # sha256 of the original upload, and the storage names of its resized variants
+    # ({size: {format: name}}); empty until process_avatar has run
+    avatar_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    avatar_variants = models.JSONField(default=dict, blank=True)
     timezone = models.CharField(max_length=50, default='UTC')
     daily_goal_hours = models.PositiveIntegerField(default=8)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -41,6 +45,12 @@ class Goal(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["user", "updated_at"]),
+        ]
+
     def __str__(self):
         return f"{self.user.username}: {self.title}"
 
@@ -55,10 +65,18 @@ class FocusSession(models.Model):
     session_type = models.CharField(max_length=20, choices=SESSION_TYPE_CHOICES, default='pomodoro')
     duration_minutes = models.PositiveIntegerField()
     goal = models.ForeignKey(Goal, on_delete=models.SET_NULL, null=True, blank=True, related_name='focus_sessions')
-    start_time = models.DateTimeField(auto_now_add=True)
+    start_time = models.DateTimeField(default=timezone.now)
     end_time = models.DateTimeField(blank=True, null=True)
     completed = models.BooleanField(default=False)
     notes = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "start_time"]),
+            models.Index(fields=["user", "completed", "start_time"]),
+            models.Index(fields=["user", "updated_at"]),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.session_type} ({self.duration_minutes}min)"
@@ -78,7 +96,14 @@ class DistractionLog(models.Model):
     description = models.TextField(blank=True)
     duration_minutes = models.PositiveIntegerField(default=0)
     focus_session = models.ForeignKey(FocusSession, on_delete=models.SET_NULL, null=True, blank=True, related_name='distractions')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "timestamp"]),
+            models.Index(fields=["user", "updated_at"]),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.distraction_type} at {self.timestamp}"
@@ -97,7 +122,14 @@ class EmotionalCheckIn(models.Model):
     energy_level = models.PositiveIntegerField(choices=[(i, i) for i in range(1, 11)])
     stress_level = models.PositiveIntegerField(choices=[(i, i) for i in range(1, 11)])
     notes = models.TextField(blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "timestamp"]),
+            models.Index(fields=["user", "updated_at"]),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.mood} mood at {self.timestamp}"
@@ -117,6 +149,13 @@ class MotivationalNudge(models.Model):
     read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     scheduled_for = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "read", "created_at"]),
+            models.Index(fields=["user", "updated_at"]),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.nudge_type}: {self.title}"
@@ -132,6 +171,53 @@ class StudyStreak(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.current_streak} day streak"
 
+# One bit per local calendar day with a completed session (see api/streaks.py)
+class StudyDayBitmap(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='study_day_bitmaps')
+    year = models.PositiveSmallIntegerField()
+    days = models.BinaryField(max_length=46)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "year"], name="unique_study_bitmap_per_user_year"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.year} study days"
+
+# Per-user, per-day totals kept in sync with FocusSession/DistractionLog (see api/rollups.py)
+class DailyFocusRollup(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()
+    focus_minutes = models.PositiveIntegerField(default=0)
+    session_count = models.PositiveIntegerField(default=0)
+    distraction_minutes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "date"], name="unique_daily_rollup_per_user"),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.date}: {self.focus_minutes}min"
+
+# Record of a deleted row so sync clients can drop it (see SyncFeed)
+class SyncTombstone(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sync_tombstones')
+    resource = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "deleted_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.resource} #{self.object_id} deleted at {self.deleted_at}"
+
 # Hourly motivational email subscription per user/goal label
 class MotivationSubscription(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='motivation_subscriptions')
@@ -139,12 +225,17 @@ class MotivationSubscription(models.Model):
     active = models.BooleanField(default=True)
     interval_minutes = models.PositiveIntegerField(default=60)
     next_send_at = models.DateTimeField(default=timezone.now)
+    # Worker lease (see api/tasks.py) and the last slot an email went out for
+    claim_token = models.UUIDField(null=True, blank=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    last_sent_slot = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         indexes = [
             models.Index(fields=["active", "next_send_at"]),
+            models.Index(fields=["claim_token"]),
         ]
 
     def __str__(self):
@@ -167,8 +258,5 @@ class MotivationalQuote(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
-    class Meta:
-        ordering = ['?']  # Random ordering
-    
     def __str__(self):
         return f"{self.text[:50]}... - {self.author}"
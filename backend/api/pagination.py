@@ -0,0 +1,135 @@
+import base64
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first keyset pagination on ``(view.cursor_ordering_field, id)``.
+
+    Each page is fetched with ``WHERE (time, id) < (cursor time, cursor id)``
+    so there is no ``COUNT(*)`` and no ``OFFSET`` scan, and page cost stays
+    flat however long the history is. Clients that still send ``?page=`` (or
+    ``?pagination=page``) get the classic page-number response instead.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.page_number_pagination = PageNumberPagination()
+        self.use_page_numbers = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.uses_page_numbers(request):
+            queryset = queryset.order_by(f'-{view.cursor_ordering_field}', '-id')
+            return self.page_number_pagination.paginate_queryset(queryset, request, view)
+        queryset, cursor = self.get_page_queryset(queryset, request, view)
+        return self.set_page(list(queryset[:self.page_size + 1]), cursor)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views; the page is read with async iteration."""
+        if self.uses_page_numbers(request):
+            return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+        queryset, cursor = self.get_page_queryset(queryset, request, view)
+        return self.set_page([obj async for obj in queryset[:self.page_size + 1]], cursor)
+
+    def uses_page_numbers(self, request):
+        self.request = request
+        self.use_page_numbers = (
+            self.page_number_pagination.page_query_param in request.query_params
+            or request.query_params.get('pagination') == 'page'
+        )
+        return self.use_page_numbers
+
+    def get_page_queryset(self, queryset, request, view):
+        field = view.cursor_ordering_field
+        cursor = self.decode_cursor(request)
+        queryset = queryset.annotate(cursor_position=F(field))
+
+        if cursor is None:
+            queryset = queryset.order_by(f'-{field}', '-id')
+        elif cursor['reverse']:
+            queryset = queryset.filter(
+                Q(**{f'{field}__gt': cursor['position']})
+                | Q(**{field: cursor['position'], 'id__gt': cursor['id']})
+            ).order_by(field, 'id')
+        else:
+            queryset = queryset.filter(
+                Q(**{f'{field}__lt': cursor['position']})
+                | Q(**{field: cursor['position'], 'id__lt': cursor['id']})
+            ).order_by(f'-{field}', '-id')
+        return queryset, cursor
+
+    def set_page(self, results, cursor):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if cursor is not None and cursor['reverse']:
+            results.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = cursor is not None, has_more
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        if self.use_page_numbers:
+            return self.page_number_pagination.get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, obj, reverse):
+        token = json.dumps({
+            'p': obj.cursor_position.isoformat(),
+            'id': obj.pk,
+            'r': int(reverse),
+        }, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(token.encode()).decode()
+        url = remove_query_param(self.request.build_absolute_uri(), 'page')
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            token = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            return {
+                'position': datetime.fromisoformat(token['p']),
+                'id': int(token['id']),
+                'reverse': bool(token.get('r')),
+            }
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
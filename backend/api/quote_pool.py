@@ -0,0 +1,70 @@
+import random
+import threading
+import uuid
+
+from django.core.cache import cache
+
+from .models import MotivationalQuote
+
+VERSION_KEY = 'refocus:quote-pool:version'
+
+
+class QuotePool:
+    """
+    In-process pool of active quote ids, grouped by category.
+
+    Picking a random quote is an O(1) ``random.choice`` over the ids followed
+    by a primary-key lookup, instead of ``ORDER BY RAND()`` over the table.
+    The pool is tagged with a version token kept in the shared cache; writes
+    to ``MotivationalQuote`` replace the token (see api/signals.py) and every
+    process reloads its pool the next time it is used.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._ids = {}
+        self._all_ids = []
+
+    def _current_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def _load(self, version):
+        by_category = {}
+        all_ids = []
+        rows = MotivationalQuote.objects.filter(is_active=True).values_list('id', 'category').order_by('id')
+        for quote_id, category in rows:
+            by_category.setdefault(category, []).append(quote_id)
+            all_ids.append(quote_id)
+        self._ids = by_category
+        self._all_ids = all_ids
+        self._version = version
+
+    def ids(self, category=None):
+        """Active quote ids, optionally limited to one category."""
+        version = self._current_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._load(version)
+        if category:
+            return self._ids.get(category, [])
+        return self._all_ids
+
+    def random_id(self, category=None):
+        ids = self.ids(category)
+        return random.choice(ids) if ids else None
+
+    def sample_ids(self, k, category=None):
+        ids = self.ids(category)
+        return random.sample(ids, min(k, len(ids)))
+
+    def invalidate(self):
+        cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+quote_pool = QuotePool()
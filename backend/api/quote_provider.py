@@ -0,0 +1,136 @@
+import logging
+import random
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import MotivationalQuote
+
+logger = logging.getLogger(__name__)
+
+
+LOCAL_QUOTES = [
+    "Believe you can and you're halfway there.",
+    "Success is the sum of small efforts repeated day in and day out.",
+    "The secret of getting ahead is getting started.",
+    "Don’t watch the clock; do what it does. Keep going.",
+    "What we fear of doing most is usually what we most need to do.",
+]
+
+POOL_KEY = 'refocus:quote-provider:pool'
+
+
+class RemoteQuoteSource:
+    """Bulk quotes from a zenquotes.io-compatible API (one request per fill)."""
+    name = 'remote'
+
+    def __init__(self, url=None, timeout=None):
+        self.url = url or settings.MOTIVATION_QUOTES_URL
+        self.timeout = timeout or settings.MOTIVATION_QUOTES_TIMEOUT
+
+    def fetch(self):
+        resp = requests.get(self.url, timeout=self.timeout)
+        resp.raise_for_status()
+        data = resp.json()
+        if not isinstance(data, list):
+            raise ValueError("Unexpected quotes payload")
+        quotes = []
+        for q in data:
+            text, author = q.get('q', '').strip(), q.get('a', '').strip()
+            if text:
+                quotes.append(f"{text} — {author}" if author else text)
+        return quotes
+
+
+class DatabaseQuoteSource:
+    """Active quotes from the MotivationalQuote table."""
+    name = 'database'
+
+    def __init__(self, limit=200):
+        self.limit = limit
+
+    def fetch(self):
+        rows = MotivationalQuote.objects.filter(is_active=True).values_list('text', 'author')[:self.limit]
+        return [f"{text} — {author}" if author else text for text, author in rows]
+
+
+class LocalQuoteSource:
+    name = 'local'
+
+    def fetch(self):
+        return list(LOCAL_QUOTES)
+
+
+class CircuitBreaker:
+    """
+    Failure counter shared through the cache. After ``threshold`` consecutive
+    failures the circuit opens and callers skip the remote source for
+    ``reset_seconds``; the next call after that is allowed through as a probe.
+    """
+
+    def __init__(self, name, threshold=None, reset_seconds=None):
+        self.failures_key = f'refocus:circuit:{name}:failures'
+        self.open_key = f'refocus:circuit:{name}:open'
+        self.threshold = threshold or settings.MOTIVATION_QUOTES_FAILURE_THRESHOLD
+        self.reset_seconds = reset_seconds or settings.MOTIVATION_QUOTES_RESET_SECONDS
+
+    def allow(self):
+        return not cache.get(self.open_key)
+
+    def record_success(self):
+        cache.delete_many([self.failures_key, self.open_key])
+
+    def record_failure(self):
+        cache.add(self.failures_key, 0, timeout=self.reset_seconds)
+        failures = cache.incr(self.failures_key)
+        if failures >= self.threshold:
+            cache.set(self.open_key, True, timeout=self.reset_seconds)
+            cache.delete(self.failures_key)
+
+
+class QuoteProvider:
+    """
+    Serves quotes from a pool filled once, in bulk, and kept in the cache for
+    MOTIVATION_QUOTES_TTL seconds.
+
+    The remote source is tried first unless its circuit breaker is open; when
+    it fails or is skipped, the pool is filled from the database and then the
+    built-in LOCAL_QUOTES. Fallback pools are cached only briefly so the
+    remote source is retried once the breaker closes.
+    """
+    fallback_ttl = 60
+
+    def __init__(self, remote=None, fallbacks=None, breaker=None):
+        self.remote = remote or RemoteQuoteSource()
+        self.fallbacks = fallbacks or [DatabaseQuoteSource(), LocalQuoteSource()]
+        self.breaker = breaker or CircuitBreaker('quote-remote')
+
+    def pool(self):
+        quotes = cache.get(POOL_KEY)
+        if quotes:
+            return quotes
+
+        quotes = []
+        if self.breaker.allow():
+            try:
+                quotes = self.remote.fetch()
+                self.breaker.record_success()
+            except Exception:
+                logger.warning("Fetching quotes from the %s source failed", self.remote.name, exc_info=True)
+                self.breaker.record_failure()
+        if quotes:
+            cache.set(POOL_KEY, quotes, settings.MOTIVATION_QUOTES_TTL)
+            return quotes
+
+        for source in self.fallbacks:
+            quotes = source.fetch()
+            if quotes:
+                cache.set(POOL_KEY, quotes, self.fallback_ttl)
+                return quotes
+        return list(LOCAL_QUOTES)
+
+    def random_quote(self, pool=None):
+        pool = pool or self.pool()
+        return random.choice(pool)
+
@@ -0,0 +1,51 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import DailyFocusRollup, DistractionLog, FocusSession
+
+
+def day_bounds(day):
+    """Return the [start, end) datetimes of ``day`` in the current timezone."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def refresh_daily_rollup(user_id, day):
+    """
+    Recompute a single user's rollup row for ``day`` from the raw tables.
+
+    Only the sessions and distractions of that one day are aggregated, so the
+    cost does not grow with the user's history.
+    """
+    start, end = day_bounds(day)
+    sessions = FocusSession.objects.filter(
+        user_id=user_id,
+        completed=True,
+        start_time__gte=start,
+        start_time__lt=end,
+    ).aggregate(minutes=Sum('duration_minutes'), count=Count('id'))
+    distractions = DistractionLog.objects.filter(
+        user_id=user_id,
+        timestamp__gte=start,
+        timestamp__lt=end,
+    ).aggregate(minutes=Sum('duration_minutes'))
+
+    values = {
+        'focus_minutes': sessions['minutes'] or 0,
+        'session_count': sessions['count'],
+        'distraction_minutes': distractions['minutes'] or 0,
+    }
+    if not any(values.values()):
+        DailyFocusRollup.objects.filter(user_id=user_id, date=day).delete()
+        return None
+    rollup, _ = DailyFocusRollup.objects.update_or_create(
+        user_id=user_id, date=day, defaults=values
+    )
+    return rollup
+
+
+def rollup_day(value):
+    """Local calendar day a session/distraction timestamp is counted on."""
+    return timezone.localdate(value)
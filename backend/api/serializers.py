@@ -1,12 +1,162 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from .models import (
     UserProfile, Goal, FocusSession, DistractionLog, 
     EmotionalCheckIn, MotivationalNudge, StudyStreak, MotivationSubscription,
     MotivationalQuote
 )
+from .metrics import serializer_timer
+from .token_blacklist import FilteredRefreshToken
 
-class UserSerializer(serializers.ModelSerializer):
+def parse_field_paths(value):
+    """
+    Turn ``"id,goal.title,goal.user"`` (or a list of such paths) into
+    ``{'id': [], 'goal': ['title', 'user']}``.
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    paths = {}
+    for item in value or ():
+        head, _, rest = item.strip().partition('.')
+        if not head:
+            continue
+        paths.setdefault(head, [])
+        if rest:
+            paths[head].append(rest)
+    return paths
+
+
+def requested_field_paths(request):
+    """The parsed ``?fields=`` and ``?expand=`` parameters of a request."""
+    params = getattr(request, 'query_params', None) or getattr(request, 'GET', {})
+    return parse_field_paths(params.get('fields', '')), parse_field_paths(params.get('expand', ''))
+
+
+class EagerLoadingMixin:
+    """
+    Declares the joins a serializer's nested fields need so views can load
+    them up front instead of issuing one query per row.
+
+    Relations listed in ``expandable_fields`` are rendered as ids unless the
+    client asks for them with ``?expand=``; ``?fields=`` limits the output to
+    the named fields. Dotted paths (``expand=focus_session.goal``,
+    ``fields=id,goal.title``) apply to the nested serializer.
+    ``setup_eager_loading`` joins only the expanded relations and, when
+    ``fields`` is given, loads only the requested columns.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    # name -> (serializer class, extra serializer kwargs such as many=True)
+    expandable_fields = {}
+    default_expand = ()
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        # Nested serializers get their paths from the parent; the root reads the request
+        self._requested_paths = None if fields is None and expand is None else (fields, expand)
+        super().__init__(*args, **kwargs)
+
+    def to_representation(self, instance):
+        # Counted as serializer time by the metrics middleware
+        with serializer_timer():
+            return super().to_representation(instance)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self._requested_paths is None:
+            if self.is_root():
+                requested, expand = requested_field_paths(self.context.get('request'))
+            else:
+                requested, expand = {}, {}
+            if not expand:
+                expand = parse_field_paths(self.default_expand)
+        else:
+            requested, expand = (parse_field_paths(paths) for paths in self._requested_paths)
+
+        for name, nested in expand.items():
+            if name not in self.expandable_fields or (requested and name not in requested):
+                continue
+            serializer_class, options = self.expandable_fields[name]
+            fields[name] = serializer_class(
+                read_only=True, fields=requested.get(name, []), expand=nested, **options
+            )
+
+        if requested:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
+    def is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, request=None):
+        fields, expand = requested_field_paths(request)
+        if not expand:
+            expand = parse_field_paths(cls.default_expand)
+        select, prefetch = cls.eager_loading_plan(queryset.model, fields, expand)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if fields:
+            queryset = queryset.only(*cls.requested_columns(queryset.model, fields, select))
+        return queryset
+
+    @classmethod
+    def eager_loading_plan(cls, model, fields, expand, prefix=''):
+        """``select_related`` paths and ``prefetch_related`` lookups for a request."""
+        select = [prefix + name for name in cls.select_related_fields]
+        prefetch = [] if prefix else list(cls.prefetch_related_fields)
+        for name, (serializer_class, options) in cls.expandable_fields.items():
+            if fields and name not in fields:
+                continue
+            related = model._meta.get_field(name)
+            if name in expand:
+                nested_fields = parse_field_paths(fields.get(name, []))
+                nested_expand = parse_field_paths(expand[name])
+                if options.get('many'):
+                    nested_select, nested_prefetch = serializer_class.eager_loading_plan(
+                        related.related_model, nested_fields, nested_expand
+                    )
+                    nested_queryset = related.related_model.objects.select_related(*nested_select)
+                    prefetch.append(Prefetch(prefix + name, queryset=nested_queryset.prefetch_related(*nested_prefetch)))
+                else:
+                    select.append(prefix + name)
+                    nested_select, nested_prefetch = serializer_class.eager_loading_plan(
+                        related.related_model, nested_fields, nested_expand, prefix=f'{prefix}{name}__'
+                    )
+                    select.extend(nested_select)
+                    prefetch.extend(nested_prefetch)
+            elif options.get('many'):
+                # Rendered as a list of ids: only the key columns are needed
+                id_queryset = related.related_model.objects.only('pk', related.field.name)
+                prefetch.append(Prefetch(prefix + name, queryset=id_queryset))
+        return select, prefetch
+
+    @classmethod
+    def requested_columns(cls, model, fields, select):
+        """Concrete columns to load for ``?fields=``, plus what joins need."""
+        columns = {'pk'}
+        for name in fields:
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if getattr(field, 'concrete', False):
+                columns.add(name)
+        columns.update(path for path in select if '__' not in path)
+        return sorted(columns)
+
+class UserSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'date_joined']
@@ -27,24 +177,49 @@ class UserCreateSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
-class UserProfileSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    # Pre-checks the blacklist in memory; see api.token_blacklist
+    token_class = FilteredRefreshToken
+
+class UserProfileSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
     first_name = serializers.CharField(source='user.first_name', required=False, allow_blank=True)
     last_name = serializers.CharField(source='user.last_name', required=False, allow_blank=True)
     avatar = serializers.SerializerMethodField()
+    avatar_variants = serializers.SerializerMethodField()
+    # first_name/last_name always read through user; the profile page expects the nested user
+    select_related_fields = ('user',)
+    expandable_fields = {'user': (UserSerializer, {})}
+    default_expand = ('user',)
     
     class Meta:
         model = UserProfile
-        fields = '__all__'
+        exclude = ['avatar_hash']
         read_only_fields = ['created_at', 'updated_at', 'user', 'avatar']
     
+    def media_url(self, name):
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
     def get_avatar(self, obj):
+        # The default-size JPEG once variants exist; the original only while they are rendered
+        if obj.avatar_variants:
+            sizes = sorted(obj.avatar_variants, key=int)
+            size = str(settings.AVATAR_DEFAULT_SIZE)
+            if size not in obj.avatar_variants:
+                size = next((s for s in sizes if int(s) >= settings.AVATAR_DEFAULT_SIZE), sizes[-1])
+            return self.media_url(obj.avatar_variants[size]['jpeg'])
         if obj.avatar:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.avatar.url)
-            return obj.avatar.url
+            return self.media_url(obj.avatar.name)
         return None
+
+    def get_avatar_variants(self, obj):
+        """``{size: {'webp': url, 'jpeg': url}}``, empty until the upload is processed."""
+        return {
+            size: {fmt: self.media_url(name) for fmt, name in names.items()}
+            for size, names in (obj.avatar_variants or {}).items()
+        }
     
     def update(self, instance, validated_data):
         # Extract user-related fields
@@ -63,66 +238,126 @@ class UserProfileSerializer(serializers.ModelSerializer):
         # Update UserProfile fields
         return super().update(instance, validated_data)
 
-class GoalSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class GoalSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    expandable_fields = {'user': (UserSerializer, {})}
     
     class Meta:
         model = Goal
         fields = '__all__'
         read_only_fields = ['created_at', 'updated_at']
 
-class FocusSessionSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
-    goal = GoalSerializer(read_only=True)
+class FocusSessionSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    goal = serializers.PrimaryKeyRelatedField(read_only=True)
+    expandable_fields = {
+        'user': (UserSerializer, {}),
+        'goal': (GoalSerializer, {}),
+    }
     
     class Meta:
         model = FocusSession
         fields = '__all__'
         read_only_fields = ['start_time', 'end_time']
 
-class DistractionLogSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
-    focus_session = FocusSessionSerializer(read_only=True)
+class DistractionLogSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    focus_session = serializers.PrimaryKeyRelatedField(read_only=True)
+    expandable_fields = {
+        'user': (UserSerializer, {}),
+        'focus_session': (FocusSessionSerializer, {}),
+    }
     
     class Meta:
         model = DistractionLog
         fields = '__all__'
         read_only_fields = ['timestamp']
 
-class EmotionalCheckInSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class EmotionalCheckInSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    expandable_fields = {'user': (UserSerializer, {})}
     
     class Meta:
         model = EmotionalCheckIn
         fields = '__all__'
         read_only_fields = ['timestamp']
 
-class MotivationalNudgeSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+# Client clocks running slightly ahead of the server are not treated as errors
+CLIENT_CLOCK_SKEW = timedelta(minutes=5)
+
+def validate_client_timestamp(value):
+    """
+    Bound a client-supplied time for a bulk-created row: no older than
+    BULK_CREATE_MAX_BACKDATE_DAYS and not in the future (skew is clamped to now).
+    """
+    now = timezone.now()
+    if value > now + CLIENT_CLOCK_SKEW:
+        raise serializers.ValidationError('Cannot be in the future.')
+    if value < now - timedelta(days=settings.BULK_CREATE_MAX_BACKDATE_DAYS):
+        raise serializers.ValidationError(
+            f'Cannot be more than {settings.BULK_CREATE_MAX_BACKDATE_DAYS} days in the past.'
+        )
+    return min(value, now)
+
+class FocusSessionBulkSerializer(FocusSessionSerializer):
+    """Bulk import variant: ``start_time`` may be sent, defaulting to now."""
+    
+    class Meta(FocusSessionSerializer.Meta):
+        read_only_fields = ['end_time']
+    
+    def validate_start_time(self, value):
+        return validate_client_timestamp(value)
+
+class DistractionLogBulkSerializer(DistractionLogSerializer):
+    """Bulk import variant: ``timestamp`` may be sent, defaulting to now."""
+    
+    class Meta(DistractionLogSerializer.Meta):
+        read_only_fields = []
+    
+    def validate_timestamp(self, value):
+        return validate_client_timestamp(value)
+
+class EmotionalCheckInBulkSerializer(EmotionalCheckInSerializer):
+    """Bulk import variant: ``timestamp`` may be sent, defaulting to now."""
+    
+    class Meta(EmotionalCheckInSerializer.Meta):
+        read_only_fields = []
+    
+    def validate_timestamp(self, value):
+        return validate_client_timestamp(value)
+
+class MotivationalNudgeSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    expandable_fields = {'user': (UserSerializer, {})}
     
     class Meta:
         model = MotivationalNudge
         fields = '__all__'
         read_only_fields = ['created_at']
 
-class StudyStreakSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
+class StudyStreakSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    expandable_fields = {'user': (UserSerializer, {})}
     
     class Meta:
         model = StudyStreak
         fields = '__all__'
         read_only_fields = ['updated_at']
 
-class MotivationSubscriptionSerializer(serializers.ModelSerializer):
+class MotivationSubscriptionSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = MotivationSubscription
         fields = ['id', 'goal_label', 'active', 'interval_minutes', 'next_send_at', 'created_at', 'updated_at']
         read_only_fields = ['id', 'next_send_at', 'created_at', 'updated_at']
 
 # Nested serializers for detailed views
-class GoalDetailSerializer(serializers.ModelSerializer):
-    user = UserSerializer(read_only=True)
-    focus_sessions = FocusSessionSerializer(many=True, read_only=True)
+class GoalDetailSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    user = serializers.PrimaryKeyRelatedField(read_only=True)
+    focus_sessions = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    expandable_fields = {
+        'user': (UserSerializer, {}),
+        'focus_sessions': (FocusSessionSerializer, {'many': True}),
+    }
     
     class Meta:
         model = Goal
@@ -141,7 +376,7 @@ class UserDetailSerializer(serializers.ModelSerializer):
                  'profile', 'goals', 'focus_sessions', 'study_streak']
         read_only_fields = ['id', 'date_joined']
 
-class MotivationalQuoteSerializer(serializers.ModelSerializer):
+class MotivationalQuoteSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = MotivationalQuote
         fields = ['id', 'text', 'author', 'category', 'created_at']
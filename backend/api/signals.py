@@ -0,0 +1,175 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from . import cache as payload_cache
+from . import events
+from .authentication import invalidate_user
+from .models import (
+    DistractionLog, EmotionalCheckIn, FocusSession, Goal, MotivationalNudge, MotivationalQuote,
+    StudyStreak, SyncTombstone,
+)
+from .quote_pool import quote_pool
+from .rollups import refresh_daily_rollup, rollup_day
+from .serializers import MotivationalNudgeSerializer
+from .streaks import refresh_study_day
+from .sync import RESOURCE_BY_MODEL
+from .token_blacklist import blacklist_filter
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Any save may be a deactivation or password change. Drop the snapshot now and
+    # again after commit, so a request racing the transaction cannot re-cache the old row
+    invalidate_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_user(instance.pk))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_to_blacklist_filter(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        blacklist_filter.add(instance.token.jti)
+
+
+def _origin_model(origin):
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+def _deleted_directly(sender, origin):
+    # Rows removed by a cascade (e.g. deleting the user) must not rebuild rollups
+    return _origin_model(origin) is sender
+
+
+@receiver(post_save, sender=FocusSession)
+@receiver(post_save, sender=DistractionLog)
+def refresh_rollup_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    timestamp = instance.start_time if sender is FocusSession else instance.timestamp
+    refresh_daily_rollup(instance.user_id, rollup_day(timestamp))
+
+
+@receiver(post_delete, sender=FocusSession)
+@receiver(post_delete, sender=DistractionLog)
+def refresh_rollup_on_delete(sender, instance, origin=None, **kwargs):
+    if origin is not None and not _deleted_directly(sender, origin):
+        return
+    timestamp = instance.start_time if sender is FocusSession else instance.timestamp
+    refresh_daily_rollup(instance.user_id, rollup_day(timestamp))
+
+
+# The FocusSession fields that decide which study days a session counts for
+STUDY_DAY_FIELDS = ('start_time', 'completed')
+
+
+def _study_day_state(instance):
+    # Read the instance dict so a deferred field is not fetched; None means unknown
+    return tuple(vars(instance).get(name) for name in STUDY_DAY_FIELDS)
+
+
+@receiver(post_init, sender=FocusSession)
+def remember_study_day_state(sender, instance, **kwargs):
+    instance._study_day_state = _study_day_state(instance)
+
+
+@receiver(post_save, sender=FocusSession)
+def refresh_study_day_on_save(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    previous, instance._study_day_state = instance._study_day_state, _study_day_state(instance)
+    if raw:
+        return
+    if created:
+        # A new session that is not completed cannot change the user's study days
+        if instance.completed:
+            refresh_study_day(instance.user_id, instance.start_time, studied=True)
+        return
+    # Edits that leave the start time and completion alone (notes, goal, ...) cannot either
+    if update_fields is not None and not set(STUDY_DAY_FIELDS) & set(update_fields):
+        return
+    if previous == instance._study_day_state:
+        return
+    refresh_study_day(instance.user_id, instance.start_time)
+    moved_from = previous[0]
+    if moved_from is not None and moved_from != instance.start_time:
+        refresh_study_day(instance.user_id, moved_from)
+
+
+@receiver(post_delete, sender=FocusSession)
+def refresh_study_day_on_delete(sender, instance, origin=None, **kwargs):
+    if origin is not None and not _deleted_directly(sender, origin):
+        return
+    refresh_study_day(instance.user_id, instance.start_time)
+
+
+# Cached per-user payloads (api/cache.py). Connected after the rollup
+# receivers so the dashboard is dropped only once its rollup is current.
+@receiver(post_save, sender=FocusSession)
+@receiver(post_delete, sender=FocusSession)
+@receiver(post_save, sender=Goal)
+@receiver(post_delete, sender=Goal)
+def invalidate_dashboard(sender, instance, **kwargs):
+    payload_cache.invalidate(instance.user_id, payload_cache.DASHBOARD)
+
+
+@receiver(post_save, sender=StudyStreak)
+@receiver(post_delete, sender=StudyStreak)
+def invalidate_streak(sender, instance, **kwargs):
+    payload_cache.invalidate(instance.user_id, payload_cache.DASHBOARD, payload_cache.STREAK)
+
+
+@receiver(post_save, sender=User)
+def invalidate_streak_user(sender, instance, **kwargs):
+    # The streak payload embeds the serialized user
+    payload_cache.invalidate(instance.pk, payload_cache.STREAK)
+
+
+@receiver(post_save, sender=MotivationalQuote)
+@receiver(post_delete, sender=MotivationalQuote)
+def refresh_quote_pool(sender, **kwargs):
+    # A process reloading before commit would cache the old rows under the new
+    # version, so bump it again once the write is visible
+    quote_pool.invalidate()
+    transaction.on_commit(quote_pool.invalidate)
+
+
+@receiver(post_delete, sender=Goal)
+@receiver(post_delete, sender=FocusSession)
+@receiver(post_delete, sender=DistractionLog)
+@receiver(post_delete, sender=EmotionalCheckIn)
+@receiver(post_delete, sender=MotivationalNudge)
+def record_sync_tombstone(sender, instance, origin=None, **kwargs):
+    # Deleting the user removes everything; there is no client left to tell
+    if origin is not None and _origin_model(origin) is User:
+        return
+    SyncTombstone.objects.create(
+        user_id=instance.user_id, resource=RESOURCE_BY_MODEL[sender], object_id=instance.pk
+    )
+
+
+# Deleted model -> (model, foreign key) whose rows it sets to NULL
+DETACHED_ON_DELETE = {
+    Goal: (FocusSession, 'goal'),
+    FocusSession: (DistractionLog, 'focus_session'),
+}
+
+
+@receiver(pre_delete, sender=Goal)
+@receiver(pre_delete, sender=FocusSession)
+def touch_detached_rows(sender, instance, origin=None, **kwargs):
+    # SET_NULL clears the foreign key with a bulk UPDATE that leaves updated_at alone,
+    # so the sync feed and conditional GETs would never see the detached rows change
+    if origin is not None and _origin_model(origin) is User:
+        return
+    model, field = DETACHED_ON_DELETE[sender]
+    model.objects.filter(**{field: instance}).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=MotivationalNudge)
+def publish_new_nudge(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        events.publish(instance.user_id, 'nudge', MotivationalNudgeSerializer(instance).data)
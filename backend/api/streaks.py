@@ -0,0 +1,247 @@
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import FocusSession, StudyDayBitmap, StudyStreak, UserProfile
+
+# 366 days, one bit each; bit n of the integer is day n of the year (Jan 1 = 0)
+BITMAP_BYTES = 46
+
+
+def bits_from_bytes(data):
+    return int.from_bytes(bytes(data or b''), 'little')
+
+
+def bits_to_bytes(bits):
+    return bits.to_bytes(BITMAP_BYTES, 'little')
+
+
+def day_index(day):
+    return (day - date(day.year, 1, 1)).days
+
+
+def get_user_timezone(user_id):
+    """The zone study days are counted in: the profile's timezone, else UTC."""
+    name = UserProfile.objects.filter(user_id=user_id).values_list('timezone', flat=True).first()
+    return load_timezone(name)
+
+
+async def aget_user_timezone(user_id):
+    name = await UserProfile.objects.filter(user_id=user_id).values_list('timezone', flat=True).afirst()
+    return load_timezone(name)
+
+
+def load_timezone(name):
+    try:
+        return ZoneInfo(name or 'UTC')
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo('UTC')
+
+
+def local_day_bounds(day, tz):
+    """Return the [start, end) datetimes of ``day`` in ``tz``."""
+    start = datetime.combine(day, time.min, tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz)
+    return start, end
+
+
+def combine_years(bitmaps):
+    """
+    Join ``{year: bits}`` into one integer whose bit n is day n counted from
+    January 1 of the earliest year. Returns ``(bits, first_day)``.
+    """
+    if not bitmaps:
+        return 0, None
+    first_day = date(min(bitmaps), 1, 1)
+    combined = 0
+    for year, bits in bitmaps.items():
+        combined |= bits << (date(year, 1, 1) - first_day).days
+    return combined, first_day
+
+
+def longest_run(bits):
+    # Each round shortens every run of ones by one; the round count is the longest run
+    rounds = 0
+    while bits:
+        bits &= bits >> 1
+        rounds += 1
+    return rounds
+
+
+def streak_stats(bitmaps, today):
+    """Current, longest and total streak figures for ``{year: bits}`` as of ``today``."""
+    bits, first_day = combine_years(bitmaps)
+    if not bits:
+        return {'current_streak': 0, 'longest_streak': 0, 'total_study_days': 0, 'last_study_date': None}
+
+    last_index = bits.bit_length() - 1
+    today_index = (today - first_day).days
+    current = 0
+    # A streak is still current until a whole day has been missed
+    end = today_index if today_index >= 0 and bits >> today_index & 1 else today_index - 1
+    if 0 <= end and bits >> end & 1:
+        gaps = ~bits & ((1 << (end + 1)) - 1)
+        current = end - (gaps.bit_length() - 1)
+
+    return {
+        'current_streak': current,
+        'longest_streak': longest_run(bits),
+        'total_study_days': bits.bit_count(),
+        'last_study_date': first_day + timedelta(days=last_index),
+    }
+
+
+def get_study_streak(user_id, queryset=None):
+    """
+    The user's StudyStreak, created on a miss (UserCreate normally makes it).
+    A plain read comes first because get_or_create asks for the write alias,
+    which moves the rest of a replica-eligible request to the primary.
+    """
+    queryset = StudyStreak.objects.all() if queryset is None else queryset
+    streak = queryset.filter(user_id=user_id).order_by('pk').first()
+    if streak is None:
+        streak, created = queryset.get_or_create(user_id=user_id)
+    return streak
+
+
+async def aget_study_streak(user_id, queryset=None):
+    queryset = StudyStreak.objects.all() if queryset is None else queryset
+    streak = await queryset.filter(user_id=user_id).order_by('pk').afirst()
+    if streak is None:
+        streak, created = await queryset.aget_or_create(user_id=user_id)
+    return streak
+
+
+def study_bitmaps(user_id):
+    """The user's study days as ``{year: bits}``."""
+    return {
+        year: bits_from_bytes(days)
+        for year, days in StudyDayBitmap.objects.filter(user_id=user_id).values_list('year', 'days')
+    }
+
+
+async def astudy_bitmaps(user_id):
+    rows = StudyDayBitmap.objects.filter(user_id=user_id).values_list('year', 'days')
+    return {year: bits_from_bytes(days) async for year, days in rows}
+
+
+def local_today(tz):
+    return timezone.now().astimezone(tz).date()
+
+
+def profile_timezone():
+    """The user's profile timezone name, for annotating rows that have a ``user_id``."""
+    return Subquery(UserProfile.objects.filter(user_id=OuterRef('user_id')).values('timezone')[:1])
+
+
+def apply_current_stats(streak, bitmaps, tz):
+    for field, value in streak_stats(bitmaps, local_today(tz)).items():
+        setattr(streak, field, value)
+    return streak
+
+
+def get_current_study_streak(user_id, queryset=None):
+    """
+    ``get_study_streak`` with its counters recomputed from the bitmaps as of
+    today in the user's timezone (not saved). The stored counters only change
+    with the sessions, so a streak that lapsed since then would still read
+    as current.
+    """
+    queryset = StudyStreak.objects.all() if queryset is None else queryset
+    streak = get_study_streak(user_id, queryset.annotate(timezone=profile_timezone()))
+    # A row created on a miss has no annotation
+    tz = load_timezone(streak.timezone) if hasattr(streak, 'timezone') else get_user_timezone(user_id)
+    return apply_current_stats(streak, study_bitmaps(user_id), tz)
+
+
+async def aget_current_study_streak(user_id, queryset=None):
+    queryset = StudyStreak.objects.all() if queryset is None else queryset
+    streak = await aget_study_streak(user_id, queryset.annotate(timezone=profile_timezone()))
+    tz = load_timezone(streak.timezone) if hasattr(streak, 'timezone') else await aget_user_timezone(user_id)
+    return apply_current_stats(streak, await astudy_bitmaps(user_id), tz)
+
+
+def lock_user_streaks(user_id):
+    """
+    Serialize streak updates for one user by locking their User row (it always
+    exists, unlike the StudyStreak row on first use). Call inside a transaction.
+    """
+    list(User.objects.select_for_update().filter(pk=user_id).values_list('pk', flat=True))
+
+
+def refresh_study_streak(user_id, tz=None):
+    """Recompute the user's StudyStreak counters from their study-day bitmaps."""
+    tz = tz or get_user_timezone(user_id)
+    with transaction.atomic():
+        lock_user_streaks(user_id)
+        return _save_streak_stats(user_id, tz)
+
+
+def _save_streak_stats(user_id, tz):
+    # Caller holds the per-user lock
+    stats = streak_stats(study_bitmaps(user_id), local_today(tz))
+    streak = StudyStreak.objects.filter(user_id=user_id).order_by('pk').first()
+    if streak is None:
+        return StudyStreak.objects.create(user_id=user_id, **stats)
+    if any(getattr(streak, field) != value for field, value in stats.items()):
+        for field, value in stats.items():
+            setattr(streak, field, value)
+        streak.save()
+    return streak
+
+
+def refresh_study_day(user_id, moment, tz=None, studied=None):
+    """
+    Set or clear the bit for the user's local day containing ``moment``,
+    depending on whether that day still has a completed session, then
+    refresh the streak counters. Recomputing the day keeps the bitmap right
+    when sessions are edited or deleted.
+
+    Everything runs in one transaction under the per-user lock, so
+    concurrent completions cannot interleave their read-modify-write of the
+    bitmap or save counters computed from a stale bitmap. Pass ``studied=True``
+    when a completed session on that day is known to exist (it was just
+    created) to skip looking for one.
+    """
+    tz = tz or get_user_timezone(user_id)
+    day = moment.astimezone(tz).date()
+    start, end = local_day_bounds(day, tz)
+    mask = 1 << day_index(day)
+    with transaction.atomic():
+        lock_user_streaks(user_id)
+        if studied is None:
+            studied = FocusSession.objects.filter(
+                user_id=user_id, completed=True, start_time__gte=start, start_time__lt=end,
+            ).exists()
+        bitmap = StudyDayBitmap.objects.filter(user_id=user_id, year=day.year).first()
+        bits = bits_from_bytes(bitmap.days) if bitmap else 0
+        updated = bits | mask if studied else bits & ~mask
+        if updated != bits:
+            if bitmap:
+                bitmap.days = bits_to_bytes(updated)
+                bitmap.save(update_fields=['days', 'updated_at'])
+            else:
+                StudyDayBitmap.objects.create(user_id=user_id, year=day.year, days=bits_to_bytes(updated))
+        return _save_streak_stats(user_id, tz)
+
+
+def year_bitmap(user_id, year):
+    """The stored bitset of ``year`` as bytes (all zero when there is none)."""
+    days = StudyDayBitmap.objects.filter(user_id=user_id, year=year).values_list('days', flat=True).first()
+    return bits_to_bytes(bits_from_bytes(days))
+
+
+def update_study_streak(user, moments):
+    """Refresh the study days touched by ``moments`` (session start times) and the streak."""
+    tz = get_user_timezone(user.pk)
+    days = {}
+    for moment in moments:
+        days.setdefault(moment.astimezone(tz).date(), moment)
+    streak = None
+    for moment in days.values():
+        streak = refresh_study_day(user.pk, moment, tz)
+    return streak
@@ -0,0 +1,119 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import DistractionLog, EmotionalCheckIn, FocusSession, Goal, MotivationalNudge, SyncTombstone
+from .serializers import (
+    DistractionLogSerializer, EmotionalCheckInSerializer, FocusSessionSerializer,
+    GoalSerializer, MotivationalNudgeSerializer,
+)
+
+# resource name in the feed -> (model, serializer)
+SYNC_RESOURCES = {
+    'goals': (Goal, GoalSerializer),
+    'focus_sessions': (FocusSession, FocusSessionSerializer),
+    'distractions': (DistractionLog, DistractionLogSerializer),
+    'emotional_checkins': (EmotionalCheckIn, EmotionalCheckInSerializer),
+    'nudges': (MotivationalNudge, MotivationalNudgeSerializer),
+}
+RESOURCE_BY_MODEL = {model: name for name, (model, _) in SYNC_RESOURCES.items()}
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+def encode_token(position, overlap, cursors=None):
+    token = {'t': position.isoformat(), 'o': overlap}
+    if cursors:
+        token['k'] = {name: [updated_at.isoformat(), pk] for name, (updated_at, pk) in cursors.items()}
+    token = json.dumps(token, separators=(',', ':'))
+    return base64.urlsafe_b64encode(token.encode()).decode()
+
+
+def decode_token(value):
+    """
+    Return ``(since, cursors)``: the timestamp a client should be sent changes
+    from, and for resources cut short by the previous feed the
+    ``(updated_at, id)`` of the last row it received.
+
+    Tokens handed out at the end of a feed carry an overlap window: rows are
+    stamped before their transaction commits, so a change can become visible
+    slightly after a sync that ran at a later time. Re-sending that window is
+    harmless because clients apply rows as upserts by id.
+    """
+    try:
+        token = json.loads(base64.urlsafe_b64decode(value.encode()).decode())
+        position = datetime.fromisoformat(token['t'])
+        cursors = {
+            name: (datetime.fromisoformat(updated_at), int(pk))
+            for name, (updated_at, pk) in token.get('k', {}).items()
+        }
+        return position - timedelta(seconds=int(token.get('o', 0))), cursors
+    except (TypeError, ValueError, KeyError, AttributeError, UnicodeDecodeError):
+        raise InvalidSyncToken(value)
+
+
+def build_feed(user, since, context, cursors=None):
+    """
+    Rows of every synced resource created or updated at/after ``since``, and
+    ids deleted since then. ``since=None`` returns everything (first sync).
+
+    At most SYNC_MAX_ITEMS rows are returned per resource. When a resource is
+    cut short, ``has_more`` is set and the returned token resumes after the
+    last row sent, by ``(updated_at, id)`` like KeysetPagination, so rows
+    sharing one ``updated_at`` (a bulk UPDATE) cannot repeat the same page.
+    """
+    now = timezone.now()
+    limit = settings.SYNC_MAX_ITEMS
+    cursors = cursors or {}
+    feed = {}
+    resume_from = None
+    next_cursors = {}
+
+    for name, (model, serializer_class) in SYNC_RESOURCES.items():
+        queryset = model.objects.filter(user=user)
+        if name in cursors:
+            updated_at, pk = cursors[name]
+            queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk))
+        elif since is not None:
+            queryset = queryset.filter(updated_at__gte=since)
+        rows = list(serializer_class.setup_eager_loading(queryset.order_by('updated_at', 'id'))[:limit + 1])
+        if len(rows) > limit:
+            rows = rows[:limit]
+            cut_off = rows[-1].updated_at
+            next_cursors[name] = (cut_off, rows[-1].pk)
+            resume_from = cut_off if resume_from is None else min(resume_from, cut_off)
+        feed[name] = {
+            'updated': serializer_class(rows, many=True, context=context).data,
+            'deleted': [],
+        }
+
+    tombstones = SyncTombstone.objects.filter(user=user)
+    if since is not None:
+        tombstones = tombstones.filter(deleted_at__gte=since)
+    for resource, object_id in tombstones.order_by('deleted_at').values_list('resource', 'object_id'):
+        if resource in feed:
+            feed[resource]['deleted'].append(object_id)
+
+    if resume_from is not None:
+        feed['token'] = encode_token(resume_from, 0, next_cursors)
+        feed['has_more'] = True
+    else:
+        feed['token'] = encode_token(now, settings.SYNC_OVERLAP_SECONDS)
+        feed['has_more'] = False
+    return feed
+
+
+def tombstone_cutoff():
+    return timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+
+
+def prune_sync_tombstones():
+    """Delete tombstones past the retention window; returns how many were deleted."""
+    deleted, _ = SyncTombstone.objects.filter(deleted_at__lt=tombstone_cutoff()).delete()
+    return deleted
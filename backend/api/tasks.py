@@ -1,57 +1,321 @@
+import logging
+import uuid
+from datetime import timedelta
+
 from celery import shared_task
+from celery.signals import task_postrun, task_prerun
 from django.utils import timezone
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
-import requests
-from .models import MotivationSubscription
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from . import metrics
+from .avatars import InvalidAvatar, render_variants
+from .models import MotivationSubscription, UserProfile
+from .quote_provider import QuoteProvider
+from .sync import prune_sync_tombstones
+from .token_blacklist import prune_expired_tokens
+
+logger = logging.getLogger(__name__)
+
+# Shortest interval between two motivation emails; a zero interval would
+# reschedule a slot onto itself and send forever
+MIN_INTERVAL_MINUTES = 1
+
+task_prerun.connect(metrics.task_prerun, weak=False)
+task_postrun.connect(metrics.task_postrun, weak=False)
 
 
-LOCAL_QUOTES = [
-    "Believe you can and you're halfway there.",
-    "Success is the sum of small efforts repeated day in and day out.",
-    "The secret of getting ahead is getting started.",
-    "Don’t watch the clock; do what it does. Keep going.",
-    "What we fear of doing most is usually what we most need to do.",
-]
+def build_motivation_email(sub, quote) -> EmailMessage:
+    subject = f"Motivation for your goal: {sub.goal_label}"
+    message = (
+        f"Hi {sub.user.username},\n\n"
+        f"Here's your hourly motivation for goal '{sub.goal_label}':\n\n"
+        f"{quote}\n\n"
+        f"Stay focused!\n"
+    )
+    return EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [sub.user.email])
+
+
+def _open_connection():
+    connection = get_connection(fail_silently=False)
+    try:
+        # Opening explicitly keeps send_messages() from closing after each call
+        connection.open()
+    except Exception:
+        logger.warning("Connecting to the mail server failed", exc_info=True)
+    return connection
 
 
-def fetch_quote() -> str:
+def _close_quietly(connection):
     try:
-        # Free API option; no key required. If rate-limited, fall back.
-        resp = requests.get("https://zenquotes.io/api/random", timeout=5)
-        if resp.ok:
-            data = resp.json()
-            if isinstance(data, list) and data:
-                q = data[0]
-                return f"{q.get('q', '').strip()} — {q.get('a', '').strip()}".strip()
+        connection.close()
     except Exception:
         pass
-    # Fallback local list
-    return LOCAL_QUOTES[timezone.now().minute % len(LOCAL_QUOTES)]
+
+
+def send_batched(messages, batch_size=None) -> dict:
+    """
+    Send ``(key, EmailMessage)`` pairs over one reused connection per chunk
+    of ``batch_size`` messages instead of one connection per message.
+
+    A failed send closes the connection, reconnects and retries that message
+    once. Returns ``{key: 'sent' | 'failed'}``.
+    """
+    batch_size = batch_size or settings.MOTIVATION_EMAIL_BATCH_SIZE
+    outcomes = {}
+    for start in range(0, len(messages), batch_size):
+        connection = _open_connection()
+        try:
+            for key, message in messages[start:start + batch_size]:
+                for attempt in (1, 2):
+                    try:
+                        sent = connection.send_messages([message])
+                        outcomes[key] = 'sent' if sent else 'failed'
+                        break
+                    except Exception:
+                        logger.warning("Sending motivation email %s failed (attempt %s)", key, attempt, exc_info=True)
+                        outcomes[key] = 'failed'
+                        _close_quietly(connection)
+                        connection = _open_connection()
+        finally:
+            _close_quietly(connection)
+    return outcomes
+
+
+def due_subscriptions(now, due_before=None):
+    """Active subscriptions whose slot has come and that no live lease holds."""
+    return MotivationSubscription.objects.filter(
+        Q(claimed_until__isnull=True) | Q(claimed_until__lt=now),
+        active=True, next_send_at__lte=due_before or now,
+    )
+
+
+def sweep_cutoff(now):
+    """
+    Latest slot the polling sweep picks up. In ETA mode slots are delivered by
+    their own task, so the sweep only reconciles ones overdue by the grace
+    period (a lost ETA message or a broker outage).
+    """
+    if settings.MOTIVATION_DELIVERY_MODE == 'eta':
+        return now - timedelta(seconds=settings.MOTIVATION_RECONCILE_GRACE_SECONDS)
+    return now
+
+
+def enqueue_delivery(subscription_id, slot):
+    """Schedule ``deliver_motivation_subscription`` to run at ``slot``."""
+    try:
+        deliver_motivation_subscription.apply_async(args=[subscription_id, slot.isoformat()], eta=slot)
+    except Exception:
+        # The reconciliation sweep delivers the slot instead
+        logger.warning("Enqueueing motivation delivery for subscription %s failed", subscription_id, exc_info=True)
+
+
+def claim_due_subscriptions(token, limit, now=None, due_before=None) -> int:
+    """
+    Lease up to ``limit`` due subscriptions to ``token``.
+
+    Where the database supports it, candidates are picked with
+    ``SELECT ... FOR UPDATE SKIP LOCKED`` so concurrent workers take disjoint
+    rows instead of queueing behind each other. The lease itself is a
+    conditional UPDATE on ``claimed_until``, so it also holds on SQLite and
+    across transactions: another worker only sees the rows again once the
+    lease has expired.
+    """
+    now = now or timezone.now()
+    lease_until = now + timedelta(seconds=settings.MOTIVATION_CLAIM_LEASE_SECONDS)
+    with transaction.atomic():
+        candidates = due_subscriptions(now, due_before).order_by('next_send_at', 'pk')
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        ids = list(candidates.values_list('pk', flat=True)[:limit])
+        if not ids:
+            return 0
+        return due_subscriptions(now, due_before).filter(pk__in=ids).update(
+            claim_token=token, claimed_until=lease_until,
+        )
+
+
+def _reschedule_claimed(token, now):
+    """
+    Move every subscription leased to ``token`` to its next slot and release
+    the lease, with one UPDATE per distinct interval instead of one per row.
+    Slots stay aligned (``next_send_at + interval``); a subscription that
+    fell more than one interval behind restarts from ``now``.
+    """
+    claimed = MotivationSubscription.objects.filter(claim_token=token)
+    intervals = claimed.order_by().values_list('interval_minutes', flat=True).distinct()
+    for minutes in list(intervals):
+        # Rows saved before the interval was validated still move forward
+        delta = timedelta(minutes=max(minutes, MIN_INTERVAL_MINUTES))
+        group = claimed.filter(interval_minutes=minutes)
+        group.filter(next_send_at__lte=now - delta).update(next_send_at=now)
+        group.update(next_send_at=F('next_send_at') + delta, claim_token=None, claimed_until=None)
+
+
+def process_claimed_subscriptions(token, now=None) -> dict:
+    """
+    Send the emails for subscriptions leased to ``token`` and reschedule them.
+
+    Sending is idempotent per (subscription, slot): the slot is recorded in
+    ``last_sent_slot`` before the messages go out, so a worker that picks up
+    an expired lease after a crash reschedules those rows without emailing
+    again. Failed sends are not retried until the next slot. In ETA mode the
+    next slot of each subscription is enqueued once it has been rescheduled.
+    """
+    now = now or timezone.now()
+    claimed = MotivationSubscription.objects.filter(claim_token=token)
+    claimed_ids = list(claimed.values_list('pk', flat=True))
+    pending = claimed.exclude(last_sent_slot=F('next_send_at'))
+    already_sent = claimed.filter(last_sent_slot=F('next_send_at')).count()
+
+    provider = QuoteProvider()
+    pool = None
+    messages = []
+    due = 0
+    for sub in pending.select_related('user').iterator(chunk_size=settings.MOTIVATION_EMAIL_BATCH_SIZE):
+        due += 1
+        if sub.user.email:
+            pool = pool or provider.pool()
+            messages.append((sub.pk, build_motivation_email(sub, provider.random_quote(pool))))
+    pending.update(last_sent_slot=F('next_send_at'))
+
+    outcomes = send_batched(messages)
+    _reschedule_claimed(token, now)
+
+    if settings.MOTIVATION_DELIVERY_MODE == 'eta':
+        next_slots = MotivationSubscription.objects.filter(pk__in=claimed_ids, active=True)
+        for subscription_id, slot in next_slots.values_list('pk', 'next_send_at'):
+            enqueue_delivery(subscription_id, slot)
+
+    return {
+        'due': due,
+        'sent': sum(1 for outcome in outcomes.values() if outcome == 'sent'),
+        'failed': sum(1 for outcome in outcomes.values() if outcome == 'failed'),
+        'skipped': due - len(outcomes),
+        'already_sent': already_sent,
+        'outcomes': {str(key): outcome for key, outcome in outcomes.items()},
+    }
+
+
+def _merge_summaries(summaries) -> dict:
+    merged = {'due': 0, 'sent': 0, 'failed': 0, 'skipped': 0, 'already_sent': 0, 'outcomes': {}}
+    for summary in summaries:
+        for key in ('due', 'sent', 'failed', 'skipped', 'already_sent'):
+            merged[key] += summary[key]
+        merged['outcomes'].update(summary['outcomes'])
+    return merged
 
 
 @shared_task
-def process_motivation_subscriptions():
+def deliver_motivation_subscription(subscription_id, slot):
+    """
+    ETA task for a single slot. It is a no-op when the subscription was
+    stopped, rescheduled since (a stale ETA), or is already leased, so
+    duplicate deliveries of the message (e.g. Redis visibility timeouts on
+    long ETAs) send nothing twice.
+    """
+    token = uuid.uuid4()
     now = timezone.now()
-    due = MotivationSubscription.objects.filter(active=True, next_send_at__lte=now)
-    for sub in due.select_related('user'):
-        # Prepare email
-        subject = f"Motivation for your goal: {sub.goal_label}"
-        quote = fetch_quote()
-        message = (
-            f"Hi {sub.user.username},\n\n"
-            f"Here's your hourly motivation for goal '{sub.goal_label}':\n\n"
-            f"{quote}\n\n"
-            f"Stay focused!\n"
-        )
-        recipient = [sub.user.email] if sub.user.email else []
-        if recipient:
-            try:
-                send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, recipient, fail_silently=True)
-            except Exception:
-                # Ignore email errors; we will still reschedule
-                pass
-
-        # Schedule next
-        sub.next_send_at = now + timezone.timedelta(minutes=sub.interval_minutes)
-        sub.save(update_fields=["next_send_at", "updated_at"])
+    lease_until = now + timedelta(seconds=settings.MOTIVATION_CLAIM_LEASE_SECONDS)
+    claimed = due_subscriptions(now).filter(pk=subscription_id, next_send_at=parse_datetime(slot)).update(
+        claim_token=token, claimed_until=lease_until,
+    )
+    if not claimed:
+        return None
+    return process_claimed_subscriptions(token, now)
+
+
+@shared_task
+def process_motivation_chunk():
+    """Worker: claim one chunk of due subscriptions and process it."""
+    token = uuid.uuid4()
+    now = timezone.now()
+    if not claim_due_subscriptions(token, settings.MOTIVATION_CLAIM_CHUNK_SIZE, now, sweep_cutoff(now)):
+        return _merge_summaries([])
+    summary = process_claimed_subscriptions(token, now)
+    logger.info("Motivation emails: %(due)s due, %(sent)s sent, %(failed)s failed, %(skipped)s skipped", summary)
+    return summary
+
+
+@shared_task
+def dispatch_motivation_subscriptions():
+    """
+    Dispatcher: enqueue one ``process_motivation_chunk`` per chunk of due
+    subscriptions. Workers claim rows themselves, so overlapping dispatches
+    only produce workers that find nothing left to claim.
+    """
+    now = timezone.now()
+    due = due_subscriptions(now, sweep_cutoff(now)).count()
+    chunks = -(-due // settings.MOTIVATION_CLAIM_CHUNK_SIZE)
+    for _ in range(chunks):
+        process_motivation_chunk.delay()
+    return chunks
+
+
+@shared_task
+def process_motivation_subscriptions():
+    """
+    Claim and process due subscriptions chunk by chunk in this worker. Only
+    slots due when the run started are taken, so rows rescheduled into the
+    past by a slow run are left to the next one instead of looping.
+    """
+    summaries = []
+    started = timezone.now()
+    while True:
+        token = uuid.uuid4()
+        now = timezone.now()
+        if not claim_due_subscriptions(token, settings.MOTIVATION_CLAIM_CHUNK_SIZE, now, due_before=started):
+            break
+        summaries.append(process_claimed_subscriptions(token, now))
+
+    summary = _merge_summaries(summaries)
+    logger.info("Motivation emails: %(due)s due, %(sent)s sent, %(failed)s failed, %(skipped)s skipped", summary)
+    return summary
+
+
+@shared_task
+def process_avatar(profile_id, digest):
+    """
+    Render the resized variants of the avatar with content hash ``digest``.
+    Does nothing when the profile has moved on to another upload meanwhile.
+    """
+    profile = UserProfile.objects.filter(pk=profile_id, avatar_hash=digest).only('pk', 'avatar').first()
+    if profile is None or not profile.avatar:
+        return 'superseded'
+    try:
+        variants = render_variants(digest, profile.avatar.name)
+    except (InvalidAvatar, OSError, ValueError):
+        logger.warning("Rendering avatar variants for profile %s failed", profile_id, exc_info=True)
+        return 'failed'
+    # Conditional on the hash, so a newer upload is never overwritten with stale variants
+    updated = UserProfile.objects.filter(pk=profile_id, avatar_hash=digest).update(
+        avatar_variants=variants, updated_at=timezone.now(),
+    )
+    return 'processed' if updated else 'superseded'
+
+
+def enqueue_avatar_processing(profile_id, digest):
+    """Queue ``process_avatar``, rendering in process when the broker is unreachable."""
+    try:
+        process_avatar.delay(profile_id, digest)
+    except Exception:
+        logger.warning("Enqueueing avatar processing for profile %s failed; rendering inline", profile_id, exc_info=True)
+        process_avatar(profile_id, digest)
+
+
+@shared_task
+def prune_expired_tokens_task():
+    """Daily clean-up of expired refresh-token bookkeeping rows."""
+    deleted = prune_expired_tokens()
+    logger.info("Pruned %s expired outstanding tokens", deleted)
+    return deleted
+
+
+@shared_task
+def prune_sync_tombstones_task():
+    """Daily clean-up of sync tombstones past SYNC_TOMBSTONE_RETENTION_DAYS."""
+    deleted = prune_sync_tombstones()
+    logger.info("Pruned %s expired sync tombstones", deleted)
+    return deleted
@@ -1,11 +1,71 @@
-from django.test import TestCase
+import base64
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from celery.signals import task_postrun, task_prerun
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import DEFAULTS as JWT_DEFAULTS
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from PIL import Image
+from backend.urls import immutable_media
+from . import benchmarks, metrics
+from .db_routing import ReplicaRouter, ReplicaRoutingMiddleware, sticky_key
+from .authentication import LocalLRU, local_users, user_cache_key
+from .avatars import CONTENT_ROOT, IMMUTABLE_CACHE_CONTROL
+from .analytics import bucket_count
+from .rollups import rollup_day
+from .token_blacklist import BlacklistFilter, BloomFilter, blacklist_filter
+from .quote_pool import VERSION_KEY as QUOTE_POOL_VERSION_KEY, quote_pool
+from .quote_provider import POOL_KEY, QuoteProvider
+from .streaks import bits_to_bytes, streak_stats
+from .sync import encode_token
+from .events import InProcessBroker, get_broker
+from .tasks import (
+    claim_due_subscriptions, deliver_motivation_subscription, dispatch_motivation_subscriptions,
+    enqueue_delivery, process_avatar, process_motivation_subscriptions, prune_expired_tokens_task,
+    prune_sync_tombstones_task,
+)
 from .models import (
     UserProfile, Goal, FocusSession, DistractionLog, 
-    EmotionalCheckIn, MotivationalNudge, StudyStreak
+    EmotionalCheckIn, MotivationalNudge, StudyStreak, DailyFocusRollup,
+    MotivationalQuote, SyncTombstone, MotivationSubscription, StudyDayBitmap
 )
 
+# A second SQLite database standing in for a replica that never catches up
+# with the primary (ReplicaRoutingTest). Registered at import so the test
+# runner creates and migrates it along with the default test database.
+TEST_REPLICA = 'test_replica'
+if connections.settings['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    connections.settings[TEST_REPLICA] = {
+        **connections.settings['default'],
+        'TEST': {**connections.settings['default']['TEST'], 'NAME': None, 'MIRROR': None},
+    }
+
+
 class ReFocusModelsTest(TestCase):
     def setUp(self):
         """Set up test data"""
@@ -166,3 +226,1737 @@ class ReFocusModelsTest(TestCase):
         
         self.assertTrue(session.completed)
         self.assertIsNotNone(session.end_time)
+
+
+class DailyFocusRollupTest(TestCase):
+    def setUp(self):
+        """Set up an authenticated client"""
+        cache.clear()
+        self.user = User.objects.create_user(username='rollupuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_rollup_follows_session_changes(self):
+        """Test rollups track completion, edits and deletes"""
+        session = FocusSession.objects.create(user=self.user, duration_minutes=25)
+        self.assertFalse(DailyFocusRollup.objects.filter(user=self.user).exists())
+
+        self.client.post(reverse('focus-session-complete', args=[session.pk]))
+        rollup = DailyFocusRollup.objects.get(user=self.user, date=timezone.localdate())
+        self.assertEqual((rollup.focus_minutes, rollup.session_count), (25, 1))
+
+        self.client.patch(reverse('focus-session-detail', args=[session.pk]), {'duration_minutes': 40})
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.focus_minutes, 40)
+
+        DistractionLog.objects.create(user=self.user, distraction_type='phone', duration_minutes=3)
+        rollup.refresh_from_db()
+        self.assertEqual(rollup.distraction_minutes, 3)
+
+        self.client.delete(reverse('focus-session-detail', args=[session.pk]))
+        rollup.refresh_from_db()
+        self.assertEqual((rollup.focus_minutes, rollup.session_count), (0, 0))
+
+    def test_dashboard_reads_rollups(self):
+        """Test dashboard stats come from rollups without touching sessions"""
+        today = timezone.localdate()
+        DailyFocusRollup.objects.create(user=self.user, date=today, focus_minutes=50, session_count=2)
+        DailyFocusRollup.objects.create(user=self.user, date=today - timedelta(days=3), focus_minutes=30, session_count=1)
+        DailyFocusRollup.objects.create(user=self.user, date=today - timedelta(days=30), focus_minutes=90, session_count=3)
+        Goal.objects.create(user=self.user, title='Open')
+        Goal.objects.create(user=self.user, title='Done', completed=True)
+        StudyStreak.objects.create(user=self.user)
+
+        # The aggregates, the streak row and the study-day bitmaps
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('dashboard-stats'))
+        self.assertEqual(response.data['today_minutes'], 50)
+        self.assertEqual(response.data['weekly_minutes'], 80)
+        self.assertEqual(response.data['total_goals'], 2)
+        self.assertEqual(response.data['completed_goals'], 1)
+
+    def test_backfill_command(self):
+        """Test the backfill command rebuilds rollups from history"""
+        yesterday = timezone.now() - timedelta(days=1)
+        FocusSession.objects.create(user=self.user, duration_minutes=25, completed=True)
+        old = FocusSession.objects.create(user=self.user, duration_minutes=45, completed=True)
+        FocusSession.objects.filter(pk=old.pk).update(start_time=yesterday)
+        DailyFocusRollup.objects.all().delete()
+
+        call_command('backfill_focus_rollups', stdout=StringIO())
+
+        rollups = dict(DailyFocusRollup.objects.values_list('date', 'focus_minutes'))
+        self.assertEqual(rollups, {
+            timezone.localdate(): 25,
+            timezone.localdate(yesterday): 45,
+        })
+
+
+
+class FocusTimeSeriesTest(TestCase):
+    def setUp(self):
+        """Set up sessions spread over two weeks"""
+        self.user = User.objects.create_user(username='seriesuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.goal = Goal.objects.create(user=self.user, title='Series Goal')
+        now = timezone.now()
+        for days_ago, minutes, goal in [(0, 25, self.goal), (0, 15, None), (2, 50, self.goal), (9, 30, None)]:
+            session = FocusSession.objects.create(user=self.user, duration_minutes=minutes, goal=goal, completed=True)
+            FocusSession.objects.filter(pk=session.pk).update(start_time=now - timedelta(days=days_ago))
+        FocusSession.objects.create(user=self.user, duration_minutes=99)
+        self.today = timezone.localdate()
+        self.url = reverse('analytics-focus-timeseries')
+
+    def test_daily_series_is_gap_filled(self):
+        """Test one zero-filled point per day in range"""
+        start = self.today - timedelta(days=3)
+        response = self.client.get(self.url, {'from': start.isoformat(), 'to': self.today.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        series = response.data['series']
+        self.assertEqual([p['period'] for p in series], [(start + timedelta(days=i)).isoformat() for i in range(4)])
+        self.assertEqual([p['focus_minutes'] for p in series], [0, 50, 0, 40])
+        self.assertEqual(series[-1]['session_count'], 2)
+        self.assertEqual(response.data['total_minutes'], 90)
+
+    def test_filters_and_weekly_buckets(self):
+        """Test goal filter and week bucketing"""
+        start = self.today - timedelta(days=20)
+        response = self.client.get(self.url, {'from': start.isoformat(), 'bucket': 'week', 'goal': self.goal.pk})
+        self.assertEqual(response.data['total_minutes'], 75)
+        self.assertTrue(all(p['period'] <= self.today.isoformat() for p in response.data['series']))
+
+        response = self.client.get(self.url, {'from': start.isoformat(), 'bucket': 'month'})
+        self.assertEqual(response.data['total_minutes'], 120)
+
+    def test_invalid_parameters(self):
+        """Test bad parameters are rejected"""
+        self.assertEqual(self.client.get(self.url, {'bucket': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'from': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'session_type': 'nap'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'from': '2000-01-01'}).status_code, 400)
+
+    def test_out_of_range_dates(self):
+        """Test dates near the limits of ``date`` get a 400 instead of overflowing"""
+        for params in [
+            {'from': '9999-12-01', 'to': '9999-12-31', 'bucket': 'month'},
+            {'to': '9999-12-31'},
+            {'from': '0001-01-01', 'to': '9999-12-30'},
+            {'to': '0001-01-05'},
+        ]:
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+        response = self.client.get(self.url, {'from': '9999-12-01', 'to': '9999-12-30', 'bucket': 'month'})
+        self.assertEqual([p['period'] for p in response.data['series']], ['9999-12-01'])
+        response = self.client.get(self.url, {'to': '1970-01-05'})
+        self.assertEqual((response.data['from'], len(response.data['series'])), ('1970-01-01', 5))
+
+    def test_bucket_count(self):
+        """Test buckets are counted across leap days, week starts and years"""
+        for start, end, expected in [
+            (date(2024, 1, 31), date(2024, 3, 1), {'day': 31, 'week': 5, 'month': 3}),
+            (date(2025, 12, 29), date(2026, 1, 4), {'day': 7, 'week': 1, 'month': 2}),
+        ]:
+            self.assertEqual({bucket: bucket_count(start, end, bucket) for bucket in expected}, expected)
+
+
+class PayloadCacheTest(TestCase):
+    def setUp(self):
+        """Set up an authenticated client with an empty cache"""
+        cache.clear()
+        self.user = User.objects.create_user(username='cacheuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_dashboard_cached_until_goal_changes(self):
+        """Test dashboard hits the cache and is invalidated by goal writes"""
+        url = reverse('dashboard-stats')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        Goal.objects.create(user=self.user, title='New Goal')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['total_goals'], 1)
+
+    def test_session_completion_invalidates_dashboard_and_streak(self):
+        """Test completing a session refreshes both payloads"""
+        session = FocusSession.objects.create(user=self.user, duration_minutes=25)
+        self.client.get(reverse('dashboard-stats'))
+        self.client.get(reverse('study-streak-detail'))
+
+        self.client.post(reverse('focus-session-complete', args=[session.pk]))
+
+        dashboard = self.client.get(reverse('dashboard-stats'))
+        streak = self.client.get(reverse('study-streak-detail'))
+        self.assertEqual(dashboard['X-Cache'], 'MISS')
+        self.assertEqual(dashboard.data['today_minutes'], 25)
+        self.assertEqual(streak['X-Cache'], 'MISS')
+        self.assertEqual(streak.data['current_streak'], 1)
+
+    def test_invalidated_again_on_commit(self):
+        """Test a payload re-cached while the write was uncommitted is dropped at commit"""
+        url = reverse('study-streak-detail')
+        with self.captureOnCommitCallbacks(execute=True):
+            StudyStreak.objects.create(user=self.user)
+            # A concurrent read still sees the old rows and caches them
+            self.client.get(url)
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    def test_stats_endpoint(self):
+        """Test hit/miss counters are exposed to staff only"""
+        self.client.get(reverse('study-streak-detail'))
+        self.client.get(reverse('study-streak-detail'))
+        self.assertEqual(self.client.get(reverse('cache-stats')).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        stats = self.client.get(reverse('cache-stats')).data
+        self.assertEqual(stats['streak'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+
+class QuotePoolTest(TestCase):
+    def setUp(self):
+        """Set up quotes in two categories"""
+        cache.clear()
+        self.user = User.objects.create_user(username='quoteuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.focus = MotivationalQuote.objects.create(text='Stay on task.', category='focus')
+        self.success = MotivationalQuote.objects.create(text='Keep going.', category='success')
+
+    def test_random_quote_is_a_primary_key_lookup(self):
+        """Test the random endpoint does one query once the pool is warm"""
+        self.client.get(reverse('quote-random'))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('quote-random'))
+        self.assertIn(response.data['id'], {self.focus.pk, self.success.pk})
+
+    def test_pool_follows_deactivation_and_category(self):
+        """Test deactivated quotes leave the pool and categories filter"""
+        response = self.client.get(reverse('quote-list'), {'category': 'focus'})
+        self.assertEqual([q['id'] for q in response.data['results']], [self.focus.pk])
+
+        self.focus.is_active = False
+        self.focus.save()
+        for _ in range(5):
+            self.assertEqual(self.client.get(reverse('quote-random')).data['id'], self.success.pk)
+        response = self.client.get(reverse('quote-list'), {'category': 'focus'})
+        self.assertEqual(response.data['results'], [])
+
+        self.success.delete()
+        self.assertEqual(self.client.get(reverse('quote-random')).status_code, 404)
+
+
+    def test_pool_version_changes_after_commit(self):
+        """Test a reload racing the write transaction is replaced once it commits"""
+        quote_pool.ids()
+        with self.captureOnCommitCallbacks() as callbacks:
+            MotivationalQuote.objects.create(text='Later.', category='focus')
+            version = cache.get(QUOTE_POOL_VERSION_KEY)
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertNotEqual(cache.get(QUOTE_POOL_VERSION_KEY), version)
+
+class QueryBudgetMixin:
+    """Fails a test when a request runs more queries than its budget"""
+
+    def assertQueryBudget(self, budget, url, method='get', **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertLessEqual(
+            len(ctx), budget,
+            f"{url} ran {len(ctx)} queries (budget {budget}):\n"
+            + "\n".join(q['sql'] for q in ctx.captured_queries)
+        )
+        return response, len(ctx)
+
+
+class EndpointQueryBudgetTest(QueryBudgetMixin, TestCase):
+    # Maximum queries per request, independent of how many rows are returned.
+    # Each includes the one conditional-GET validator query.
+    LIST_BUDGETS = {
+        'goal-list-create': 3,
+        'focus-session-list-create': 2,
+        'distraction-list-create': 2,
+        'emotional-checkin-list-create': 2,
+        'motivational-nudge-list': 2,
+    }
+    DETAIL_BUDGETS = {
+        'goal-detail': 3,
+        'focus-session-detail': 2,
+        'distraction-detail': 2,
+        'emotional-checkin-detail': 2,
+        'motivational-nudge-detail': 2,
+    }
+
+    def setUp(self):
+        """Set up an authenticated client"""
+        cache.clear()
+        self.user = User.objects.create_user(username='budgetuser', password='testpass123')
+        UserProfile.objects.create(user=self.user)
+        StudyStreak.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def seed(self, count):
+        """Create ``count`` rows of every per-user resource"""
+        for i in range(count):
+            goal = Goal.objects.create(user=self.user, title=f'Goal {i}')
+            session = FocusSession.objects.create(user=self.user, duration_minutes=25, goal=goal)
+            FocusSession.objects.create(user=self.user, duration_minutes=10, goal=goal)
+            DistractionLog.objects.create(user=self.user, distraction_type='phone', focus_session=session)
+            EmotionalCheckIn.objects.create(user=self.user, mood='good', energy_level=5, stress_level=5)
+            MotivationalNudge.objects.create(user=self.user, nudge_type='tip', title=f'Tip {i}', content='Breathe')
+        return {
+            'goal-detail': goal.pk,
+            'focus-session-detail': session.pk,
+            'distraction-detail': DistractionLog.objects.filter(user=self.user).last().pk,
+            'emotional-checkin-detail': EmotionalCheckIn.objects.filter(user=self.user).last().pk,
+            'motivational-nudge-detail': MotivationalNudge.objects.filter(user=self.user).last().pk,
+        }
+
+    def measure(self):
+        counts = {}
+        ids = self.ids
+        for name, budget in self.LIST_BUDGETS.items():
+            response, counts[name] = self.assertQueryBudget(budget, reverse(name))
+            self.assertEqual(response.status_code, 200)
+        for name, budget in self.DETAIL_BUDGETS.items():
+            response, counts[name] = self.assertQueryBudget(budget, reverse(name, args=[ids[name]]))
+            self.assertEqual(response.status_code, 200)
+        # The streak also reads the study-day bitmaps to compute current_streak
+        for name, budget in (('profile-detail', 2), ('study-streak-detail', 3)):
+            response, counts[name] = self.assertQueryBudget(budget, reverse(name))
+            self.assertEqual(response.status_code, 200)
+        return counts
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        """Test every endpoint stays within budget for one row and a full page"""
+        self.ids = self.seed(1)
+        small = self.measure()
+        cache.clear()
+        self.ids = self.seed(25)
+        self.assertEqual(self.measure(), small)
+
+
+class SparseFieldsetTest(TestCase):
+    def setUp(self):
+        """Set up a goal with a session and a distraction"""
+        cache.clear()
+        self.user = User.objects.create_user(username='sparseuser', password='testpass123')
+        UserProfile.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.goal = Goal.objects.create(user=self.user, title='Sparse Goal', description='Long text')
+        self.session = FocusSession.objects.create(user=self.user, duration_minutes=25, goal=self.goal)
+        DistractionLog.objects.create(user=self.user, distraction_type='noise', focus_session=self.session)
+
+    def test_relations_default_to_ids(self):
+        """Test relations are ids unless expanded"""
+        goal = self.client.get(reverse('goal-list-create')).data['results'][0]
+        self.assertEqual(goal['user'], self.user.pk)
+        detail = self.client.get(reverse('goal-detail', args=[self.goal.pk])).data
+        self.assertEqual(detail['focus_sessions'], [self.session.pk])
+
+        goal = self.client.get(reverse('goal-list-create'), {'expand': 'user'}).data['results'][0]
+        self.assertEqual(goal['user']['username'], 'sparseuser')
+        detail = self.client.get(reverse('goal-detail', args=[self.goal.pk]), {'expand': 'focus_sessions'}).data
+        self.assertEqual(detail['focus_sessions'][0]['duration_minutes'], 25)
+
+    def test_nested_expand_uses_joins(self):
+        """Test dotted expansion is loaded in the same query"""
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('distraction-list-create'), {'expand': 'focus_session.goal'})
+        focus_session = response.data['results'][0]['focus_session']
+        self.assertEqual(focus_session['goal']['title'], 'Sparse Goal')
+        self.assertEqual(focus_session['user'], self.user.pk)
+
+    def test_fields_limit_output_and_columns(self):
+        """Test fields trims the payload and the selected columns"""
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('goal-list-create'), {'fields': 'id,title'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        self.assertNotIn('description', ctx.captured_queries[-1]['sql'])
+
+        response = self.client.get(
+            reverse('focus-session-list-create'), {'fields': 'id,goal.title', 'expand': 'goal'}
+        )
+        self.assertEqual(response.data['results'][0], {'id': self.session.pk, 'goal': {'title': 'Sparse Goal'}})
+
+    def test_profile_keeps_nested_user(self):
+        """Test the profile still embeds the user by default"""
+        response = self.client.get(reverse('profile-detail'))
+        self.assertEqual(response.data['user']['username'], 'sparseuser')
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        """Set up 45 sessions, 30 of them sharing one start time"""
+        self.user = User.objects.create_user(username='cursoruser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        for i in range(45):
+            session = FocusSession.objects.create(user=self.user, duration_minutes=i + 1)
+            start = now if i < 30 else now + timedelta(minutes=i)
+            FocusSession.objects.filter(pk=session.pk).update(start_time=start)
+        self.expected = list(
+            FocusSession.objects.filter(user=self.user).order_by('-start_time', '-id').values_list('id', flat=True)
+        )
+
+    def test_walks_forward_and_back_without_gaps(self):
+        """Test next/previous links cover every row exactly once"""
+        url, seen, pages = reverse('focus-session-list-create'), [], []
+        while url:
+            response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            pages.append(response.data)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+
+        previous = self.client.get(pages[2]['previous']).data
+        self.assertEqual([row['id'] for row in previous['results']], self.expected[20:40])
+
+    def test_page_number_mode_still_available(self):
+        """Test ?page= keeps the page-number response"""
+        response = self.client.get(reverse('focus-session-list-create'), {'page': 2})
+        self.assertEqual(response.data['count'], 45)
+        self.assertEqual([row['id'] for row in response.data['results']], self.expected[20:40])
+
+    def test_invalid_cursor(self):
+        """Test a garbled cursor is rejected"""
+        response = self.client.get(reverse('focus-session-list-create'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans checked on SQLite only')
+class AccessPatternIndexTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='indexuser', password='testpass123')
+
+    def assertUsesIndex(self, queryset, *field_sets):
+        index_names = {index.name for index in queryset.model._meta.indexes if index.fields in field_sets}
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in index_names), plan)
+
+    def test_history_queries_use_composite_indexes(self):
+        """Test per-user time-ordered queries search the composite indexes"""
+        now = timezone.now()
+        self.assertUsesIndex(
+            FocusSession.objects.filter(user=self.user).order_by('-start_time', '-id'),
+            ['user', 'start_time'],
+        )
+        self.assertUsesIndex(
+            DistractionLog.objects.filter(user=self.user).order_by('-timestamp', '-id'),
+            ['user', 'timestamp'],
+        )
+        self.assertUsesIndex(
+            FocusSession.objects.filter(
+                user=self.user, completed=True, start_time__gte=now - timedelta(days=1), start_time__lt=now
+            ),
+            ['user', 'start_time'], ['user', 'completed', 'start_time'],
+        )
+
+
+class BulkCreateTest(TestCase):
+    def setUp(self):
+        """Set up an authenticated client"""
+        cache.clear()
+        self.user = User.objects.create_user(username='bulkuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_sessions_created_in_one_batch(self):
+        """Test valid items are inserted and invalid ones reported per item"""
+        items = [
+            {'client_ref': 'a', 'duration_minutes': 25, 'completed': True},
+            {'client_ref': 'b', 'duration_minutes': -5},
+            {'client_ref': 'c', 'duration_minutes': 15, 'completed': True, 'session_type': 'custom'},
+            'not an object',
+        ]
+        response = self.client.post(reverse('focus-session-bulk-create'), items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 2))
+        results = response.data['results']
+        self.assertEqual([r['status'] for r in results], ['created', 'error', 'created', 'error'])
+        self.assertEqual(results[1]['client_ref'], 'b')
+        self.assertIn('duration_minutes', results[1]['errors'])
+        self.assertEqual(FocusSession.objects.filter(user=self.user).count(), 2)
+
+        # Side effects applied once for the batch
+        rollup = DailyFocusRollup.objects.get(user=self.user)
+        self.assertEqual((rollup.focus_minutes, rollup.session_count), (40, 2))
+        streak = StudyStreak.objects.get(user=self.user)
+        self.assertEqual((streak.current_streak, streak.total_study_days), (1, 1))
+        self.assertEqual(self.client.get(reverse('dashboard-stats')).data['today_minutes'], 40)
+
+    def test_distractions_and_checkins(self):
+        """Test the other bulk endpoints and their limits"""
+        response = self.client.post(
+            reverse('distraction-bulk-create'),
+            [{'distraction_type': 'phone', 'duration_minutes': 4}] * 3, format='json'
+        )
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(DailyFocusRollup.objects.get(user=self.user).distraction_minutes, 12)
+
+        response = self.client.post(
+            reverse('emotional-checkin-bulk-create'),
+            [{'mood': 'good', 'energy_level': 7, 'stress_level': 2}], format='json'
+        )
+        self.assertEqual(response.data['created'], 1)
+
+        with self.settings(BULK_CREATE_MAX_ITEMS=2):
+            response = self.client.post(
+                reverse('emotional-checkin-bulk-create'),
+                [{'mood': 'good', 'energy_level': 7, 'stress_level': 2}] * 3, format='json'
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post(reverse('distraction-bulk-create'), {}, format='json').status_code, 400)
+
+    def test_imported_items_keep_their_own_time(self):
+        """Test bulk items are dated by the client, within bounds"""
+        started = timezone.now() - timedelta(days=3)
+        items = [
+            {'duration_minutes': 25, 'completed': True, 'start_time': started.isoformat()},
+            {'duration_minutes': 25, 'start_time': (timezone.now() + timedelta(days=1)).isoformat()},
+            {'duration_minutes': 25, 'start_time': (timezone.now() - timedelta(days=400)).isoformat()},
+        ]
+        response = self.client.post(reverse('focus-session-bulk-create'), items, format='json')
+        self.assertEqual([r['status'] for r in response.data['results']], ['created', 'error', 'error'])
+        self.assertEqual(FocusSession.objects.get(user=self.user).start_time, started)
+        rollup = DailyFocusRollup.objects.get(user=self.user)
+        self.assertEqual(rollup.date, rollup_day(started))
+        self.assertEqual(self.client.get(reverse('dashboard-stats')).data['today_minutes'], 0)
+
+        response = self.client.post(
+            reverse('distraction-bulk-create'),
+            [{'distraction_type': 'phone', 'duration_minutes': 4, 'timestamp': started.isoformat()}],
+            format='json'
+        )
+        self.assertEqual(DistractionLog.objects.get(user=self.user).timestamp, started)
+        self.assertEqual(DailyFocusRollup.objects.get(user=self.user).distraction_minutes, 4)
+
+        # The single-row endpoint still stamps the server time
+        response = self.client.post(
+            reverse('focus-session-list-create'),
+            {'duration_minutes': 25, 'start_time': started.isoformat()}, format='json'
+        )
+        self.assertGreater(FocusSession.objects.get(pk=response.data['id']).start_time, started)
+
+
+class SyncFeedTest(TestCase):
+    def setUp(self):
+        """Set up an authenticated client with some history"""
+        self.user = User.objects.create_user(username='syncuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.goal = Goal.objects.create(user=self.user, title='Synced Goal')
+        self.session = FocusSession.objects.create(user=self.user, duration_minutes=25, goal=self.goal)
+        self.url = reverse('sync-feed')
+
+    def test_first_sync_then_delta(self):
+        """Test a follow-up sync only carries changes and deletes"""
+        first = self.client.get(self.url).data
+        self.assertEqual([g['id'] for g in first['goals']['updated']], [self.goal.pk])
+        self.assertEqual(len(first['focus_sessions']['updated']), 1)
+        self.assertFalse(first['has_more'])
+
+        # Move the overlap window past the existing rows
+        Goal.objects.filter(pk=self.goal.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        FocusSession.objects.filter(pk=self.session.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        checkin = EmotionalCheckIn.objects.create(user=self.user, mood='okay', energy_level=5, stress_level=5)
+        session_id = self.session.pk
+        self.session.delete()
+
+        delta = self.client.get(self.url, {'since': first['token']}).data
+        self.assertEqual(delta['goals']['updated'], [])
+        self.assertEqual([c['id'] for c in delta['emotional_checkins']['updated']], [checkin.pk])
+        self.assertEqual(delta['focus_sessions']['deleted'], [session_id])
+
+    def test_has_more_resumes_without_gaps(self):
+        """Test a truncated feed hands back a token that resumes the rest"""
+        for i in range(4):
+            Goal.objects.create(user=self.user, title=f'Goal {i}')
+        seen, token = set(), None
+        with self.settings(SYNC_MAX_ITEMS=2):
+            for _ in range(5):
+                params = {'since': token} if token else {}
+                feed = self.client.get(self.url, params).data
+                seen.update(g['id'] for g in feed['goals']['updated'])
+                token = feed['token']
+                if not feed['has_more']:
+                    break
+        self.assertEqual(seen, set(Goal.objects.filter(user=self.user).values_list('id', flat=True)))
+        self.assertFalse(feed['has_more'])
+
+    def test_has_more_moves_past_rows_sharing_a_timestamp(self):
+        """Test a page cut inside one bulk-updated timestamp resumes after it"""
+        for i in range(3):
+            FocusSession.objects.create(user=self.user, duration_minutes=i, goal=self.goal)
+        FocusSession.objects.filter(user=self.user).update(updated_at=timezone.now())
+        seen, token = [], None
+        with self.settings(SYNC_MAX_ITEMS=2):
+            for _ in range(4):
+                feed = self.client.get(self.url, {'since': token} if token else {}).data
+                seen += [s['id'] for s in feed['focus_sessions']['updated']]
+                token = feed['token']
+                if not feed['has_more']:
+                    break
+        self.assertFalse(feed['has_more'])
+        self.assertEqual(sorted(set(seen)), sorted(FocusSession.objects.values_list('id', flat=True)))
+
+    def test_bad_and_expired_tokens(self):
+        """Test invalid tokens are rejected and expired ones ask for a full sync"""
+        self.assertEqual(self.client.get(self.url, {'since': 'garbage'}).status_code, 400)
+        old = encode_token(timezone.now() - timedelta(days=365), 0)
+        self.assertEqual(self.client.get(self.url, {'since': old}).status_code, 410)
+
+    def test_deleting_a_goal_touches_its_sessions(self):
+        """Test sessions detached from a deleted goal show up as updated"""
+        first = self.client.get(self.url).data
+        FocusSession.objects.filter(pk=self.session.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        self.goal.delete()
+        delta = self.client.get(self.url, {'since': first['token']}).data
+        self.assertEqual([(s['id'], s['goal']) for s in delta['focus_sessions']['updated']], [(self.session.pk, None)])
+
+    def test_prune_task(self):
+        """Test the scheduled task deletes only tombstones past retention"""
+        SyncTombstone.objects.create(user=self.user, resource='goals', object_id=1)
+        old = SyncTombstone.objects.create(user=self.user, resource='goals', object_id=2)
+        SyncTombstone.objects.filter(pk=old.pk).update(deleted_at=timezone.now() - timedelta(days=365))
+        self.assertEqual(prune_sync_tombstones_task(), 1)
+        self.assertEqual(list(SyncTombstone.objects.values_list('object_id', flat=True)), [1])
+        self.assertIn('prune_sync_tombstones', settings.CELERY_BEAT_SCHEDULE)
+
+    def test_user_deletion_leaves_no_tombstones(self):
+        """Test cascading deletes of a user do not record tombstones"""
+        self.goal.delete()
+        self.assertEqual(SyncTombstone.objects.filter(resource='goals').count(), 1)
+        self.user.delete()
+        self.assertFalse(SyncTombstone.objects.exists())
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        """Set up an authenticated client and a goal"""
+        cache.clear()
+        self.user = User.objects.create_user(username='etaguser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.goal = Goal.objects.create(user=self.user, title='Cached Goal')
+
+    def test_list_revalidates_with_one_query(self):
+        """Test a matching ETag gets 304 after only the validator query"""
+        url = reverse('goal-list-create')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        other = Goal.objects.create(user=self.user, title='Another')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get(url)['ETag']
+        other.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_etag_varies_with_query_string(self):
+        """Test different fieldsets do not share an ETag"""
+        url = reverse('goal-list-create')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_last_modified(self):
+        """Test detail views honour If-Modified-Since and session changes"""
+        url = reverse('goal-detail', args=[self.goal.pk])
+        response = self.client.get(url)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
+        etag = response['ETag']
+        FocusSession.objects.create(user=self.user, duration_minutes=25, goal=self.goal)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_expanded_relations_change_the_validator(self):
+        """Test editing an expanded goal invalidates the session list and detail"""
+        session = FocusSession.objects.create(user=self.user, duration_minutes=25, goal=self.goal)
+        for url in (reverse('focus-session-list-create'), reverse('focus-session-detail', args=[session.pk])):
+            etag = self.client.get(url, {'expand': 'goal'})['ETag']
+            self.assertEqual(self.client.get(url, {'expand': 'goal'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.goal.title = f'Renamed for {url}'
+            self.goal.save()
+            response = self.client.get(url, {'expand': 'goal'}, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Renamed', response.content.decode())
+
+    def test_unversioned_expansions_skip_conditional_handling(self):
+        """Test expanding the user, which has no updated_at, always renders"""
+        response = self.client.get(reverse('goal-list-create'), {'expand': 'user'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+    def test_streak_and_missing_rows(self):
+        """Test single-object views and 404s"""
+        self.client.get(reverse('study-streak-detail'))
+        etag = self.client.get(reverse('study-streak-detail'))['ETag']
+        self.assertEqual(
+            self.client.get(reverse('study-streak-detail'), HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        self.assertEqual(self.client.get(reverse('goal-detail', args=[999])).status_code, 404)
+
+
+class CountingEmailBackend(LocmemEmailBackend):
+    """Locmem backend that counts connections and can fail chosen sends"""
+    opened = 0
+    fail_subjects = set()
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.subject in CountingEmailBackend.fail_subjects:
+                CountingEmailBackend.fail_subjects.discard(message.subject)
+                raise ConnectionError('SMTP server went away')
+        return super().send_messages(messages)
+
+
+class MotivationEmailBatchTest(TestCase):
+    def setUp(self):
+        """Set up five due subscriptions, one without an email address"""
+        for target, kwargs in (('api.tasks.QuoteProvider.pool', {'return_value': ['Keep going.']}),
+                               ('api.tasks.enqueue_delivery', {})):
+            patcher = mock.patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        CountingEmailBackend.opened = 0
+        CountingEmailBackend.fail_subjects = set()
+        for i in range(5):
+            user = User.objects.create_user(
+                username=f'mailuser{i}', email=f'mail{i}@example.com' if i else '', password='testpass123'
+            )
+            MotivationSubscription.objects.create(
+                user=user, goal_label=f'Goal {i}', next_send_at=timezone.now() - timedelta(minutes=1)
+            )
+
+    def test_one_connection_per_chunk(self):
+        """Test messages share a connection per chunk and are rescheduled"""
+        with self.settings(EMAIL_BACKEND='api.tests.CountingEmailBackend', MOTIVATION_EMAIL_BATCH_SIZE=2):
+            summary = process_motivation_subscriptions()
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(CountingEmailBackend.opened, 2)
+        self.assertEqual((summary['sent'], summary['failed'], summary['skipped']), (4, 0, 1))
+        self.assertFalse(MotivationSubscription.objects.filter(next_send_at__lte=timezone.now()).exists())
+
+    def test_reconnects_and_retries_failed_send(self):
+        """Test a dropped connection is reopened and the message retried once"""
+        CountingEmailBackend.fail_subjects = {'Motivation for your goal: Goal 2'}
+        with self.settings(EMAIL_BACKEND='api.tests.CountingEmailBackend', MOTIVATION_EMAIL_BATCH_SIZE=10), \
+                self.assertLogs('api.tasks', 'WARNING'):
+            summary = process_motivation_subscriptions()
+        self.assertEqual(len(mail.outbox), 4)
+        self.assertEqual(CountingEmailBackend.opened, 2)
+        self.assertEqual(summary['failed'], 0)
+        sub = MotivationSubscription.objects.get(goal_label='Goal 2')
+        self.assertEqual(summary['outcomes'][str(sub.pk)], 'sent')
+
+
+
+class StubQuoteHandler(BaseHTTPRequestHandler):
+    """Serves a fixed zenquotes-style payload and counts requests"""
+    hits = 0
+
+    def do_GET(self):
+        StubQuoteHandler.hits += 1
+        body = json.dumps([{'q': 'Stub quote one', 'a': 'Tester'}, {'q': 'Stub quote two', 'a': ''}]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class QuoteProviderTest(TestCase):
+    def setUp(self):
+        """Start a local stub quote server and three due subscriptions"""
+        cache.clear()
+        patcher = mock.patch('api.tasks.enqueue_delivery')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        StubQuoteHandler.hits = 0
+        self.server = HTTPServer(('127.0.0.1', 0), StubQuoteHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.stub_url = f'http://127.0.0.1:{self.server.server_port}/api/quotes'
+        for i in range(3):
+            user = User.objects.create_user(username=f'quoteuser{i}', email=f'q{i}@example.com', password='testpass123')
+            MotivationSubscription.objects.create(
+                user=user, goal_label=f'Goal {i}', next_send_at=timezone.now() - timedelta(minutes=1)
+            )
+
+    def test_one_remote_fetch_per_run(self):
+        """Test all recipients share one bulk fetch and the pool is reused from cache"""
+        with self.settings(MOTIVATION_QUOTES_URL=self.stub_url):
+            process_motivation_subscriptions()
+            self.assertEqual(QuoteProvider().pool(), ['Stub quote one — Tester', 'Stub quote two'])
+        self.assertEqual(StubQuoteHandler.hits, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn('Stub quote', mail.outbox[0].body)
+
+    def test_circuit_opens_and_falls_back_to_database(self):
+        """Test repeated remote failures open the circuit and serve database quotes"""
+        MotivationalQuote.objects.create(text='Database quote', author='Admin')
+        dead_url = self.stub_url.replace(str(self.server.server_port), '1')
+        with self.settings(MOTIVATION_QUOTES_URL=dead_url, MOTIVATION_QUOTES_FAILURE_THRESHOLD=2):
+            for _ in range(2):
+                cache.delete(POOL_KEY)
+                with self.assertLogs('api.quote_provider', 'WARNING'):
+                    self.assertEqual(QuoteProvider().pool(), ['Database quote — Admin'])
+            cache.delete(POOL_KEY)
+            with mock.patch('api.quote_provider.requests.get') as get:
+                self.assertEqual(QuoteProvider().pool(), ['Database quote — Admin'])
+            get.assert_not_called()
+
+    def test_local_quotes_when_everything_fails(self):
+        """Test the built-in quotes are used when remote and database are empty"""
+        with self.settings(MOTIVATION_QUOTES_URL=self.stub_url.replace(str(self.server.server_port), '1')), \
+                self.assertLogs('api.quote_provider', 'WARNING'):
+            pool = QuoteProvider().pool()
+        self.assertIn('The secret of getting ahead is getting started.', pool)
+
+
+class MotivationSchedulerTest(TestCase):
+    def setUp(self):
+        """Set up four due subscriptions with a fixed quote pool"""
+        for target, kwargs in (('api.tasks.QuoteProvider.pool', {'return_value': ['Keep going.']}),
+                               ('api.tasks.enqueue_delivery', {})):
+            patcher = mock.patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.now = timezone.now()
+        self.subs = []
+        for i in range(4):
+            user = User.objects.create_user(username=f'sched{i}', email=f's{i}@example.com', password='testpass123')
+            self.subs.append(MotivationSubscription.objects.create(
+                user=user, goal_label=f'Goal {i}', next_send_at=self.now - timedelta(minutes=1)
+            ))
+
+    def test_leased_rows_are_skipped_by_other_workers(self):
+        """Test a second worker does not email rows another worker has claimed"""
+        self.assertEqual(claim_due_subscriptions(uuid.uuid4(), limit=3), 3)
+        summary = process_motivation_subscriptions()
+        self.assertEqual((summary['due'], summary['sent']), (1, 1))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_expired_lease_is_reclaimed_without_resending(self):
+        """Test a slot already emailed by a crashed worker is rescheduled, not resent"""
+        sub = self.subs[0]
+        slot = sub.next_send_at
+        MotivationSubscription.objects.filter(pk=sub.pk).update(
+            claim_token=uuid.uuid4(), claimed_until=self.now - timedelta(seconds=1), last_sent_slot=slot,
+        )
+        summary = process_motivation_subscriptions()
+        self.assertEqual((summary['sent'], summary['already_sent']), (3, 1))
+        sub.refresh_from_db()
+        self.assertEqual(sub.next_send_at, slot + timedelta(minutes=60))
+        self.assertIsNone(sub.claim_token)
+
+    def test_reschedule_keeps_slots_aligned(self):
+        """Test slots advance by the interval and lagging ones restart from now"""
+        lagging = self.subs[1]
+        MotivationSubscription.objects.filter(pk=lagging.pk).update(
+            next_send_at=self.now - timedelta(hours=5), interval_minutes=30,
+        )
+        with self.settings(MOTIVATION_CLAIM_CHUNK_SIZE=2):
+            summary = process_motivation_subscriptions()
+        self.assertEqual(summary['sent'], 4)
+        on_time = MotivationSubscription.objects.get(pk=self.subs[0].pk)
+        self.assertEqual(on_time.next_send_at, self.subs[0].next_send_at + timedelta(minutes=60))
+        lagging.refresh_from_db()
+        self.assertGreater(lagging.next_send_at, self.now + timedelta(minutes=29))
+        self.assertFalse(MotivationSubscription.objects.filter(claim_token__isnull=False).exists())
+
+    def test_run_only_takes_slots_due_when_it_started(self):
+        """Test a slot rescheduled into the past during a run is left for the next run"""
+        MotivationSubscription.objects.filter(pk__in=[sub.pk for sub in self.subs[1:]]).update(active=False)
+        MotivationSubscription.objects.filter(pk=self.subs[0].pk).update(interval_minutes=1)
+        clock = iter(self.now + timedelta(minutes=5 * i) for i in range(1000))
+        with mock.patch('django.utils.timezone.now', side_effect=lambda: next(clock)), \
+                self.settings(MOTIVATION_CLAIM_CHUNK_SIZE=1):
+            summary = process_motivation_subscriptions()
+        self.assertEqual(summary['sent'], 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_dispatch_enqueues_one_worker_per_chunk(self):
+        """Test the dispatcher fans due subscriptions out in chunks"""
+        with self.settings(MOTIVATION_DELIVERY_MODE='poll', MOTIVATION_CLAIM_CHUNK_SIZE=3), \
+                mock.patch('api.tasks.process_motivation_chunk.delay') as delay:
+            self.assertEqual(dispatch_motivation_subscriptions(), 2)
+        self.assertEqual(delay.call_count, 2)
+
+
+class EtaDeliveryTest(TestCase):
+    def setUp(self):
+        """Set up an authenticated client and a fixed quote pool"""
+        patcher = mock.patch('api.tasks.QuoteProvider.pool', return_value=['Keep going.'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='etauser', email='eta@example.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_start_enqueues_first_slot(self):
+        """Test MotivationStart schedules the first delivery with an ETA"""
+        with mock.patch('api.tasks.deliver_motivation_subscription.apply_async') as apply_async, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('motivation-start'), {'goal_label': 'Thesis'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        sub = MotivationSubscription.objects.get(user=self.user)
+        apply_async.assert_called_once_with(args=[sub.pk, sub.next_send_at.isoformat()], eta=sub.next_send_at)
+
+    def test_delivery_sends_and_enqueues_next_slot(self):
+        """Test an ETA task sends its slot once and schedules the following one"""
+        slot = timezone.now() - timedelta(seconds=1)
+        sub = MotivationSubscription.objects.create(user=self.user, goal_label='Thesis', next_send_at=slot)
+        with mock.patch('api.tasks.enqueue_delivery') as enqueue:
+            summary = deliver_motivation_subscription(sub.pk, slot.isoformat())
+            self.assertIsNone(deliver_motivation_subscription(sub.pk, slot.isoformat()))
+        self.assertEqual(summary['sent'], 1)
+        self.assertEqual(len(mail.outbox), 1)
+        enqueue.assert_called_once_with(sub.pk, slot + timedelta(minutes=60))
+
+    def test_zero_interval_is_rejected_and_never_loops(self):
+        """Test interval_minutes below one is refused, and a stored zero still moves the slot forward"""
+        response = self.client.post(
+            reverse('motivation-start'), {'goal_label': 'Thesis', 'interval_minutes': 0}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MotivationSubscription.objects.exists())
+
+        slot = timezone.now() - timedelta(seconds=1)
+        sub = MotivationSubscription.objects.create(
+            user=self.user, goal_label='Thesis', next_send_at=slot, interval_minutes=0
+        )
+        with mock.patch('api.tasks.enqueue_delivery') as enqueue:
+            deliver_motivation_subscription(sub.pk, slot.isoformat())
+        sub.refresh_from_db()
+        self.assertGreater(sub.next_send_at, timezone.now())
+        enqueue.assert_called_once_with(sub.pk, sub.next_send_at)
+
+    def test_stopped_subscription_is_not_delivered(self):
+        """Test a pending ETA task does nothing once the subscription is stopped"""
+        slot = timezone.now() - timedelta(seconds=1)
+        sub = MotivationSubscription.objects.create(user=self.user, goal_label='Thesis', next_send_at=slot, active=False)
+        self.assertIsNone(deliver_motivation_subscription(sub.pk, slot.isoformat()))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_sweep_only_reconciles_overdue_slots(self):
+        """Test the sweep leaves slots within the grace period to their ETA task"""
+        now = timezone.now()
+        MotivationSubscription.objects.create(user=self.user, goal_label='Fresh', next_send_at=now - timedelta(seconds=30))
+        MotivationSubscription.objects.create(user=self.user, goal_label='Lost', next_send_at=now - timedelta(minutes=10))
+        with mock.patch('api.tasks.process_motivation_chunk.delay') as delay:
+            with self.settings(MOTIVATION_DELIVERY_MODE='eta', MOTIVATION_RECONCILE_GRACE_SECONDS=120):
+                self.assertEqual(dispatch_motivation_subscriptions(), 1)
+            with self.settings(MOTIVATION_DELIVERY_MODE='poll', MOTIVATION_CLAIM_CHUNK_SIZE=1):
+                self.assertEqual(dispatch_motivation_subscriptions(), 2)
+        self.assertEqual(delay.call_count, 3)
+
+    def test_enqueue_failure_is_logged_not_raised(self):
+        """Test a broker outage leaves the slot to the reconciliation sweep"""
+        with mock.patch('api.tasks.deliver_motivation_subscription.apply_async', side_effect=OSError('broker down')), \
+                self.assertLogs('api.tasks', 'WARNING'):
+            enqueue_delivery(1, timezone.now())
+
+
+class StudyDayBitmapTest(TestCase):
+    def setUp(self):
+        """Set up a user whose profile is in UTC+14"""
+        cache.clear()
+        self.user = User.objects.create_user(username='bitmapuser', password='testpass123')
+        UserProfile.objects.create(user=self.user, timezone='Pacific/Kiritimati')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def complete_session_at(self, moment):
+        session = FocusSession.objects.create(user=self.user, duration_minutes=25)
+        FocusSession.objects.filter(pk=session.pk).update(start_time=moment)
+        self.client.post(reverse('focus-session-complete', args=[session.pk]))
+        return session
+
+    def test_streak_stats_from_bits(self):
+        """Test current, longest and total streaks across a year boundary"""
+        # Dec 30-31 2025 and Jan 1-2 2026 studied; an older three-day run in 2025
+        bitmaps = {2025: 0b111 | (0b11 << 363), 2026: 0b11}
+        stats = streak_stats(bitmaps, date(2026, 1, 3))
+        self.assertEqual(stats['current_streak'], 4)
+        self.assertEqual(stats['longest_streak'], 4)
+        self.assertEqual(stats['total_study_days'], 7)
+        self.assertEqual(stats['last_study_date'], date(2026, 1, 2))
+        self.assertEqual(streak_stats(bitmaps, date(2026, 1, 4))['current_streak'], 0)
+
+    def test_current_streak_lapses_without_a_session_change(self):
+        """Test reads recompute current_streak after missed days, in the profile timezone"""
+        now = timezone.now()
+        self.complete_session_at(now - timedelta(days=1))
+        self.complete_session_at(now)
+        self.assertEqual(StudyStreak.objects.get(user=self.user).current_streak, 2)
+        url = reverse('study-streak-detail')
+        etag = self.client.get(url)['ETag']
+
+        cache.clear()
+        later = now + timedelta(days=3)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((response.data['current_streak'], response.data['longest_streak']), (0, 2))
+            self.assertEqual(self.client.get(reverse('dashboard-stats')).data['current_streak'], 0)
+            auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+            cache.clear()
+            self.assertEqual(self.client.get(reverse('async-study-streak-detail'), **auth).json()['current_streak'], 0)
+        self.assertEqual(StudyStreak.objects.get(user=self.user).current_streak, 2)
+
+    def test_days_follow_profile_timezone(self):
+        """Test a session is counted on the user's local day, and removed on delete"""
+        session = self.complete_session_at(datetime(2026, 1, 1, 12, tzinfo=dt_timezone.utc))
+        bitmap = StudyDayBitmap.objects.get(user=self.user, year=2026)
+        self.assertEqual(int.from_bytes(bytes(bitmap.days), 'little'), 1 << 1)
+        self.assertEqual(StudyStreak.objects.get(user=self.user).total_study_days, 1)
+
+        self.client.delete(reverse('focus-session-detail', args=[session.pk]))
+        bitmap.refresh_from_db()
+        self.assertEqual(int.from_bytes(bytes(bitmap.days), 'little'), 0)
+        self.assertEqual(StudyStreak.objects.get(user=self.user).total_study_days, 0)
+
+    def test_unrelated_edits_skip_the_refresh(self):
+        """Test saves that keep start time and completion leave study days alone, moves refresh both days"""
+        session = self.complete_session_at(datetime(2026, 1, 1, 12, tzinfo=dt_timezone.utc))
+        with mock.patch('api.signals.refresh_study_day') as refresh:
+            response = self.client.patch(
+                reverse('focus-session-detail', args=[session.pk]), {'notes': 'quiet'}, format='json'
+            )
+            self.assertEqual(response.status_code, 200)
+            session = FocusSession.objects.get(pk=session.pk)
+            session.notes = 'library'
+            session.save(update_fields=['notes', 'updated_at'])
+            refresh.assert_not_called()
+
+        session.start_time = datetime(2026, 1, 3, 12, tzinfo=dt_timezone.utc)
+        session.save()
+        bits = int.from_bytes(bytes(StudyDayBitmap.objects.get(user=self.user, year=2026).days), 'little')
+        self.assertEqual(bits, 1 << 3)
+
+    def test_heatmap_endpoint(self):
+        """Test the heatmap returns the year as a base64 bitset"""
+        self.complete_session_at(datetime(2024, 3, 1, 0, tzinfo=dt_timezone.utc))
+        response = self.client.get(reverse('study-heatmap'), {'year': 2024})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['days'], response.data['total_study_days']), (366, 1))
+        bits = int.from_bytes(base64.b64decode(response.data['bitmap']), 'little')
+        self.assertEqual(bits, 1 << 60)
+        self.assertEqual(self.client.get(reverse('study-heatmap'), {'year': 'soon'}).status_code, 400)
+
+    def test_rebuild_command(self):
+        """Test the command rebuilds bitmaps and streaks from session history"""
+        self.complete_session_at(datetime(2025, 6, 1, 8, tzinfo=dt_timezone.utc))
+        self.complete_session_at(datetime(2025, 6, 2, 8, tzinfo=dt_timezone.utc))
+        idle = User.objects.create_user(username='idle', password='testpass123')
+        StudyStreak.objects.create(user=idle, current_streak=3, total_study_days=9)
+        StudyDayBitmap.objects.filter(user=self.user).delete()
+        StudyStreak.objects.filter(user=self.user).update(longest_streak=0, total_study_days=0)
+
+        out = StringIO()
+        call_command('rebuild_study_bitmaps', stdout=out)
+        self.assertIn('1 users', out.getvalue())
+        bits = int.from_bytes(bytes(StudyDayBitmap.objects.get(user=self.user, year=2025).days), 'little')
+        self.assertEqual(bits, 0b11 << 151)
+        streak = StudyStreak.objects.get(user=self.user)
+        self.assertEqual((streak.longest_streak, streak.total_study_days), (2, 2))
+        self.assertEqual(StudyStreak.objects.get(user=idle).total_study_days, 0)
+
+
+class ConcurrentCompletionTest(TransactionTestCase):
+    def setUp(self):
+        """Set up a user with several open sessions on the same day"""
+        cache.clear()
+        self.user = User.objects.create_user(username='racer', password='testpass123')
+        self.sessions = [FocusSession.objects.create(user=self.user, duration_minutes=10) for _ in range(4)]
+
+    def complete_from_threads(self, session_ids):
+        errors = []
+        barrier = threading.Barrier(len(session_ids))
+
+        def worker(session_id):
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            try:
+                barrier.wait()
+                response = client.post(reverse('focus-session-complete', args=[session_id]))
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(session_id,)) for session_id in session_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_parallel_and_retried_completions_keep_counters_exact(self):
+        """Test completing sessions from many threads, with retries, counts each once"""
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Threads cannot write concurrently to a shared in-memory SQLite database')
+        # Every session completed by three devices/retries at the same time
+        ids = [session.pk for session in self.sessions] * 3
+        self.assertEqual(self.complete_from_threads(ids), [])
+
+        self.assertEqual(FocusSession.objects.filter(user=self.user, completed=True).count(), 4)
+        streaks = StudyStreak.objects.filter(user=self.user)
+        self.assertEqual(streaks.count(), 1)
+        self.assertEqual((streaks[0].current_streak, streaks[0].total_study_days), (1, 1))
+        rollup = DailyFocusRollup.objects.get(user=self.user)
+        self.assertEqual((rollup.session_count, rollup.focus_minutes), (4, 40))
+
+    def test_completing_twice_is_a_no_op(self):
+        """Test a retried completion does not touch the session again"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        url = reverse('focus-session-complete', args=[self.sessions[0].pk])
+        self.assertEqual(client.post(url).data['message'], 'Session completed successfully')
+        end_time = FocusSession.objects.get(pk=self.sessions[0].pk).end_time
+        self.assertEqual(client.post(url).data['message'], 'Session already completed')
+        self.assertEqual(FocusSession.objects.get(pk=self.sessions[0].pk).end_time, end_time)
+        self.assertEqual(client.post(reverse('focus-session-complete', args=[999999])).status_code, 404)
+
+
+class AsyncReadViewsTest(TestCase):
+    def setUp(self):
+        """Set up a user with a JWT, some nudges and quotes"""
+        cache.clear()
+        self.user = User.objects.create_user(username='asyncuser', password='testpass123')
+        self.auth = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        for i in range(25):
+            MotivationalNudge.objects.create(user=self.user, nudge_type='tip', title=f'Tip {i}', content='Breathe')
+        MotivationalQuote.objects.create(text='Stay on task.', category='focus')
+
+    async def test_jwt_is_required(self):
+        """Test missing and invalid tokens are rejected like the DRF views"""
+        response = await self.async_client.get(reverse('async-dashboard-stats'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+        response = await self.async_client.get(
+            reverse('async-dashboard-stats'), headers={'Authorization': 'Bearer not-a-token'}
+        )
+        self.assertEqual((response.status_code, response.json()['code']), (401, 'token_not_valid'))
+
+    async def test_dashboard_and_streak_match_sync_views(self):
+        """Test the async payloads equal the sync ones and share their cache"""
+        async_dashboard = await self.async_client.get(reverse('async-dashboard-stats'), headers=self.auth)
+        self.assertEqual(async_dashboard['X-Cache'], 'MISS')
+        sync_dashboard = await self.async_client.get(reverse('dashboard-stats'), headers=self.auth)
+        self.assertEqual(sync_dashboard['X-Cache'], 'HIT')
+        self.assertEqual(async_dashboard.json(), sync_dashboard.json())
+
+        sync_streak = await self.async_client.get(reverse('study-streak-detail'), headers=self.auth)
+        async_streak = await self.async_client.get(reverse('async-study-streak-detail'), headers=self.auth)
+        self.assertEqual(async_streak.json(), sync_streak.json())
+
+    async def test_nudges_and_quotes(self):
+        """Test keyset pages and the quote endpoints"""
+        first = (await self.async_client.get(reverse('async-motivational-nudge-list'), headers=self.auth)).json()
+        self.assertEqual(len(first['results']), 20)
+        self.assertIsNone(first['previous'])
+        second = (await self.async_client.get(first['next'], headers=self.auth)).json()
+        self.assertEqual(len(second['results']), 5)
+        sync_first = (await self.async_client.get(reverse('motivational-nudge-list'), headers=self.auth)).json()
+        self.assertEqual(first['results'], sync_first['results'])
+
+        quotes = (await self.async_client.get(reverse('async-quote-list'), headers=self.auth)).json()
+        self.assertEqual([q['text'] for q in quotes['results']], ['Stay on task.'])
+        random_quote = await self.async_client.get(reverse('async-quote-random'), headers=self.auth)
+        self.assertEqual(random_quote.json()['text'], 'Stay on task.')
+
+    def test_benchmark_command(self):
+        """Test the benchmark reports both modes for every endpoint"""
+        out = StringIO()
+        call_command('benchmark_async_views', user_id=self.user.pk, requests=4, concurrency=2, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 9)
+        self.assertTrue(all(line.split()[-1] == '0' for line in lines[1:]))
+
+
+class EventStreamTest(TestCase):
+    def setUp(self):
+        """Set up a user, an open session and an access token"""
+        cache.clear()
+        self.user = User.objects.create_user(username='streamer', password='testpass123')
+        self.session = FocusSession.objects.create(user=self.user, duration_minutes=25)
+        self.token = str(AccessToken.for_user(self.user))
+
+    async def open_stream(self):
+        response = await self.async_client.get(reverse('event-stream'), {'token': self.token})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return response.streaming_content
+
+    async def next_event(self, chunks):
+        chunk = (await asyncio.wait_for(anext(chunks), timeout=5)).decode()
+        if chunk.startswith(':'):
+            return 'comment', None
+        event, data = chunk.strip().split('\n')
+        return event.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+    def run_committed(self, action):
+        with self.captureOnCommitCallbacks(execute=True):
+            action()
+
+    def test_refused_under_wsgi(self):
+        """Test the stream answers 501 instead of buffering forever under WSGI"""
+        response = self.client.get(reverse('event-stream'), {'token': self.token})
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.streaming)
+
+    async def test_initial_payloads_then_live_updates(self):
+        """Test the stream sends baselines, then nudges and dashboard deltas as they happen"""
+        chunks = await self.open_stream()
+        try:
+            self.assertEqual((await anext(chunks)).decode(), 'retry: 5000\n\n')
+            event, dashboard = await self.next_event(chunks)
+            self.assertEqual((event, dashboard['today_minutes']), ('dashboard', 0))
+            self.assertEqual((await self.next_event(chunks))[0], 'streak')
+            self.assertEqual(get_broker().subscriber_count(self.user.pk), 1)
+
+            await sync_to_async(self.run_committed)(lambda: MotivationalNudge.objects.create(
+                user=self.user, nudge_type='tip', title='Hydrate', content='Drink water'
+            ))
+            event, nudge = await self.next_event(chunks)
+            self.assertEqual((event, nudge['title']), ('nudge', 'Hydrate'))
+
+            client = APIClient()
+            client.force_authenticate(user=self.user)
+            await sync_to_async(self.run_committed)(
+                lambda: client.post(reverse('focus-session-complete', args=[self.session.pk]))
+            )
+            received = dict([await self.next_event(chunks), await self.next_event(chunks)])
+            self.assertEqual(received['dashboard']['today_minutes'], 25)
+            self.assertNotIn('total_goals', received['dashboard'])
+            self.assertEqual(received['streak']['current_streak'], 1)
+        finally:
+            await chunks.aclose()
+
+    async def test_heartbeat_and_auth(self):
+        """Test idle streams get keep-alive comments and a token is required"""
+        with self.settings(SSE_HEARTBEAT_SECONDS=0.01):
+            chunks = await self.open_stream()
+            try:
+                for _ in range(3):
+                    await anext(chunks)
+                self.assertEqual(await self.next_event(chunks), ('comment', None))
+            finally:
+                await chunks.aclose()
+        response = await self.async_client.get(reverse('event-stream'), {'token': 'bogus'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_in_process_broker(self):
+        """Test messages published from another thread reach a subscriber, which then unsubscribes"""
+        broker = InProcessBroker()
+        subscription = broker.subscribe(7)
+        received = asyncio.ensure_future(anext(subscription))
+        await asyncio.sleep(0)
+        self.assertEqual(broker.subscriber_count(7), 1)
+        await sync_to_async(broker.publish, thread_sensitive=False)(7, {'event': 'nudge', 'data': 1})
+        self.assertEqual(await asyncio.wait_for(received, timeout=5), {'event': 'nudge', 'data': 1})
+        await subscription.aclose()
+        self.assertEqual(broker.subscriber_count(7), 0)
+
+
+class AvatarVariantsTest(TestCase):
+    def setUp(self):
+        """Set up a throwaway media root and run avatar tasks inline"""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        override = self.settings(MEDIA_ROOT=media_root, AVATAR_VARIANT_SIZES=[32, 128], AVATAR_DEFAULT_SIZE=128)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.media_root = media_root
+        patcher = mock.patch('api.tasks.process_avatar.delay', side_effect=process_avatar)
+        self.delay = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='avataruser', password='testpass123')
+        self.profile = UserProfile.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def image_bytes(self, color='red', size=(400, 300), fmt='JPEG'):
+        exif = Image.Exif()
+        exif[0x010F] = 'SecretCam'  # Make
+        exif[0x0112] = 6  # Orientation: rotated 90 degrees
+        buffer = io.BytesIO()
+        Image.new('RGB', size, color).save(buffer, fmt, exif=exif)
+        return buffer.getvalue()
+
+    def upload(self, data, client=None, content_type='image/jpeg'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return (client or self.client).post(
+                reverse('profile-avatar-upload'),
+                {'avatar': SimpleUploadedFile('me.jpg', data, content_type=content_type)},
+                format='multipart',
+            )
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_upload_renders_stripped_square_variants(self):
+        """Test an upload is rendered into fixed-size WebP/JPEG variants without metadata"""
+        response = self.upload(self.image_bytes())
+        self.assertEqual(response.status_code, 200)
+        self.profile.refresh_from_db()
+        self.assertEqual(len(self.profile.avatar_hash), 64)
+        self.assertEqual(set(self.profile.avatar_variants), {'32', '128'})
+        self.assertTrue(self.profile.avatar.name.startswith(CONTENT_ROOT))
+
+        for size, names in self.profile.avatar_variants.items():
+            for fmt, name in names.items():
+                self.assertIn(self.profile.avatar_hash, name)
+                with Image.open(os.path.join(self.media_root, name)) as image:
+                    self.assertEqual(image.format, 'WEBP' if fmt == 'webp' else 'JPEG')
+                    self.assertEqual(image.size, (int(size), int(size)))
+                    self.assertEqual(dict(image.getexif()), {})
+                    self.assertNotIn('icc_profile', image.info)
+
+        # The original is served too, so it is stored re-encoded: rotated upright, no EXIF
+        with Image.open(self.profile.avatar.path) as image:
+            self.assertEqual(image.size, (300, 400))
+            self.assertEqual(dict(image.getexif()), {})
+
+        # The response goes out before the variants exist, so it still names the original
+        self.assertTrue(response.data['avatar_url'].endswith('/original.jpg'))
+        self.assertEqual(response.data['avatar_variants'], {})
+        data = self.client.get(reverse('profile-detail')).data
+        self.assertTrue(data['avatar'].endswith('/128.jpg'))
+        self.assertTrue(data['avatar_variants']['32']['webp'].startswith('http://testserver/media/'))
+        self.assertNotIn('avatar_hash', data)
+
+    def test_identical_uploads_share_files(self):
+        """Test the same bytes uploaded by two users are stored and rendered once"""
+        data = self.image_bytes()
+        self.upload(data)
+        files = self.stored_files()
+        other = User.objects.create_user(username='avatartwin', password='testpass123')
+        other_profile = UserProfile.objects.create(user=other)
+        other_client = APIClient()
+        other_client.force_authenticate(user=other)
+        self.assertEqual(self.upload(data, client=other_client).status_code, 200)
+
+        other_profile.refresh_from_db()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.stored_files(), files)
+        self.assertEqual(other_profile.avatar_variants, self.profile.avatar_variants)
+
+    def test_replaced_avatar_is_released_once_unused(self):
+        """Test replacing an avatar deletes its files only when no other profile uses them"""
+        first, second = self.image_bytes('red'), self.image_bytes('blue')
+        other = User.objects.create_user(username='avatarpeer', password='testpass123')
+        UserProfile.objects.create(user=other)
+        other_client = APIClient()
+        other_client.force_authenticate(user=other)
+        self.upload(first)
+        self.upload(first, client=other_client)
+        first_dir = os.path.dirname(UserProfile.objects.get(pk=self.profile.pk).avatar.path)
+
+        self.upload(second)
+        self.assertTrue(os.path.isdir(first_dir) and os.listdir(first_dir))
+        self.upload(second, client=other_client)
+        self.assertFalse(os.path.exists(first_dir) and os.listdir(first_dir))
+
+    def test_invalid_image_is_rejected(self):
+        """Test bytes that do not decode as an image are refused before storage"""
+        response = self.upload(b'not an image at all')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stored_files(), [])
+        self.delay.assert_not_called()
+
+    def test_stale_task_does_not_overwrite_newer_upload(self):
+        """Test a task for a superseded upload leaves the profile alone"""
+        self.upload(self.image_bytes('red'))
+        old_hash = UserProfile.objects.get(pk=self.profile.pk).avatar_hash
+        self.upload(self.image_bytes('green'))
+        variants = UserProfile.objects.get(pk=self.profile.pk).avatar_variants
+        self.assertEqual(process_avatar(self.profile.pk, old_hash), 'superseded')
+        self.assertEqual(UserProfile.objects.get(pk=self.profile.pk).avatar_variants, variants)
+
+    def test_content_addressed_media_is_immutable(self):
+        """Test the development media view marks hashed avatar files as immutable"""
+        self.upload(self.image_bytes())
+        name = UserProfile.objects.get(pk=self.profile.pk).avatar_variants['32']['webp']
+        response = immutable_media(RequestFactory().get('/media/' + name), name)
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+
+    def test_backfill_moves_legacy_avatar(self):
+        """Test process_avatars re-homes an upload from before content addressing"""
+        os.makedirs(os.path.join(self.media_root, 'avatars'))
+        with open(os.path.join(self.media_root, 'avatars', 'legacy.jpg'), 'wb') as legacy:
+            legacy.write(self.image_bytes())
+        UserProfile.objects.filter(pk=self.profile.pk).update(avatar='avatars/legacy.jpg')
+
+        call_command('process_avatars', stdout=StringIO())
+        self.profile.refresh_from_db()
+        self.assertTrue(self.profile.avatar.name.startswith(CONTENT_ROOT))
+        self.assertEqual(set(self.profile.avatar_variants), {'32', '128'})
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'avatars', 'legacy.jpg')))
+
+
+class CachedAuthenticationTest(TestCase):
+    def setUp(self):
+        """Set up a user authenticating with a real access token"""
+        cache.clear()
+        local_users.clear()
+        self.user = User.objects.create_user(username='authcacheuser', password='testpass123')
+        UserProfile.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def user_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return sum('FROM "auth_user"' in q['sql'] for q in ctx.captured_queries)
+
+    def test_repeat_requests_skip_the_user_query(self):
+        """Test only the first request loads the user from the database"""
+        url = reverse('study-streak-detail')
+        self.assertEqual(self.user_queries(url), 1)
+        self.assertEqual(self.user_queries(url), 0)
+        # Another process: nothing local, the shared cache still answers
+        local_users.clear()
+        self.assertEqual(self.user_queries(url), 0)
+
+    def test_deactivation_takes_effect_immediately(self):
+        """Test saving an inactive user drops the cached snapshot"""
+        self.client.get(reverse('study-streak-detail'))
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(self.client.get(reverse('study-streak-detail')).status_code, 401)
+
+    @skipUnless('CHECK_REVOKE_TOKEN' in JWT_DEFAULTS, 'token revocation needs simplejwt 5.3+')
+    def test_password_change_revokes_tokens(self):
+        """Test a password change rejects older tokens when revocation is on"""
+        # simplejwt rebinds its settings object on setting_changed, so patch the flag in place
+        with mock.patch('rest_framework_simplejwt.tokens.api_settings.CHECK_REVOKE_TOKEN', True, create=True), \
+                mock.patch('api.authentication.jwt_settings.CHECK_REVOKE_TOKEN', True, create=True):
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+            self.assertEqual(self.client.get(reverse('study-streak-detail')).status_code, 200)
+            self.user.set_password('newpass456')
+            self.user.save()
+            self.assertEqual(self.client.get(reverse('study-streak-detail')).status_code, 401)
+
+    def test_saving_cached_user_keeps_password(self):
+        """Test the snapshot user leaves the deferred password alone when saved"""
+        response = self.client.patch(reverse('profile-detail'), {'first_name': 'Ada'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Ada')
+        self.assertTrue(self.user.check_password('testpass123'))
+
+    def test_benchmark_command(self):
+        """Test the benchmark reports no user queries once the snapshot is cached"""
+        out = StringIO()
+        call_command('benchmark_auth_queries', user_id=self.user.pk, requests=2, stdout=out)
+        rows = [line.split() for line in out.getvalue().splitlines()[1:]]
+        self.assertTrue(rows)
+        for name, mode, queries, auth_queries, latency in rows:
+            self.assertEqual(float(auth_queries), 1.0 if mode == 'stock' else 0.0)
+
+    def test_local_lru_expires_and_evicts(self):
+        """Test the per-process LRU honours its TTL and size bound"""
+        lru = LocalLRU()
+        lru.set('a', 1, ttl=60, maxsize=2)
+        lru.set('b', 2, ttl=60, maxsize=2)
+        lru.get('a')
+        lru.set('c', 3, ttl=60, maxsize=2)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+        with mock.patch('api.authentication.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(lru.get('a'))
+
+
+class TokenBlacklistFilterTest(TestCase):
+    def setUp(self):
+        """Set up a user with one refresh token and a fresh filter"""
+        cache.clear()
+        blacklist_filter.reset()
+        self.user = User.objects.create_user(username='refreshuser', password='testpass123')
+        self.refresh = RefreshToken.for_user(self.user)
+
+    def post_refresh(self, token):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('token_refresh'), {'refresh': str(token)})
+        blacklist_queries = [q for q in ctx.captured_queries if 'token_blacklist_blacklistedtoken' in q['sql']]
+        return response, blacklist_queries
+
+    def test_clean_token_skips_blacklist_query(self):
+        """Test a refresh with a token the filter has not seen never queries the blacklist"""
+        blacklist_filter.rebuild()
+        response, queries = self.post_refresh(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json())
+        self.assertEqual(queries, [])
+
+    def test_blacklisted_token_is_rejected(self):
+        """Test a blacklisted token hits the filter and is confirmed in the database"""
+        blacklist_filter.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.refresh.blacklist()
+        response, queries = self.post_refresh(self.refresh)
+        self.assertEqual(response.status_code, 401)
+        # The generation bump rebuilds the filter, then the possible hit is confirmed
+        self.assertEqual(len(queries), 2)
+        response, queries = self.post_refresh(self.refresh)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(len(queries), 1)
+
+    def test_other_processes_rebuild_after_blacklist(self):
+        """Test a blacklist in one process invalidates filters built elsewhere"""
+        other = BlacklistFilter()
+        other.rebuild()
+        jti = self.refresh['jti']
+        self.assertFalse(other.might_contain(jti))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.refresh.blacklist()
+        self.assertTrue(other.might_contain(jti))
+
+    def test_bloom_filter_false_positive_rate(self):
+        """Test the filter never misses a member and stays near its error rate"""
+        bloom = BloomFilter(1000, 0.01)
+        members = [uuid.uuid4().hex for _ in range(1000)]
+        for member in members:
+            bloom.add(member)
+        self.assertTrue(all(member in bloom for member in members))
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives, 200)
+
+    def test_prune_deletes_only_expired_rows(self):
+        """Test the prune command removes expired tokens and their blacklist entries"""
+        self.refresh.blacklist()
+        expired = RefreshToken.for_user(self.user)
+        expired.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(seconds=1))
+        for _ in range(3):
+            token = RefreshToken.for_user(self.user)
+            OutstandingToken.objects.filter(jti=token['jti']).update(expires_at=timezone.now() - timedelta(days=1))
+
+        out = StringIO()
+        call_command('prune_expired_tokens', chunk_size=2, stdout=out)
+        self.assertIn('Deleted 4 expired', out.getvalue())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [self.refresh['jti']])
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+@skipUnless(TEST_REPLICA in connections.settings, 'needs SQLite to create the stand-in replica')
+class ReplicaRoutingTest(TestCase):
+    databases = {'default', TEST_REPLICA}
+
+    def setUp(self):
+        """Set up a JWT-authenticated user who exists only on the primary"""
+        cache.clear()
+        override = self.settings(DATABASE_REPLICA_ALIAS=TEST_REPLICA)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='replicauser', password='testpass123')
+        Goal.objects.create(user=self.user, title='Primary only')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def goal_titles(self):
+        response = self.client.get(reverse('goal-list-create'))
+        self.assertEqual(response.status_code, 200)
+        return [goal['title'] for goal in response.data['results']], response['Server-Timing']
+
+    def test_safe_reads_use_the_replica(self):
+        """Test list reads come from the (stale) replica and are tagged by alias"""
+        titles, timing = self.goal_titles()
+        self.assertEqual(titles, [])
+        self.assertIn(f'db-{TEST_REPLICA};', timing)
+
+    def test_reads_stick_to_primary_after_a_write(self):
+        """Test a user's reads go to the primary for the sticky window after they write"""
+        response = self.client.post(reverse('goal-list-create'), {'title': 'Fresh'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(cache.get(sticky_key(self.user.pk)))
+        titles, timing = self.goal_titles()
+        self.assertEqual(sorted(titles), ['Fresh', 'Primary only'])
+        self.assertNotIn(TEST_REPLICA, timing)
+
+        cache.delete(sticky_key(self.user.pk))  # The window has passed
+        self.assertEqual(self.goal_titles()[0], [])
+
+    async def test_async_reads_use_the_replica(self):
+        """Test the middleware runs natively under ASGI and still routes and tags async reads"""
+        response = await self.async_client.get(
+            reverse('async-motivational-nudge-list'), headers={'Authorization': self.client._credentials['HTTP_AUTHORIZATION']},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'db-{TEST_REPLICA};', response['Server-Timing'])
+        self.assertTrue(iscoroutinefunction(ReplicaRoutingMiddleware(self.async_client.handler.get_response_async)))
+
+    async def test_async_reads_stick_to_primary_after_a_write(self):
+        """Test async endpoints honour the read-your-writes window of the JWT user"""
+        await MotivationalNudge.objects.acreate(user=self.user, nudge_type='tip', title='Fresh', content='Hi')
+        await cache.aset(sticky_key(self.user.pk), True)
+        response = await self.async_client.get(
+            reverse('async-motivational-nudge-list'), headers={'Authorization': self.client._credentials['HTTP_AUTHORIZATION']},
+        )
+        self.assertEqual([nudge['title'] for nudge in json.loads(response.content)['results']], ['Fresh'])
+        self.assertNotIn(TEST_REPLICA, response['Server-Timing'])
+
+    def test_write_alias_pins_rest_of_request(self):
+        """Test a read that asks for the write alias moves the request to the primary"""
+        response = self.client.get(reverse('study-streak-detail'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(StudyStreak.objects.filter(user=self.user).exists())
+
+    def test_dashboard_reads_stay_on_the_replica(self):
+        """Test the dashboard reads an existing streak without pinning the request to the primary"""
+        User.objects.using(TEST_REPLICA).create(pk=self.user.pk, username=self.user.username)
+        StudyStreak.objects.using(TEST_REPLICA).create(user_id=self.user.pk)
+        StudyDayBitmap.objects.using(TEST_REPLICA).create(user_id=self.user.pk, year=2020, days=bits_to_bytes(0b1111))
+        self.goal_titles()  # Caches the JWT user snapshot, which is always read from the primary
+        for name in ('dashboard-stats', 'study-streak-detail'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.data['longest_streak'], 4)
+            self.assertIn(f'db-{TEST_REPLICA};', response['Server-Timing'])
+            self.assertNotIn('db-default', response['Server-Timing'])
+
+    def test_outside_requests_read_primary(self):
+        """Test code running outside a request (tasks, commands) never reads the replica"""
+        self.assertEqual(ReplicaRouter().db_for_read(Goal), 'default')
+        self.assertEqual(list(Goal.objects.values_list('title', flat=True)), ['Primary only'])
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        """Set up an authenticated client and empty metrics"""
+        cache.clear()
+        metrics.registry.clear()
+        self.user = User.objects.create_user(username='metricsuser', password='testpass123')
+        Goal.objects.create(user=self.user, title='Measured')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def scrape(self, **extra):
+        extra.setdefault('HTTP_AUTHORIZATION', 'Bearer scraper')
+        with self.settings(METRICS_TOKEN='scraper'):
+            response = self.client.get(reverse('metrics'), **extra)
+        return response, response.content.decode() if response.status_code == 200 else ''
+
+    def test_request_metrics_by_url_name(self):
+        """Test latency, DB, serializer and size metrics are labelled with the URL name"""
+        self.client.get(reverse('goal-list-create'))
+        self.client.get(reverse('goal-list-create'))
+        response, body = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        labels = 'method="GET",status="200",view="goal-list-create"'
+        self.assertIn(f'refocus_http_request_duration_seconds_count{{{labels}}} 2', body)
+        self.assertIn(f'refocus_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2', body)
+        self.assertIn('refocus_http_db_queries_total{alias="default",view="goal-list-create"}', body)
+        self.assertIn('refocus_http_serializer_seconds_total{view="goal-list-create"}', body)
+        self.assertIn('refocus_http_response_bytes_count{view="goal-list-create"} 2', body)
+
+    async def test_async_requests_are_recorded(self):
+        """Test ASGI requests are measured by the async path of the middleware"""
+        self.assertTrue(iscoroutinefunction(metrics.MetricsMiddleware(self.async_client.handler.get_response_async)))
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        response = await self.async_client.get(
+            reverse('async-motivational-nudge-list'), headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        body = (await sync_to_async(self.scrape)())[1]
+        self.assertIn(
+            'refocus_http_request_duration_seconds_count'
+            '{method="GET",status="200",view="async-motivational-nudge-list"} 1', body,
+        )
+        self.assertIn('refocus_http_db_queries_total{alias="default",view="async-motivational-nudge-list"}', body)
+
+    def test_scrape_access(self):
+        """Test the endpoint needs the token, or an address that was allowed explicitly"""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, 403)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer wrong')[0].status_code, 403)
+        self.assertEqual(self.scrape(REMOTE_ADDR='10.1.2.3')[0].status_code, 200)
+        with self.settings(METRICS_ALLOWED_IPS=['10.1.2.3']):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='10.1.2.3').status_code, 200)
+
+    def test_celery_task_metrics(self):
+        """Test task runs record their duration and the counts they return"""
+        # Sent the way a worker sends them around each task run
+        task = prune_expired_tokens_task
+        task_prerun.send(sender=task, task_id='t1', task=task, args=(), kwargs={})
+        task_postrun.send(sender=task, task_id='t1', task=task, args=(), kwargs={},
+                          retval={'sent': 3, 'failed': 1}, state='SUCCESS')
+        body = self.scrape()[1]
+        self.assertIn(
+            'refocus_celery_task_duration_seconds_count{state="SUCCESS",task="api.tasks.prune_expired_tokens_task"} 1',
+            body,
+        )
+        self.assertIn('refocus_celery_task_items_total{outcome="sent",task="api.tasks.prune_expired_tokens_task"} 3.0', body)
+        self.assertIn('refocus_celery_task_items_total{outcome="failed",task="api.tasks.prune_expired_tokens_task"} 1.0', body)
+
+    def test_snapshots_of_other_processes_are_summed(self):
+        """Test a scrape adds up the snapshots other processes published"""
+        metrics.registry.inc('celery_task_items_total', {'task': 'api.tasks.fake', 'outcome': 'sent'}, 2)
+        other = metrics.registry.snapshot()
+        cache.set(metrics.SNAPSHOT_KEY_PREFIX + 'worker-2', other)
+        cache.set(metrics.PROCESS_INDEX_KEY, {'worker-2': time.time()})
+        self.assertIn('refocus_celery_task_items_total{outcome="sent",task="api.tasks.fake"} 4.0', self.scrape()[1])
+
+
+class EndpointBenchmarkTest(TestCase):
+    def test_every_route_is_measured_or_skipped(self):
+        """Test each URL name in api.urls has a benchmark route or a reason to skip it"""
+        self.assertEqual(benchmarks.unmeasured_url_names(), [])
+
+    def test_measure_seeded_history(self):
+        """Test every route answers as expected on a small seeded history"""
+        with benchmarks.offline_services():
+            fixture = benchmarks.seed(users=2, days=5, quotes=20)
+            self.assertTrue(fixture.user.is_staff)
+            self.assertTrue(DailyFocusRollup.objects.filter(user=fixture.user).exists())
+            results = benchmarks.measure(fixture, iterations=2, priority_factor=1)
+        self.assertEqual(set(results), {benchmarks.route_key(route) for route in benchmarks.ROUTES})
+        dashboard = results['dashboard-stats']
+        # The cold request builds and caches the payload; warm ones only authenticate from cache
+        self.assertGreater(dashboard['cold_queries'], dashboard['queries'])
+        self.assertEqual(results['goal-list-create:post']['method'], 'POST')
+
+    def test_compare_flags_regressions(self):
+        """Test query growth and large slowdowns fail while small jitter does not"""
+        baseline = {
+            'a': {'queries': 2, 'cold_queries': 4, 'p50_ms': 10.0, 'p95_ms': 12.0},
+            'b': {'queries': 1, 'cold_queries': 3, 'p50_ms': 1.0, 'p95_ms': 1.5},
+        }
+        results = {
+            'a': {'queries': 3, 'cold_queries': 4, 'p50_ms': 20.0, 'p95_ms': 22.0},
+            'b': {'queries': 1, 'cold_queries': 3, 'p50_ms': 2.5, 'p95_ms': 4.0},
+            'new': {'queries': 9, 'cold_queries': 9, 'p50_ms': 50.0, 'p95_ms': 60.0},
+        }
+        self.assertEqual(benchmarks.compare(results, baseline), [
+            'a: queries 2 -> 3', 'a: p50_ms 10.00 -> 20.00',
+        ])
+        self.assertEqual(benchmarks.compare(results, baseline, query_slack=1), ['a: p50_ms 10.00 -> 20.00'])
@@ -0,0 +1,148 @@
+"""
+In-memory pre-check for the refresh-token blacklist.
+
+simplejwt looks every refresh token up in BlacklistedToken before accepting
+it. ``FilteredRefreshToken`` asks a per-process Bloom filter of the
+blacklisted, not yet expired jtis first, and queries the table only when the
+filter reports a possible hit (at most TOKEN_BLACKLIST_FILTER_ERROR_RATE of
+clean tokens).
+
+Each process builds its filter on first use. A blacklisted token is added
+to the local filter right away and bumps a generation key in the shared
+cache, which makes every other process rebuild before its next check. A
+filter is also rebuilt after TOKEN_BLACKLIST_FILTER_MAX_AGE seconds. With
+the default per-process (locmem) cache the generation bump never reaches
+the other processes, so that age alone bounds how long they accept a newly
+blacklisted token; it defaults to 10 seconds then, and to 300 with Redis.
+"""
+import hashlib
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+GENERATION_KEY = 'refocus:token-blacklist:generation'
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for ``capacity`` items at ``error_rate`` false positives."""
+
+    def __init__(self, capacity, error_rate):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] >> (position & 7) & 1 for position in self._positions(item))
+
+
+class BlacklistFilter:
+    """The per-process filter of blacklisted jtis (see the module docstring)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._generation = None
+        self._built_at = 0.0
+
+    def current_generation(self):
+        generation = cache.get(GENERATION_KEY)
+        if generation is None:
+            # Evicted or never set: start a new one, which every process will see as a change
+            cache.add(GENERATION_KEY, uuid.uuid4().hex, None)
+            generation = cache.get(GENERATION_KEY)
+        return generation
+
+    def rebuild(self, generation=None):
+        # Read the generation before the table, so a blacklist committed meanwhile triggers another rebuild
+        generation = generation or self.current_generation()
+        jtis = list(
+            BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+            .values_list('token__jti', flat=True)
+        )
+        bloom = BloomFilter(
+            max(settings.TOKEN_BLACKLIST_FILTER_CAPACITY, len(jtis) * 2),
+            settings.TOKEN_BLACKLIST_FILTER_ERROR_RATE,
+        )
+        for jti in jtis:
+            bloom.add(jti)
+        with self._lock:
+            self._bloom, self._generation, self._built_at = bloom, generation, time.monotonic()
+        return bloom
+
+    def might_contain(self, jti):
+        generation = self.current_generation()
+        with self._lock:
+            bloom = self._bloom
+            stale = (
+                bloom is None
+                or generation != self._generation
+                or time.monotonic() - self._built_at > settings.TOKEN_BLACKLIST_FILTER_MAX_AGE
+                or bloom.count > bloom.capacity
+            )
+        if stale:
+            bloom = self.rebuild(generation)
+        return jti in bloom
+
+    def add(self, jti):
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+        # Tell the other processes once the row is visible to their rebuild
+        transaction.on_commit(lambda: cache.set(GENERATION_KEY, uuid.uuid4().hex, None))
+
+    def reset(self):
+        with self._lock:
+            self._bloom, self._generation = None, None
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class FilteredRefreshToken(RefreshToken):
+    """RefreshToken that only queries the blacklist when the Bloom filter may contain it."""
+
+    def check_blacklist(self):
+        if blacklist_filter.might_contain(self.payload[jwt_settings.JTI_CLAIM]):
+            super().check_blacklist()
+
+
+def prune_expired_tokens(chunk_size=None):
+    """
+    Delete expired OutstandingToken rows (and their BlacklistedToken rows by
+    cascade) in chunks, so no single statement holds locks on a large table
+    for long. Expired tokens fail verification anyway. Returns the number
+    of outstanding tokens deleted.
+    """
+    chunk_size = chunk_size or settings.TOKEN_PRUNE_CHUNK_SIZE
+    expired = OutstandingToken.objects.filter(expires_at__lte=timezone.now())
+    deleted = 0
+    while True:
+        ids = list(expired.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            deleted += OutstandingToken.objects.filter(pk__in=ids).delete()[1].get(OutstandingToken._meta.label, 0)
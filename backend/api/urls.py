@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, metrics, views
 
 urlpatterns = [
     # User management
@@ -13,15 +13,18 @@ urlpatterns = [
     
     # Focus Sessions
     path('focus-sessions/', views.FocusSessionListCreate.as_view(), name='focus-session-list-create'),
+    path('focus-sessions/bulk/', views.FocusSessionBulkCreate.as_view(), name='focus-session-bulk-create'),
     path('focus-sessions/<int:pk>/', views.FocusSessionDetail.as_view(), name='focus-session-detail'),
     path('focus-sessions/<int:pk>/complete/', views.FocusSessionComplete.as_view(), name='focus-session-complete'),
     
     # Distraction Logs
     path('distractions/', views.DistractionLogListCreate.as_view(), name='distraction-list-create'),
+    path('distractions/bulk/', views.DistractionLogBulkCreate.as_view(), name='distraction-bulk-create'),
     path('distractions/<int:pk>/', views.DistractionLogDetail.as_view(), name='distraction-detail'),
     
     # Emotional Check-ins
     path('emotional-checkins/', views.EmotionalCheckInListCreate.as_view(), name='emotional-checkin-list-create'),
+    path('emotional-checkins/bulk/', views.EmotionalCheckInBulkCreate.as_view(), name='emotional-checkin-bulk-create'),
     path('emotional-checkins/<int:pk>/', views.EmotionalCheckInDetail.as_view(), name='emotional-checkin-detail'),
     
     # Motivational Nudges
@@ -30,9 +33,17 @@ urlpatterns = [
     
     # Study Streaks
     path('study-streak/', views.StudyStreakDetail.as_view(), name='study-streak-detail'),
+    path('study-streak/heatmap/', views.StudyHeatmap.as_view(), name='study-heatmap'),
     
     # Dashboard
     path('dashboard/stats/', views.DashboardStats.as_view(), name='dashboard-stats'),
+    path('cache/stats/', views.CacheStats.as_view(), name='cache-stats'),
+    
+    # Analytics
+    path('analytics/focus-timeseries/', views.FocusTimeSeries.as_view(), name='analytics-focus-timeseries'),
+    
+    # Delta sync
+    path('sync/', views.SyncFeed.as_view(), name='sync-feed'),
     
     # Motivation email automation
     path('motivation/start/', views.MotivationStart.as_view(), name='motivation-start'),
@@ -41,4 +52,17 @@ urlpatterns = [
     # Motivational Quotes
     path('quotes/', views.MotivationalQuoteList.as_view(), name='quote-list'),
     path('quotes/random/', views.RandomMotivationalQuote.as_view(), name='quote-random'),
+    
+    # Async read endpoints for ASGI deployments (same responses as above)
+    path('async/dashboard/stats/', async_views.AsyncDashboardStats.as_view(), name='async-dashboard-stats'),
+    path('async/study-streak/', async_views.AsyncStudyStreakDetail.as_view(), name='async-study-streak-detail'),
+    path('async/quotes/', async_views.AsyncMotivationalQuoteList.as_view(), name='async-quote-list'),
+    path('async/quotes/random/', async_views.AsyncRandomMotivationalQuote.as_view(), name='async-quote-random'),
+    path('async/motivational-nudges/', async_views.AsyncMotivationalNudgeList.as_view(), name='async-motivational-nudge-list'),
+    
+    # Live updates (server-sent events)
+    path('stream/', async_views.EventStream.as_view(), name='event-stream'),
+    
+    # Prometheus scrape endpoint (internal)
+    path('_metrics', metrics.metrics_view, name='metrics'),
 ]
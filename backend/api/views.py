@@ -4,27 +4,53 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
-from datetime import date, timedelta
+from django.utils.dateparse import parse_date
+import base64
+import calendar
+from datetime import timedelta
 from .models import (
     UserProfile, Goal, FocusSession, DistractionLog, 
     EmotionalCheckIn, MotivationalNudge, StudyStreak, MotivationSubscription,
-    MotivationalQuote
+    MotivationalQuote, DailyFocusRollup
 )
 from .serializers import (
     UserSerializer, UserCreateSerializer, UserProfileSerializer, GoalSerializer, FocusSessionSerializer,
     DistractionLogSerializer, EmotionalCheckInSerializer, MotivationalNudgeSerializer,
     StudyStreakSerializer, GoalDetailSerializer, UserDetailSerializer, MotivationSubscriptionSerializer,
-    MotivationalQuoteSerializer
+    MotivationalQuoteSerializer, FocusSessionBulkSerializer, DistractionLogBulkSerializer,
+    EmotionalCheckInBulkSerializer
 )
+from . import cache as payload_cache
+from .conditional import ConditionalGetMixin
+from .pagination import KeysetPagination
+from .quote_pool import quote_pool
+from .rollups import refresh_daily_rollup, rollup_day
+from .streaks import (
+    bits_from_bytes, get_current_study_streak, get_user_timezone, load_timezone, local_day_bounds, local_today,
+    profile_timezone, update_study_streak, year_bitmap,
+)
+from .sync import InvalidSyncToken, build_feed, decode_token, tombstone_cutoff
+from .tasks import MIN_INTERVAL_MINUTES, enqueue_avatar_processing, enqueue_delivery
+from .avatars import InvalidAvatar, release as release_avatar, store_original
+from .analytics import BUCKET_FUNCTIONS, MAX_BUCKETS, MAX_DATE, MIN_DATE, bucket_count, focus_timeseries
 
 # User Profile Views
-class UserProfileDetail(generics.RetrieveUpdateAPIView):
+class UserProfileDetail(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    single_object = True
+    
     def get_object(self):
-        return get_object_or_404(UserProfile, user=self.request.user)
+        queryset = self.get_serializer_class().setup_eager_loading(UserProfile.objects.all(), self.request)
+        return get_object_or_404(queryset, user=self.request.user)
+    
+    def get_validator_queryset(self):
+        return UserProfile.objects.filter(user=self.request.user)
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -62,17 +88,31 @@ class UserProfileAvatarUpload(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Delete old avatar if exists
-            if profile.avatar:
-                profile.avatar.delete(save=False)
-            
-            # Save new avatar
-            profile.avatar = avatar_file
-            profile.save()
-            
+            try:
+                digest, name = store_original(avatar_file)
+            except InvalidAvatar as exc:
+                return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+            previous_hash = profile.avatar_hash
+            previous_name = profile.avatar.name if profile.avatar else None
+            if digest != previous_hash:
+                # Point at the content-addressed original; variants follow from process_avatar
+                profile.avatar = name
+                profile.avatar_hash = digest
+                profile.avatar_variants = {}
+                profile.save()
+                if previous_hash:
+                    transaction.on_commit(lambda: release_avatar(previous_hash))
+                elif previous_name:
+                    # Uploads from before content addressing belong to this profile alone
+                    profile.avatar.storage.delete(previous_name)
+                transaction.on_commit(lambda: enqueue_avatar_processing(profile.pk, digest))
+
+            data = UserProfileSerializer(profile, context={'request': request}).data
             return Response({
                 'detail': 'Avatar uploaded successfully',
-                'avatar_url': request.build_absolute_uri(profile.avatar.url) if profile.avatar else None
+                'avatar_url': data['avatar'],
+                'avatar_variants': data['avatar_variants'],
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -82,175 +122,424 @@ class UserProfileAvatarUpload(APIView):
             )
 
 # Goal Views
-class GoalListCreate(generics.ListCreateAPIView):
+class GoalListCreate(ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = GoalSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Goal.objects.filter(user=self.request.user).order_by('-created_at')
+        queryset = Goal.objects.filter(user=self.request.user).order_by('-created_at')
+        return self.get_serializer_class().setup_eager_loading(queryset, self.request)
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class GoalDetail(generics.RetrieveUpdateDestroyAPIView):
+class GoalDetail(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = GoalDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # The goal embeds its session ids, so their changes must change the validator too
+    validator_relations = ('focus_sessions',)
     
     def get_queryset(self):
-        return Goal.objects.filter(user=self.request.user)
+        queryset = Goal.objects.filter(user=self.request.user)
+        return self.get_serializer_class().setup_eager_loading(queryset, self.request)
 
 # Focus Session Views
-class FocusSessionListCreate(generics.ListCreateAPIView):
+class FocusSessionListCreate(ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = FocusSessionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering_field = 'start_time'
     
     def get_queryset(self):
-        return FocusSession.objects.filter(user=self.request.user).order_by('-start_time')
+        queryset = FocusSession.objects.filter(user=self.request.user).order_by('-start_time')
+        return self.get_serializer_class().setup_eager_loading(queryset, self.request)
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class FocusSessionDetail(generics.RetrieveUpdateDestroyAPIView):
+class FocusSessionDetail(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = FocusSessionSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return FocusSession.objects.filter(user=self.request.user)
+        queryset = FocusSession.objects.filter(user=self.request.user)
+        return self.get_serializer_class().setup_eager_loading(queryset, self.request)
 
 class FocusSessionComplete(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, pk):
-        session = get_object_or_404(FocusSession, pk=pk, user=request.user)
-        session.completed = True
-        session.end_time = timezone.now()
-        session.save()
-        
-        # Update study streak
-        self.update_study_streak(request.user)
+        # Conditional UPDATE: of concurrent or retried requests only one flips
+        # the flag and applies the side effects; the rest are no-ops.
+        now = timezone.now()
+        with transaction.atomic():
+            completed = FocusSession.objects.filter(pk=pk, user=request.user, completed=False).update(
+                completed=True, end_time=now, updated_at=now
+            )
+            session = get_object_or_404(FocusSession.objects.only('id', 'user_id', 'start_time'), pk=pk, user=request.user)
+            if not completed:
+                return Response({'message': 'Session already completed'})
+            
+            # update() skips the model signals, so apply their effects here
+            refresh_daily_rollup(request.user.pk, rollup_day(session.start_time))
+            update_study_streak(request.user, [session.start_time])
+        payload_cache.invalidate(request.user.pk, payload_cache.DASHBOARD)
         
         return Response({'message': 'Session completed successfully'})
+
+class BulkCreateView(APIView):
+    """
+    Create up to BULK_CREATE_MAX_ITEMS rows from a JSON array in one request.
+    
+    Every item is validated; the valid ones are inserted with a single
+    bulk_create inside one transaction and side effects (rollups, streak,
+    cached payloads) are applied once for the whole batch. The response lists
+    a result per item, in request order. An optional ``client_ref`` on each
+    item is echoed back so clients can match results without relying on ids,
+    which not every database returns from a bulk insert.
+    
+    Unlike the single-row endpoints, items may carry their own ``start_time``
+    or ``timestamp`` (bounded by BULK_CREATE_MAX_BACKDATE_DAYS and now), so
+    imported and offline sessions land in the day they happened, not the day
+    they were uploaded.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = None
     
-    def update_study_streak(self, user):
-        today = date.today()
-        streak, created = StudyStreak.objects.get_or_create(user=user)
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'detail': 'Expected a non-empty JSON array'}, status=400)
+        if len(items) > settings.BULK_CREATE_MAX_ITEMS:
+            return Response(
+                {'detail': f'At most {settings.BULK_CREATE_MAX_ITEMS} items per request'}, status=400
+            )
         
-        if not streak.last_study_date or streak.last_study_date < today:
-            if streak.last_study_date == today - timedelta(days=1):
-                streak.current_streak += 1
+        model = self.serializer_class.Meta.model
+        results, objs = [], []
+        for index, item in enumerate(items):
+            result = {'index': index}
+            if isinstance(item, dict) and 'client_ref' in item:
+                result['client_ref'] = item['client_ref']
+            if not isinstance(item, dict):
+                result.update(status='error', errors={'non_field_errors': ['Expected an object']})
             else:
-                streak.current_streak = 1
-            
-            streak.last_study_date = today
-            streak.total_study_days += 1
-            streak.longest_streak = max(streak.current_streak, streak.longest_streak)
-            streak.save()
+                serializer = self.serializer_class(data=item, context={'request': request})
+                if serializer.is_valid():
+                    objs.append((result, model(user=request.user, **serializer.validated_data)))
+                    result['status'] = 'created'
+                else:
+                    result.update(status='error', errors=serializer.errors)
+            results.append(result)
+        
+        if objs:
+            with transaction.atomic():
+                created = model.objects.bulk_create([obj for _, obj in objs])
+                self.after_bulk_create(request.user, created)
+            for (result, _), obj in zip(objs, created):
+                if obj.pk is not None:
+                    result['id'] = obj.pk
+        
+        return Response({
+            'created': len(objs),
+            'failed': len(results) - len(objs),
+            'results': results,
+        }, status=status.HTTP_201_CREATED if objs else status.HTTP_400_BAD_REQUEST)
+    
+    def after_bulk_create(self, user, objs):
+        pass
+    
+    def refresh_rollups(self, user, timestamps):
+        for day in {rollup_day(timestamp) for timestamp in timestamps}:
+            refresh_daily_rollup(user.pk, day)
+
+class FocusSessionBulkCreate(BulkCreateView):
+    serializer_class = FocusSessionBulkSerializer
+    
+    def after_bulk_create(self, user, objs):
+        completed = [obj for obj in objs if obj.completed]
+        if completed:
+            self.refresh_rollups(user, [obj.start_time for obj in completed])
+            update_study_streak(user, [obj.start_time for obj in completed])
+        payload_cache.invalidate(user.pk, payload_cache.DASHBOARD)
 
 # Distraction Log Views
-class DistractionLogListCreate(generics.ListCreateAPIView):
+class DistractionLogListCreate(ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = DistractionLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering_field = 'timestamp'
     
     def get_queryset(self):
-        return DistractionLog.objects.filter(user=self.request.user).order_by('-timestamp')
+        queryset = DistractionLog.objects.filter(user=self.request.user).order_by('-timestamp')
+        return self.get_serializer_class().setup_eager_loading(queryset, self.request)
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class DistractionLogDetail(generics.RetrieveUpdateDestroyAPIView):
+class DistractionLogDetail(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = DistractionLogSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return DistractionLog.objects.filter(user=self.request.user)
+        queryset = DistractionLog.objects.filter(user=self.request.user)
+        return self.get_serializer_class().setup_eager_loading(queryset, self.request)
+
+class DistractionLogBulkCreate(BulkCreateView):
+    serializer_class = DistractionLogBulkSerializer
+    
+    def after_bulk_create(self, user, objs):
+        self.refresh_rollups(user, [obj.timestamp for obj in objs])
 
 # Emotional Check-in Views
-class EmotionalCheckInListCreate(generics.ListCreateAPIView):
+class EmotionalCheckInListCreate(ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = EmotionalCheckInSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering_field = 'timestamp'
     
     def get_queryset(self):
-        return EmotionalCheckIn.objects.filter(user=self.request.user).order_by('-timestamp')
+        queryset = EmotionalCheckIn.objects.filter(user=self.request.user).order_by('-timestamp')
+        return self.get_serializer_class().setup_eager_loading(queryset, self.request)
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class EmotionalCheckInDetail(generics.RetrieveUpdateDestroyAPIView):
+class EmotionalCheckInDetail(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = EmotionalCheckInSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return EmotionalCheckIn.objects.filter(user=self.request.user)
+        queryset = EmotionalCheckIn.objects.filter(user=self.request.user)
+        return self.get_serializer_class().setup_eager_loading(queryset, self.request)
+
+class EmotionalCheckInBulkCreate(BulkCreateView):
+    serializer_class = EmotionalCheckInBulkSerializer
 
 # Motivational Nudge Views
-class MotivationalNudgeList(generics.ListAPIView):
+class MotivationalNudgeList(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = MotivationalNudgeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering_field = 'created_at'
     
     def get_queryset(self):
-        return MotivationalNudge.objects.filter(
+        queryset = MotivationalNudge.objects.filter(
             user=self.request.user,
             read=False
         ).order_by('-created_at')
+        return self.get_serializer_class().setup_eager_loading(queryset, self.request)
 
-class MotivationalNudgeDetail(generics.RetrieveUpdateAPIView):
+class MotivationalNudgeDetail(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = MotivationalNudgeSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return MotivationalNudge.objects.filter(user=self.request.user)
+        queryset = MotivationalNudge.objects.filter(user=self.request.user)
+        return self.get_serializer_class().setup_eager_loading(queryset, self.request)
 
 # Study Streak Views
-class StudyStreakDetail(generics.RetrieveAPIView):
+class StudyStreakDetail(ConditionalGetMixin, generics.RetrieveAPIView):
     serializer_class = StudyStreakSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    single_object = True
+    
+    def get_validator_queryset(self):
+        return StudyStreak.objects.filter(user=self.request.user)
+    
+    def get_validator(self):
+        if self.get_validator_relations() is None:
+            return None
+        row = self.get_validator_queryset().annotate(timezone=profile_timezone()).values_list(
+            'updated_at', 'timezone'
+        ).first()
+        if row is None:
+            return None
+        # current_streak lapses at the user's midnight without the row changing
+        updated_at, tz = row[0], load_timezone(row[1])
+        day_start, _ = local_day_bounds(local_today(tz), tz)
+        return f'{updated_at.isoformat()}:{day_start.date().isoformat()}', max(updated_at, day_start)
+    
     def get_object(self):
-        streak, created = StudyStreak.objects.get_or_create(user=self.request.user)
-        return streak
+        queryset = self.get_serializer_class().setup_eager_loading(StudyStreak.objects.all(), self.request)
+        return get_current_study_streak(self.request.user.pk, queryset)
+    
+    def retrieve(self, request, *args, **kwargs):
+        # Only the default representation is cached
+        if 'fields' in request.query_params or 'expand' in request.query_params:
+            return super().retrieve(request, *args, **kwargs)
+        data, hit = payload_cache.get_or_build(
+            request.user.pk, payload_cache.STREAK,
+            lambda: self.get_serializer(self.get_object()).data
+        )
+        return Response(data, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+
+class StudyHeatmap(APIView):
+    """
+    One year of study days as a bitset: ``bitmap`` is base64 of 46 bytes,
+    little-endian, where bit n is day n of the year (January 1 = 0) in the
+    user's profile timezone.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        tz = get_user_timezone(request.user.pk)
+        year = request.query_params.get('year') or timezone.now().astimezone(tz).year
+        try:
+            year = int(year)
+        except (TypeError, ValueError):
+            return Response({'detail': 'year must be an integer'}, status=400)
+        if not 1970 <= year <= 9999:
+            return Response({'detail': 'year is out of range'}, status=400)
+        
+        days = year_bitmap(request.user.pk, year)
+        return Response({
+            'year': year,
+            'timezone': str(tz),
+            'days': 366 if calendar.isleap(year) else 365,
+            'total_study_days': bits_from_bytes(days).bit_count(),
+            'bitmap': base64.b64encode(days).decode(),
+        })
 
 # Dashboard Views
 class DashboardStats(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        user = request.user
-        today = date.today()
-        
-        # Today's stats
-        today_sessions = FocusSession.objects.filter(
-            user=user,
-            start_time__date=today,
-            completed=True
+        data, hit = payload_cache.get_or_build(
+            request.user.pk, payload_cache.DASHBOARD,
+            lambda: self.build_stats(request.user)
         )
-        today_minutes = sum(session.duration_minutes for session in today_sessions)
-        
-        # Weekly stats
+        return Response(data, headers={'X-Cache': 'HIT' if hit else 'MISS'})
+    
+    def build_stats(self, user):
+        (focus, focus_totals), (goals, goal_totals) = self.stats_queries(user)
+        focus, goals = focus.aggregate(**focus_totals), goals.aggregate(**goal_totals)
+        # After the aggregates: creating a missing row pins the request to the primary
+        return self.stats_payload(focus, goals, get_current_study_streak(user.pk))
+    
+    @staticmethod
+    def stats_queries(user):
+        """The aggregates behind the stats, shared with the async view (api/async_views.py)."""
+        today = timezone.localdate()
         week_ago = today - timedelta(days=7)
-        weekly_sessions = FocusSession.objects.filter(
-            user=user,
-            start_time__date__gte=week_ago,
-            completed=True
-        )
-        weekly_minutes = sum(session.duration_minutes for session in weekly_sessions)
         
-        # Goals progress
-        total_goals = Goal.objects.filter(user=user).count()
-        completed_goals = Goal.objects.filter(user=user, completed=True).count()
-        
-        # Study streak
-        streak, created = StudyStreak.objects.get_or_create(user=user)
+        # Today's and weekly stats, read from the daily rollups (see api/rollups.py)
+        focus = DailyFocusRollup.objects.filter(user=user, date__gte=week_ago), {
+            'today_minutes': Sum('focus_minutes', filter=Q(date=today)),
+            'weekly_minutes': Sum('focus_minutes'),
+        }
         
-        return Response({
-            'today_minutes': today_minutes,
-            'weekly_minutes': weekly_minutes,
-            'total_goals': total_goals,
-            'completed_goals': completed_goals,
+        # Goals progress
+        goals = Goal.objects.filter(user=user), {
+            'total_goals': Count('id'),
+            'completed_goals': Count('id', filter=Q(completed=True)),
+        }
+        return focus, goals
+    
+    @staticmethod
+    def stats_payload(focus, goals, streak):
+        return {
+            'today_minutes': focus['today_minutes'] or 0,
+            'weekly_minutes': focus['weekly_minutes'] or 0,
+            'total_goals': goals['total_goals'],
+            'completed_goals': goals['completed_goals'],
             'current_streak': streak.current_streak,
             'longest_streak': streak.longest_streak,
             'total_study_days': streak.total_study_days
+        }
+
+# Analytics Views
+class FocusTimeSeries(APIView):
+    """
+    Bucketed focus minutes and session counts, aggregated in the database
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        params = request.query_params
+        today = timezone.localdate()
+        
+        bucket = params.get('bucket', 'day')
+        if bucket not in BUCKET_FUNCTIONS:
+            return Response({'detail': 'bucket must be one of day, week, month'}, status=400)
+        
+        try:
+            end = parse_date(params['to']) if params.get('to') else today
+            start = parse_date(params['from']) if params.get('from') else end
+        except (ValueError, TypeError):
+            start = end = None
+        if start is None or end is None:
+            return Response({'detail': 'from and to must be dates in YYYY-MM-DD format'}, status=400)
+        # Checked before any datetime is built from them
+        if not (MIN_DATE <= start <= MAX_DATE and MIN_DATE <= end <= MAX_DATE):
+            return Response(
+                {'detail': f'from and to must be between {MIN_DATE.isoformat()} and {MAX_DATE.isoformat()}'},
+                status=400,
+            )
+        if not params.get('from'):
+            start = max(end - timedelta(days=29), MIN_DATE)
+        if start > end:
+            return Response({'detail': 'from must not be after to'}, status=400)
+        if bucket_count(start, end, bucket) > MAX_BUCKETS:
+            return Response({'detail': f'Range too large; at most {MAX_BUCKETS} buckets are returned'}, status=400)
+        
+        goal_id = params.get('goal')
+        if goal_id is not None:
+            try:
+                goal_id = int(goal_id)
+            except ValueError:
+                return Response({'detail': 'goal must be an integer id'}, status=400)
+        
+        session_type = params.get('session_type')
+        if session_type and session_type not in dict(FocusSession.SESSION_TYPE_CHOICES):
+            return Response({'detail': 'Invalid session_type'}, status=400)
+        
+        series = focus_timeseries(request.user, start, end, bucket, goal_id=goal_id, session_type=session_type)
+        return Response({
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'bucket': bucket,
+            'total_minutes': sum(point['focus_minutes'] for point in series),
+            'total_sessions': sum(point['session_count'] for point in series),
+            'series': series,
         })
 
+class CacheStats(APIView):
+    """
+    Hit/miss counters for the per-user payload cache (staff only)
+    """
+    permission_classes = [permissions.IsAdminUser]
+    
+    def get(self, request):
+        return Response(payload_cache.stats())
+
+# Delta Sync
+class SyncFeed(APIView):
+    """
+    Rows created, updated or deleted since the client's last sync token
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        since, cursors = None, None
+        token = request.query_params.get('since')
+        if token:
+            try:
+                since, cursors = decode_token(token)
+            except InvalidSyncToken:
+                return Response({'detail': 'Invalid sync token'}, status=400)
+            if since < tombstone_cutoff():
+                return Response(
+                    {'detail': 'Sync token expired; sync again without since to reload everything'},
+                    status=status.HTTP_410_GONE
+                )
+        return Response(build_feed(request.user, since, self.get_serializer_context(), cursors))
+    
+    def get_serializer_context(self):
+        return {'request': self.request, 'view': self}
+
 # User Registration and Authentication
 class UserCreate(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -277,6 +566,8 @@ class MotivationStart(APIView):
             interval_minutes = int(interval_minutes)
         except Exception:
             interval_minutes = 60
+        if interval_minutes < MIN_INTERVAL_MINUTES:
+            return Response({'detail': f'interval_minutes must be at least {MIN_INTERVAL_MINUTES}'}, status=400)
 
         sub, created = MotivationSubscription.objects.get_or_create(
             user=request.user,
@@ -293,6 +584,9 @@ class MotivationStart(APIView):
             sub.next_send_at = timezone.now()
             sub.save()
 
+        if settings.MOTIVATION_DELIVERY_MODE == 'eta':
+            transaction.on_commit(lambda: enqueue_delivery(sub.pk, sub.next_send_at))
+
         return Response(MotivationSubscriptionSerializer(sub).data)
 
 
@@ -320,16 +614,13 @@ class MotivationalQuoteList(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        # Return active quotes, randomly ordered
-        queryset = MotivationalQuote.objects.filter(is_active=True)
-        
-        # Optional: filter by category
+        # Pick up to 10 random active quote ids from the in-process pool
         category = self.request.query_params.get('category', None)
-        if category:
-            queryset = queryset.filter(category=category)
+        ids = quote_pool.sample_ids(10, category=category)
         
-        # Limit to 10 random quotes
-        return queryset.order_by('?')[:10]
+        # Fetch by primary key and keep the random order
+        quotes = MotivationalQuote.objects.filter(pk__in=ids, is_active=True).in_bulk()
+        return [quotes[pk] for pk in ids if pk in quotes]
 
 class RandomMotivationalQuote(APIView):
     """
@@ -338,7 +629,10 @@ class RandomMotivationalQuote(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        quote = MotivationalQuote.objects.filter(is_active=True).order_by('?').first()
+        quote = None
+        quote_id = quote_pool.random_id()
+        if quote_id is not None:
+            quote = MotivationalQuote.objects.filter(pk=quote_id, is_active=True).first()
         if quote:
             serializer = MotivationalQuoteSerializer(quote)
             return Response(serializer.data)
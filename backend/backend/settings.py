@@ -49,6 +49,63 @@ DATABASES = {
     }
 }
 
+# SQLite instead of MySQL for local work, e.g. DB_ENGINE=sqlite to try the replica router
+# with two files (SQLITE_NAME=db.sqlite3 SQLITE_REPLICA_NAME=db_replica.sqlite3). The
+# files have their own variables so the MySQL DB_NAME in .env never names a file.
+if os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / os.getenv('SQLITE_NAME', 'db.sqlite3'),
+        }
+    }
+
+# Optional read replica for safe-method API reads (api.db_routing). Tests read it
+# through the default connection.
+if os.getenv('DB_ENGINE') == 'sqlite':
+    if os.getenv('SQLITE_REPLICA_NAME'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'NAME': BASE_DIR / os.getenv('SQLITE_REPLICA_NAME'),
+            'TEST': {'MIRROR': 'default'},
+        }
+elif os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['api.db_routing.ReplicaRouter']
+DATABASE_REPLICA_ALIAS = 'replica'
+# Only requests under this prefix may read from the replica (the admin always uses the primary)
+DATABASE_REPLICA_PATH_PREFIX = os.getenv('DATABASE_REPLICA_PATH_PREFIX', '/api/')
+# Seconds a user's reads stay on the primary after they write; keep above the replica lag
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv('DATABASE_REPLICA_STICKY_SECONDS', '10'))
+
+# Cache: per-process locmem by default, Redis when REDIS_CACHE_URL is set
+if os.getenv('REDIS_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_CACHE_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'refocus-default',
+        }
+    }
+# Whether every process sees the same cache; locmem is private to each process, so
+# invalidations (auth snapshots, the blacklist filter generation) never reach the others
+CACHE_IS_SHARED = bool(os.getenv('REDIS_CACHE_URL'))
+
+# Seconds a cached per-user API payload (dashboard stats, streak) may be served
+USER_PAYLOAD_CACHE_TIMEOUT = int(os.getenv('USER_PAYLOAD_CACHE_TIMEOUT', '300'))
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -65,12 +122,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',  # Outermost, so latency covers the whole stack
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.db_routing.ReplicaRoutingMiddleware',  # Replica reads, per-alias query timing
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -144,7 +203,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',  # Optional: for browsable API
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -154,6 +213,46 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# Prometheus metrics at /api/_metrics (api.metrics): scrapers are let in with
+# METRICS_TOKEN as a bearer token, or by source address when METRICS_ALLOWED_IPS is set.
+# No address is trusted by default: behind a proxy on the same host every request
+# arrives from 127.0.0.1. Each process shares its numbers through the cache every
+# METRICS_PUBLISH_SECONDS; silent processes drop out after the TTL.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv('METRICS_ALLOWED_IPS', '').split(',') if ip]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_PUBLISH_SECONDS = int(os.getenv('METRICS_PUBLISH_SECONDS', '15'))
+METRICS_PROCESS_TTL_SECONDS = int(os.getenv('METRICS_PROCESS_TTL_SECONDS', '120'))
+
+# JWT user snapshots: seconds kept in the shared cache, and in each process's LRU.
+# The local TTL bounds how long another process may still accept a deactivated user.
+# Without a shared cache (CACHE_IS_SHARED) the "shared" tier is per process too and
+# misses invalidations, so it is capped at the local TTL.
+AUTH_USER_LOCAL_CACHE_SECONDS = int(os.getenv('AUTH_USER_LOCAL_CACHE_SECONDS', '10'))
+AUTH_USER_CACHE_SECONDS = int(os.getenv('AUTH_USER_CACHE_SECONDS', '300'))
+if not CACHE_IS_SHARED:
+    AUTH_USER_CACHE_SECONDS = min(AUTH_USER_CACHE_SECONDS, AUTH_USER_LOCAL_CACHE_SECONDS)
+AUTH_USER_LOCAL_CACHE_SIZE = int(os.getenv('AUTH_USER_LOCAL_CACHE_SIZE', '2048'))
+
+# Live events for /api/stream/: in-process by default, Redis pub/sub across nodes when set
+EVENT_BROKER_URL = os.getenv('EVENT_BROKER_URL', '')
+# Seconds between keep-alive comments on an idle event stream
+SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+
+# Maximum items accepted by the bulk create endpoints (/api/*/bulk/)
+BULK_CREATE_MAX_ITEMS = int(os.getenv('BULK_CREATE_MAX_ITEMS', '100'))
+
+# How far back a bulk-created row may be dated by the client (imports and
+# offline sessions); times in the future beyond a few minutes of clock skew
+# are rejected
+BULK_CREATE_MAX_BACKDATE_DAYS = int(os.getenv('BULK_CREATE_MAX_BACKDATE_DAYS', '365'))
+
+# Delta sync feed (/api/sync/): rows per resource per response, re-sent
+# overlap window in seconds, and how long delete tombstones are kept
+SYNC_MAX_ITEMS = int(os.getenv('SYNC_MAX_ITEMS', '500'))
+SYNC_OVERLAP_SECONDS = int(os.getenv('SYNC_OVERLAP_SECONDS', '5'))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv('SYNC_TOMBSTONE_RETENTION_DAYS', '30'))
+
 # djangorestframework-simplejwt settings
 from datetime import timedelta
 
@@ -162,8 +261,21 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": False,
     "BLACKLIST_AFTER_ROTATION": True,
+    "TOKEN_REFRESH_SERIALIZER": "api.serializers.FilteredTokenRefreshSerializer",
 }
 
+# Bloom filter of blacklisted refresh tokens: sizing, false-positive rate, and the
+# seconds after which a process rebuilds it even without a blacklist event. The
+# rebuild event travels through the cache, so without a shared cache (CACHE_IS_SHARED)
+# the max age alone bounds how long other processes accept a blacklisted token.
+TOKEN_BLACKLIST_FILTER_CAPACITY = int(os.getenv('TOKEN_BLACKLIST_FILTER_CAPACITY', '100000'))
+TOKEN_BLACKLIST_FILTER_ERROR_RATE = float(os.getenv('TOKEN_BLACKLIST_FILTER_ERROR_RATE', '0.001'))
+TOKEN_BLACKLIST_FILTER_MAX_AGE = int(
+    os.getenv('TOKEN_BLACKLIST_FILTER_MAX_AGE', '300' if CACHE_IS_SHARED else '10')
+)
+# Expired outstanding tokens deleted per statement by the daily prune
+TOKEN_PRUNE_CHUNK_SIZE = int(os.getenv('TOKEN_PRUNE_CHUNK_SIZE', '1000'))
+
 CORS_ALLOW_ALL_ORIGINS = True
 
 # Authentication settings
@@ -178,11 +290,29 @@ CELERY_TIMEZONE = 'UTC'
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 
+# Motivation email delivery: 'eta' enqueues each slot as a Celery task with an ETA
+# and polls only as a reconciliation sweep; 'poll' sends whatever is due every 5 minutes
+MOTIVATION_DELIVERY_MODE = os.getenv('MOTIVATION_DELIVERY_MODE', 'eta')
+MOTIVATION_RECONCILE_SECONDS = int(os.getenv('MOTIVATION_RECONCILE_SECONDS', '1800'))
+MOTIVATION_RECONCILE_GRACE_SECONDS = int(os.getenv('MOTIVATION_RECONCILE_GRACE_SECONDS', '120'))
+
+# Square avatar thumbnails rendered after upload (pixels), and the size served as `avatar`
+AVATAR_VARIANT_SIZES = [int(size) for size in os.getenv('AVATAR_VARIANT_SIZES', '32,64,128,256').split(',')]
+AVATAR_DEFAULT_SIZE = int(os.getenv('AVATAR_DEFAULT_SIZE', '128'))
+
 # Celery Beat schedule: check due motivation emails periodically
 CELERY_BEAT_SCHEDULE = {
     'send_motivation_emails_due': {
-        'task': 'api.tasks.process_motivation_subscriptions',
-        'schedule': 300.0,  # every 5 minutes
+        'task': 'api.tasks.dispatch_motivation_subscriptions',
+        'schedule': float(MOTIVATION_RECONCILE_SECONDS) if MOTIVATION_DELIVERY_MODE == 'eta' else 300.0,
+    },
+    'prune_expired_tokens': {
+        'task': 'api.tasks.prune_expired_tokens_task',
+        'schedule': 24 * 60 * 60.0,
+    },
+    'prune_sync_tombstones': {
+        'task': 'api.tasks.prune_sync_tombstones_task',
+        'schedule': 24 * 60 * 60.0,
     },
 }
 
@@ -194,3 +324,15 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER or 'no-reply@example.com')
+# Motivation emails sent over one SMTP connection before it is recycled
+MOTIVATION_EMAIL_BATCH_SIZE = int(os.getenv('MOTIVATION_EMAIL_BATCH_SIZE', '100'))
+# Due subscriptions each worker claims at once, and how long its lease lasts
+MOTIVATION_CLAIM_CHUNK_SIZE = int(os.getenv('MOTIVATION_CLAIM_CHUNK_SIZE', '500'))
+MOTIVATION_CLAIM_LEASE_SECONDS = int(os.getenv('MOTIVATION_CLAIM_LEASE_SECONDS', '600'))
+# Quote pool for motivation emails: bulk remote fetch cached for the TTL, with a
+# circuit breaker that falls back to MotivationalQuote rows after repeated failures
+MOTIVATION_QUOTES_URL = os.getenv('MOTIVATION_QUOTES_URL', 'https://zenquotes.io/api/quotes')
+MOTIVATION_QUOTES_TIMEOUT = float(os.getenv('MOTIVATION_QUOTES_TIMEOUT', '5'))
+MOTIVATION_QUOTES_TTL = int(os.getenv('MOTIVATION_QUOTES_TTL', '3600'))
+MOTIVATION_QUOTES_FAILURE_THRESHOLD = int(os.getenv('MOTIVATION_QUOTES_FAILURE_THRESHOLD', '3'))
+MOTIVATION_QUOTES_RESET_SECONDS = int(os.getenv('MOTIVATION_QUOTES_RESET_SECONDS', '300'))
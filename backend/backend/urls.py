@@ -1,17 +1,27 @@
 from django.contrib import admin
-from django.urls import path, include
+import re
+
+from django.urls import path, include, re_path
 from django.http import HttpResponse, JsonResponse
 from django.urls import reverse
 from django.conf import settings
 from django.conf.urls.static import static
+from django.views.static import serve
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from api.avatars import CONTENT_ROOT, IMMUTABLE_CACHE_CONTROL
 
 def home(request):
     return HttpResponse("Welcome to Re-Focus API backend!")
 
+def immutable_media(request, path):
+    """Content-addressed avatars never change, so clients may cache them for good."""
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
 def api_root(request):
     """API root view that shows all available endpoints"""
     api_endpoints = {
@@ -44,10 +54,24 @@ def api_root(request):
         },
         "study_streak": {
             "detail": reverse('study-streak-detail'),
+            "heatmap": reverse('study-heatmap'),
         },
         "dashboard": {
             "stats": reverse('dashboard-stats'),
         },
+        "sync": {
+            "feed": reverse('sync-feed'),
+        },
+        "analytics": {
+            "focus_timeseries": reverse('analytics-focus-timeseries'),
+        },
+        "async": {
+            "dashboard_stats": reverse('async-dashboard-stats'),
+            "study_streak": reverse('async-study-streak-detail'),
+            "quotes": reverse('async-quote-list'),
+            "random_quote": reverse('async-quote-random'),
+            "motivational_nudges": reverse('async-motivational-nudge-list'),
+        },
         "admin": reverse('admin:index'),
         "documentation": "Check API_DOCUMENTATION.md for detailed endpoint information"
     }
@@ -72,6 +96,13 @@ urlpatterns = [
     path('', home),  # Home page
 ]
 
-# Serve media files in development
+# Serve media files in development (in production the web server should send
+# IMMUTABLE_CACHE_CONTROL for everything under MEDIA_URL + CONTENT_ROOT)
 if settings.DEBUG:
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<path>%s.*)$' % (re.escape(settings.MEDIA_URL.lstrip('/')), re.escape(CONTENT_ROOT)),
+            immutable_media,
+        ),
+    ]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) 
\ No newline at end of file